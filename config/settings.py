@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -115,6 +116,87 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Настройки отправки рассылок
+MAILING_BATCH_SIZE = int(os.getenv("MAILING_BATCH_SIZE") or 100)
+# Сколько получателей читается из базы за один запрос при потоковой отправке
+MAILING_RECIPIENT_CHUNK_SIZE = int(os.getenv("MAILING_RECIPIENT_CHUNK_SIZE") or 2000)
+# Движок отправки: "smtp" — синхронная SMTP-сессия, "async" — пул сессий в цикле событий (aiosmtplib)
+MAILING_DELIVERY_BACKEND = os.getenv("MAILING_DELIVERY_BACKEND") or "smtp"
+MAILING_ASYNC_CONCURRENCY = int(os.getenv("MAILING_ASYNC_CONCURRENCY") or 20)
+MAILING_ATTEMPT_FLUSH_SIZE = int(os.getenv("MAILING_ATTEMPT_FLUSH_SIZE") or 500)
+MAILING_ATTEMPT_FLUSH_INTERVAL = float(os.getenv("MAILING_ATTEMPT_FLUSH_INTERVAL") or 5)
+# Через сколько секунд задача в статусе «Выполняется» считается брошенной и снова выдаётся воркерам
+MAILING_JOB_TIMEOUT = int(os.getenv("MAILING_JOB_TIMEOUT") or 3600)
+# Через сколько секунд без продления аренды незавершённый запуск рассылки считается брошенным и продолжается
+MAILING_RUN_TIMEOUT = int(os.getenv("MAILING_RUN_TIMEOUT") or 600)
+# Сколько месяцев хранятся подробные попытки; более старые сворачиваются в дневные сводки и удаляются
+MAILING_ATTEMPT_RETENTION_MONTHS = int(os.getenv("MAILING_ATTEMPT_RETENTION_MONTHS") or 6)
+# Сколько строк файла импорта получателей обрабатывается за один пакет запросов
+MAILING_IMPORT_BATCH_SIZE = int(os.getenv("MAILING_IMPORT_BATCH_SIZE") or 2000)
+# Сколько строк читается из базы за одну порцию при выгрузке в CSV/NDJSON
+MAILING_EXPORT_CHUNK_SIZE = int(os.getenv("MAILING_EXPORT_CHUNK_SIZE") or 2000)
+# Ограничения скорости отправки (общие для всех процессов через кеш); 0 — без ограничения.
+# Писем в секунду на SMTP-сервер, писем в секунду на владельца рассылок, одновременных SMTP-сессий на сервер
+MAILING_HOST_RATE = float(os.getenv("MAILING_HOST_RATE") or 0)
+MAILING_OWNER_RATE = float(os.getenv("MAILING_OWNER_RATE") or 0)
+MAILING_HOST_CONNECTIONS = int(os.getenv("MAILING_HOST_CONNECTIONS") or 0)
+# Повторная отправка после временных ошибок: максимум попыток на получателя,
+# начальная и наибольшая задержка экспоненциального ожидания, сек
+MAILING_MAX_ATTEMPTS = int(os.getenv("MAILING_MAX_ATTEMPTS") or 5)
+MAILING_RETRY_BASE_DELAY = float(os.getenv("MAILING_RETRY_BASE_DELAY") or 60)
+MAILING_RETRY_MAX_DELAY = float(os.getenv("MAILING_RETRY_MAX_DELAY") or 3600)
+# Планировщик рассылок: на сколько секунд вперёд загружаются события и как часто проверяются изменения рассылок
+MAILING_SCHEDULER_HORIZON = int(os.getenv("MAILING_SCHEDULER_HORIZON") or 3600)
+MAILING_SCHEDULER_POLL_INTERVAL = float(os.getenv("MAILING_SCHEDULER_POLL_INTERVAL") or 5)
+# Адрес сайта для ссылок в письмах (отписка)
+MAILING_SITE_URL = os.getenv("MAILING_SITE_URL") or "http://localhost:8000"
+# Как часто метрики процесса переносятся в общий кеш, сек; токен доступа к /metrics (пусто — без проверки)
+MAILING_METRICS_FLUSH_INTERVAL = float(os.getenv("MAILING_METRICS_FLUSH_INTERVAL") or 5)
+MAILING_METRICS_TOKEN = os.getenv("MAILING_METRICS_TOKEN") or ""
+# Проверка доменов адресов получателей: функция проверки (путь; mailings.validation.accept_any — без DNS),
+# сколько секунд помнить рабочий и нерабочий домен, общий таймаут проверки домена, сколько секунд форма
+# ждёт проверку (дальше адрес принимается, а проверка завершается в фоне) и число параллельных DNS-запросов
+MAILING_DOMAIN_RESOLVER = os.getenv("MAILING_DOMAIN_RESOLVER") or "mailings.validation.resolve_mx"
+MAILING_DOMAIN_CACHE_TTL = int(os.getenv("MAILING_DOMAIN_CACHE_TTL") or 86400)
+MAILING_DOMAIN_FAILURE_TTL = int(os.getenv("MAILING_DOMAIN_FAILURE_TTL") or 3600)
+MAILING_DNS_TIMEOUT = float(os.getenv("MAILING_DNS_TIMEOUT") or 5)
+MAILING_FORM_DNS_TIMEOUT = float(os.getenv("MAILING_FORM_DNS_TIMEOUT") or 1)
+MAILING_DNS_CONCURRENCY = int(os.getenv("MAILING_DNS_CONCURRENCY") or 16)
+# Отправка по доменам получателей: маршруты через отдельные smart host ("домен=хост[:порт],...")
+# и максимум одновременных SMTP-сессий на домен во всех процессах (0 — без ограничения)
+MAILING_DOMAIN_ROUTES = os.getenv("MAILING_DOMAIN_ROUTES") or ""
+MAILING_DOMAIN_CONNECTIONS = int(os.getenv("MAILING_DOMAIN_CONNECTIONS") or 0)
+# Как часто процесс отправки дочитывает новые записи списка подавления, сек
+MAILING_SUPPRESSION_REFRESH_INTERVAL = float(os.getenv("MAILING_SUPPRESSION_REFRESH_INTERVAL") or 30)
+
+# Журнал отправки рассылок: файл MAILING_LOG_FILE (по умолчанию logs/mailing_send.log) или консоль ("-").
+# Тесты журнал не пишут
+TESTING = sys.argv[1:2] == ["test"]
+MAILING_LOG_FILE = os.getenv("MAILING_LOG_FILE") or str(BASE_DIR / "logs" / "mailing_send.log")
+if TESTING:
+    MAILING_LOG_HANDLER = {"class": "logging.NullHandler"}
+elif MAILING_LOG_FILE == "-":
+    MAILING_LOG_HANDLER = {"class": "logging.StreamHandler", "formatter": "mailing"}
+else:
+    Path(MAILING_LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+    MAILING_LOG_HANDLER = {
+        "class": "logging.FileHandler",
+        "filename": MAILING_LOG_FILE,
+        "encoding": "utf-8",
+        "formatter": "mailing",
+    }
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "mailing": {"format": "%(asctime)s [%(levelname)s]: %(message)s"},
+    },
+    "handlers": {"mailing": MAILING_LOG_HANDLER},
+    "loggers": {
+        "mailings": {"handlers": ["mailing"], "level": "INFO"},
+    },
+}
+
 LOGIN_URL = "users:login"
 
 CACHE_ENABLED = True
@@ -3,11 +3,12 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from mailings.views import HomePageView
+from mailings.views import HomePageView, MetricsView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", HomePageView.as_view(), name="home"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path("mailings/", include("mailings.urls", namespace="mailings")),
     path("users/", include("users.urls", namespace="users")),
 ]
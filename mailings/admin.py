@@ -1,8 +1,25 @@
 from django.contrib import admin
 
-from .models import Attempt, MailingList, Message, Recipient
+from .models import (
+    Attempt,
+    AttemptDailyRollup,
+    Delivery,
+    MailingList,
+    MailingRun,
+    MailingStats,
+    Message,
+    Recipient,
+    SendJob,
+    Suppression,
+)
 
 admin.site.register(Recipient)
 admin.site.register(Message)
 admin.site.register(MailingList)
 admin.site.register(Attempt)
+admin.site.register(SendJob)
+admin.site.register(MailingRun)
+admin.site.register(Delivery)
+admin.site.register(MailingStats)
+admin.site.register(AttemptDailyRollup)
+admin.site.register(Suppression)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MailingsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mailings"
+
+    def ready(self):
+        # Подключение обработчиков сигналов сброса кеша
+        from . import signals  # noqa: F401
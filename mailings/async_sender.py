@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+
+import aiosmtplib
+
+from config import settings
+
+from . import metrics
+from .throttling import Throttle
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых SMTP-сессию нужно открыть заново
+RECONNECT_ERRORS = (aiosmtplib.SMTPServerDisconnected, ConnectionError)
+
+
+# =================== Асинхронный движок отправки писем ===============================================================
+class AsyncMailingSender:
+    """Отправка писем из одного цикла событий через пул одновременно открытых SMTP-сессий"""
+
+    def __init__(self, batch_size=None, concurrency=None, throttle=None, **connection_kwargs):
+        self.batch_size = batch_size or settings.MAILING_BATCH_SIZE
+        self.concurrency = concurrency or settings.MAILING_ASYNC_CONCURRENCY
+        self.connection_kwargs = {
+            "hostname": connection_kwargs.get("host", settings.EMAIL_HOST),
+            "port": int(connection_kwargs.get("port", settings.EMAIL_PORT) or 25),
+            "username": connection_kwargs.get("username", settings.EMAIL_HOST_USER) or None,
+            "password": connection_kwargs.get("password", settings.EMAIL_HOST_PASSWORD) or None,
+            "use_tls": connection_kwargs.get("use_ssl", settings.EMAIL_USE_SSL),
+            "start_tls": connection_kwargs.get("use_tls", settings.EMAIL_USE_TLS),
+        }
+        self.throttle = throttle or Throttle(self.connection_kwargs["hostname"])
+        self.loop = asyncio.new_event_loop()
+        self.clients = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Метод закрытия всех SMTP-сессий и цикла событий
+    def close(self):
+        if self.clients is not None:
+            self.loop.run_until_complete(self._close_clients())
+            self.clients = None
+            self.throttle.connections.release()
+        if not self.loop.is_closed():
+            self.loop.close()
+
+    # Метод отправки пачки писем, возвращает ошибку (или None) для каждого письма
+    def send_batch(self, messages, owner_id=None):
+        return self.loop.run_until_complete(self._send_all(messages, owner_id))
+
+    async def _send_all(self, messages, owner_id):
+        # Очередь свободных клиентов одновременно служит семафором на число сессий;
+        # сессий открывается не больше, чем свободно слотов ограничителя соединений с сервером
+        if self.clients is None:
+            self.clients = asyncio.Queue()
+            for _ in range(self.throttle.connections.acquire(self.concurrency)):
+                self.clients.put_nowait(aiosmtplib.SMTP(**self.connection_kwargs))
+        return await asyncio.gather(*(self._send(message, owner_id) for message in messages))
+
+    async def _send(self, message, owner_id):
+        client = await self.clients.get()
+        try:
+            await self.throttle.wait_async(owner_id)
+            error = None
+            for _ in range(2):
+                try:
+                    if not client.is_connected:
+                        started = time.perf_counter()
+                        await client.connect()
+                        metrics.observe("mailing_smtp_connect_seconds", time.perf_counter() - started)
+                    started = time.perf_counter()
+                    await client.send_message(
+                        message.message(), sender=message.from_email, recipients=message.recipients()
+                    )
+                    metrics.observe("mailing_smtp_send_seconds", time.perf_counter() - started)
+                    return None
+                except RECONNECT_ERRORS as e:
+                    logger.warning(f"SMTP-сессия разорвана ({e}), переподключение.")
+                    client.close()
+                    error = e
+                except Exception as e:
+                    return e
+            return error
+        finally:
+            self.clients.put_nowait(client)
+
+    async def _close_clients(self):
+        while not self.clients.empty():
+            client = self.clients.get_nowait()
+            if client.is_connected:
+                try:
+                    await client.quit()
+                except aiosmtplib.SMTPException:
+                    client.close()
@@ -0,0 +1,306 @@
+import itertools
+import platform
+import random
+import socketserver
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+import django
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from mailings.models import Attempt, MailingList, Message, Recipient
+from mailings.services import (
+    AttemptRecorder,
+    MailingSender,
+    deliver_mailinglist,
+    get_dashboard_stats,
+    update_mailing_stats,
+)
+from mailings.throttling import Throttle
+from users.models import CustomUser
+
+# Страницы, время ответа и число запросов которых замеряет набор
+BENCHMARK_VIEWS = (
+    "home",
+    "mailings:mailinglist_list",
+    "mailings:recipient_list",
+    "mailings:message_list",
+    "mailings:attempt_list",
+)
+
+
+# =================== Локальный SMTP-сервер-заглушка для замеров ====================================================
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Минимальная реализация SMTP-диалога: принимает и отбрасывает любые письма"""
+
+    def handle(self):
+        # Имитация стоимости установки сессии (TCP + TLS + AUTH) у реального сервера
+        if self.server.handshake_delay:
+            time.sleep(self.server.handshake_delay)
+        self.reply("220 sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply("250-sink\r\n250 8BITMIME")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                with self.server.lock:
+                    self.server.received += 1
+                # Имитация времени обработки письма сервером
+                if self.server.reply_delay:
+                    time.sleep(self.server.reply_delay)
+                self.reply("250 OK: queued")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b"\r\n")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """SMTP-сервер-заглушка в отдельном потоке, используется как контекстный менеджер"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, host="127.0.0.1", port=0, handshake_delay=0.0, reply_delay=0.0):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.handshake_delay = handshake_delay
+        self.reply_delay = reply_delay
+        self.received = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+# Замер пропускной способности: возвращает (количество, секунды, писем в секунду)
+def measure(func, count):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return count, elapsed, count / elapsed if elapsed else float("inf")
+
+
+# =================== Синтетические данные для замеров ===============================================================
+# Наполнение базы синтетическими данными пачками через bulk_create, возвращает созданных пользователей
+def seed_dataset(users=10, recipients=1000, mailings=20, attempts=10000, batch_size=5000):
+    token = uuid.uuid4().hex[:8]
+    now = timezone.now()
+    owners = CustomUser.objects.bulk_create(
+        CustomUser(email=f"bench-{token}-{i}@example.com", is_active=True) for i in range(users)
+    )
+    messages = Message.objects.bulk_create(
+        Message(subject=f"Тема {i}", letter_body="Текст письма", owner=owners[i % users]) for i in range(mailings)
+    )
+    mailing_lists = MailingList.objects.bulk_create(
+        MailingList(
+            start_time=now - timedelta(days=random.randint(0, 30)),
+            end_time=now + timedelta(days=random.randint(1, 30)),
+            status=random.choice(["created", "started", "completed", "completed"]),
+            message=message,
+            owner=message.owner,
+        )
+        for message in messages
+    )
+
+    recipient_rows = (
+        Recipient(email=f"r-{token}-{i}@example.com", full_name=f"Получатель {i}", owner=owners[i % users])
+        for i in range(recipients)
+    )
+    Through = MailingList.recipients.through
+    for chunk in batched(recipient_rows, batch_size):
+        created = Recipient.objects.bulk_create(chunk)
+        Through.objects.bulk_create(
+            (
+                Through(mailinglist_id=mailing.id, recipient_id=recipient.id)
+                for recipient in created
+                for mailing in mailing_lists
+                if mailing.owner_id == recipient.owner_id
+            ),
+            batch_size=batch_size,
+        )
+
+    counters = {}
+    for chunk in batched(range(attempts), batch_size):
+        rows = []
+        for _ in chunk:
+            mailing = random.choice(mailing_lists)
+            result = "successful" if random.random() < 0.9 else "failed"
+            counters.setdefault(mailing.owner_id, Counter())[result] += 1
+            rows.append(
+                Attempt(result=result, server_response=None if result == "successful" else "550", mailing_list=mailing)
+            )
+        Attempt.objects.bulk_create(rows)
+    update_mailing_stats(counters)
+    return owners
+
+
+# Разбиение итератора на списки фиксированного размера
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+# =================== Набор замеров с результатом в JSON =============================================================
+# Пользователь с наибольшим числом рассылок: на его страницах больше всего данных
+def get_busiest_owner():
+    return (
+        CustomUser.objects.annotate(mailings=Count("mailinglist_owner")).order_by("-mailings", "pk").first()
+        or CustomUser.objects.first()
+    )
+
+
+# Сводка по длительностям замеров, мс
+def summarize_timings(timings):
+    timings = sorted(timings)
+    return {
+        "min_ms": round(timings[0] * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3),
+    }
+
+
+# Пропускная способность отправки рассылки: рассылка на recipients получателей уходит на SMTP-сервер-заглушку
+# через весь конвейер (журнал доставки, сборка писем, SMTP, запись попыток). Ограничители скорости отключены.
+# Созданные для замера пользователь, рассылка и получатели удаляются и при ошибке
+def bench_send(recipients=1000, batch_size=None, handshake_delay=0.0, reply_delay=0.0):
+    token = uuid.uuid4().hex[:8]
+    owner = CustomUser.objects.create(email=f"bench-send-{token}@example.com", is_active=True)
+    try:
+        return measure_send(owner, token, recipients, batch_size, handshake_delay, reply_delay)
+    finally:
+        # Сообщение, рассылка, получатели, попытки и журнал доставки удаляются каскадом
+        owner.delete()
+
+
+def measure_send(owner, token, recipients, batch_size, handshake_delay, reply_delay):
+    message = Message.objects.create(
+        subject="Новости для {{ full_name }}",
+        letter_body="Здравствуйте, {{ full_name }}!\n\nОтписаться: {{ unsubscribe_url }}",
+        owner=owner,
+    )
+    now = timezone.now()
+    mailinglist = MailingList.objects.create(
+        start_time=now, end_time=now + timedelta(days=1), status="started", message=message, owner=owner
+    )
+    Through = MailingList.recipients.through
+    for chunk in batched(range(recipients), 5000):
+        created = Recipient.objects.bulk_create(
+            Recipient(email=f"s-{token}-{i}@example.com", full_name=f"Получатель {i}", owner=owner) for i in chunk
+        )
+        Through.objects.bulk_create(Through(mailinglist_id=mailinglist.id, recipient_id=r.id) for r in created)
+
+    with SMTPSink(handshake_delay=handshake_delay, reply_delay=reply_delay) as sink:
+        sender = MailingSender(
+            batch_size=batch_size,
+            throttle=Throttle(f"benchmark:{token}", host_rate=0, owner_rate=0, connections=0),
+            backend="django.core.mail.backends.smtp.EmailBackend",
+            host=sink.server_address[0],
+            port=sink.port,
+            username="",
+            password="",
+            use_tls=False,
+            use_ssl=False,
+        )
+        with CaptureQueriesContext(connection) as queries, sender, AttemptRecorder() as recorder:
+            started = time.perf_counter()
+            sent, failed = deliver_mailinglist(mailinglist, sender, recorder)
+        elapsed = time.perf_counter() - started
+    return {
+        "recipients": recipients,
+        "batch_size": sender.batch_size,
+        "sent": sent,
+        "failed": failed,
+        "received": sink.received,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(sent / elapsed, 1) if elapsed else None,
+        "queries": len(queries),
+    }
+
+
+# Время ответа и число запросов страниц списков от имени пользователя. Запросы идут напрямую в
+# представления (RequestFactory), поэтому в замер не входят middleware; первый запрос заполняет кеш списков
+def bench_views(owner, repeat=5):
+    factory = RequestFactory()
+    results = {}
+    for name in BENCHMARK_VIEWS:
+        path = reverse(name)
+        view = resolve(path).func
+        timings = []
+        query_counts = []
+        for _ in range(repeat):
+            request = factory.get(path)
+            request.user = owner
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = view(request)
+                if hasattr(response, "render"):
+                    response.render()
+                timings.append(time.perf_counter() - started)
+            query_counts.append(len(queries))
+        results[name] = {"status": response.status_code, "queries": max(query_counts), **summarize_timings(timings)}
+    return results
+
+
+# Число запросов и время сбора статистики главной страницы
+def bench_dashboard(owner, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            stats = get_dashboard_stats(owner)
+            timings.append(time.perf_counter() - started)
+    return {"queries": len(queries), "stats": stats, **summarize_timings(timings)}
+
+
+# Полный набор замеров; результат — словарь, пригодный для json.dumps и сравнения между версиями
+def run_suite(send_recipients=1000, batch_size=None, repeat=5, handshake_delay=0.0, reply_delay=0.0):
+    owner = get_busiest_owner()
+    return {
+        "started_at": timezone.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "dataset": {
+            "users": CustomUser.objects.count(),
+            "recipients": Recipient.objects.count(),
+            "mailings": MailingList.objects.count(),
+            "attempts": Attempt.objects.count(),
+        },
+        "views": bench_views(owner, repeat) if owner else {},
+        "dashboard": bench_dashboard(owner, repeat) if owner else {},
+        "send": bench_send(send_recipients, batch_size, handshake_delay, reply_delay),
+    }
@@ -0,0 +1,78 @@
+import time
+
+from django.core.cache import cache
+
+from users.services import get_is_manager
+
+# Время жизни закешированных списков, сек
+CACHE_TIMEOUT = 60 * 15
+
+
+# Ключ счётчика версий данных модели
+def get_version_key(model):
+    return f"version:{model._meta.label_lower}"
+
+
+# Текущие версии данных моделей; отсутствующая версия заводится заново значением,
+# которое не совпадёт ни с одной ранее выданной (иначе после вытеснения ключа вернулись бы старые данные)
+def get_model_versions(models):
+    keys = [get_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+# Увеличение версии данных модели: все закешированные списки с её участием становятся недействительными
+def bump_model_version(model):
+    key = get_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+# Получение строк из кеша или вычисление и сохранение их под ключом, включающим версии моделей
+def get_cached_rows(scope, models, build, timeout=CACHE_TIMEOUT):
+    versions = ":".join(str(version) for version in get_model_versions(models))
+    key = f"rows:{scope}:{versions}"
+    rows = cache.get(key)
+    if rows is None:
+        rows = build()
+        if not isinstance(rows, list):
+            rows = list(rows)
+        cache.set(key, rows, timeout)
+    return rows
+
+
+class CachedListMixin:
+    """Кеширование вычисленного списка объектов ListView отдельно для каждого пользователя (или роли менеджера)"""
+
+    # Модели, от изменения которых зависит содержимое списка
+    cache_models = ()
+
+    # Метод фильтрации исходного набора данных (переопределяется в представлениях)
+    def filter_queryset(self, queryset):
+        return queryset
+
+    # Метод вычисления строк списка (переопределяется, например, постраничным выводом)
+    def get_rows(self, queryset):
+        return list(queryset)
+
+    # Дополнение ключа кеша (например, курсор страницы)
+    def get_cache_variant(self):
+        return ""
+
+    # Метод переопределения исходного набора данных: в кеш попадают строки, а не ленивый QuerySet.
+    # Менеджеры видят общий список, остальные пользователи — только свои данные
+    def get_queryset(self):
+        self.is_manager = get_is_manager(self.request.user, "Менеджеры")
+        scope = "manager" if self.is_manager else f"user:{self.request.user.pk}"
+        queryset = super().get_queryset()
+        return get_cached_rows(
+            f"{self.model._meta.label_lower}:{scope}:{self.get_cache_variant()}",
+            self.cache_models or (self.model,),
+            lambda: self.get_rows(self.filter_queryset(queryset)),
+        )
@@ -0,0 +1,104 @@
+from django.db.models import Count, Min, Value
+from django.db.models.functions import Lower, StrIndex, Substr, Trim
+
+# Нормализация адресов и слияние получателей с одинаковым нормализованным адресом у одного владельца.
+# Модуль не зависит от моделей (модели передаются аргументами) и используется в команде dedupe_recipients;
+# миграция 0012 хранит собственную копию логики слияния
+
+
+# Нормализованный адрес: без пробелов по краям, в нижнем регистре (как столбец Recipient.email_normalized)
+def normalize_email(email):
+    return email.strip().lower()
+
+
+# То же выражение на стороне базы; не требует столбца email_normalized, поэтому работает и до миграции
+def normalized_email_expression():
+    return Lower(Trim("email"))
+
+
+# Домен нормализованного адреса (часть после «@») на стороне базы
+def email_domain_expression():
+    return Substr(normalized_email_expression(), StrIndex(normalized_email_expression(), Value("@")) + 1)
+
+
+# Группы дублей одним запросом GROUP BY: [(id владельца, адрес, id сохраняемого получателя)]
+def find_duplicate_groups(recipient_model, owner_id=None):
+    queryset = recipient_model.objects.all()
+    if owner_id is not None:
+        queryset = queryset.filter(owner_id=owner_id)
+    return list(
+        queryset.annotate(normalized=normalized_email_expression())
+        .values("owner_id", "normalized")
+        .annotate(count=Count("id"), keep=Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+        .values_list("owner_id", "normalized", "keep")
+    )
+
+
+# Слияние одной пачки групп: связи с рассылками и журнал доставки переносятся на получателя с наименьшим id
+# (повторяющиеся связи отбрасываются), остальные получатели удаляются. Возвращает число удалённых
+def merge_duplicate_groups(recipient_model, through_model, delivery_model, groups):
+    keep_ids = {(owner_id, normalized): keep for owner_id, normalized, keep in groups}
+    rows = (
+        recipient_model.objects.annotate(normalized=normalized_email_expression())
+        .filter(owner_id__in={owner_id for owner_id, _, _ in groups}, normalized__in={key[1] for key in keep_ids})
+        .values_list("id", "owner_id", "normalized")
+    )
+    # id дубля -> id сохраняемого получателя
+    targets = {
+        pk: keep_ids[(owner_id, normalized)]
+        for pk, owner_id, normalized in rows
+        if (owner_id, normalized) in keep_ids and pk != keep_ids[(owner_id, normalized)]
+    }
+    if not targets:
+        return 0
+
+    links = through_model.objects.filter(recipient_id__in=targets)
+    through_model.objects.bulk_create(
+        [
+            through_model(mailinglist_id=mailinglist_id, recipient_id=targets[recipient_id])
+            for mailinglist_id, recipient_id in links.values_list("mailinglist_id", "recipient_id")
+        ],
+        ignore_conflicts=True,
+    )
+    links.delete()
+
+    # Доставка уникальна в пределах запуска: запись дубля, для которой у сохраняемого получателя уже есть
+    # запись того же запуска, удаляется, остальные переносятся
+    seen = set(
+        delivery_model.objects.filter(recipient_id__in=set(targets.values())).values_list(
+            "run_id", "mailing_list_id", "recipient_id"
+        )
+    )
+    moved, dropped = [], []
+    deliveries = delivery_model.objects.filter(recipient_id__in=targets).order_by("id")
+    for pk, run_id, mailing_list_id, recipient_id in deliveries.values_list(
+        "id", "run_id", "mailing_list_id", "recipient_id"
+    ):
+        key = (run_id, mailing_list_id, targets[recipient_id])
+        if key in seen:
+            dropped.append(pk)
+        else:
+            seen.add(key)
+            moved.append(delivery_model(id=pk, recipient_id=key[2]))
+    delivery_model.objects.filter(id__in=dropped).delete()
+    delivery_model.objects.bulk_update(moved, ["recipient"])
+
+    recipient_model.objects.filter(id__in=targets).delete()
+    return len(targets)
+
+
+# Слияние всех дублей пачками по batch_size групп; возвращает число групп и удалённых получателей
+def merge_duplicate_recipients(
+    recipient_model, through_model, delivery_model, owner_id=None, batch_size=1000, dry_run=False
+):
+    groups = find_duplicate_groups(recipient_model, owner_id)
+    summary = {"groups": len(groups), "merged": 0}
+    if dry_run:
+        return summary
+    for start in range(0, len(groups), batch_size):
+        summary["merged"] += merge_duplicate_groups(
+            recipient_model, through_model, delivery_model, groups[start : start + batch_size]
+        )
+    return summary
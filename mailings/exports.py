@@ -0,0 +1,76 @@
+import csv
+import json
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.views import View
+
+from config import settings
+from users.services import get_is_manager
+
+
+class Echo:
+    """Псевдофайл для csv.writer: вместо записи возвращает строку, которую отдаёт StreamingHttpResponse"""
+
+    def write(self, value):
+        return value
+
+
+def serialize_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+# Строки CSV: заголовок, затем по одной строке на запись
+def iter_csv(headers, rows):
+    writer = csv.writer(Echo())
+    yield "\ufeff" + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([serialize_value(value) for value in row])
+
+
+# Строки NDJSON: по одному JSON-объекту на запись
+def iter_ndjson(headers, rows):
+    for row in rows:
+        yield json.dumps({key: serialize_value(value) for key, value in zip(headers, row)}, ensure_ascii=False) + "\n"
+
+
+# Форматы выгрузки: функция построчной записи, тип содержимого и расширение файла
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv; charset=utf-8", "csv"),
+    "ndjson": (iter_ndjson, "application/x-ndjson; charset=utf-8", "ndjson"),
+}
+
+
+# Построчное чтение кортежей значений. На PostgreSQL iterator() читает через серверный курсор,
+# поэтому выгрузка начинается сразу и в памяти держится только одна порция строк
+def iter_rows(queryset, fields, chunk_size=None):
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size or settings.MAILING_EXPORT_CHUNK_SIZE)
+
+
+class ExportView(LoginRequiredMixin, View):
+    """Потоковая выгрузка записей модели в CSV (по умолчанию) или NDJSON (?format=ndjson)"""
+
+    model = None
+    # Поля (в том числе через связи) и соответствующие им заголовки столбцов
+    fields = ()
+    headers = ()
+    ordering = ("id",)
+    filename = "export"
+
+    # Метод фильтрации исходного набора данных (переопределяется в представлениях);
+    # ValueError при неправильных параметрах запроса превращается в ответ 400
+    def filter_queryset(self, queryset):
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        self.is_manager = get_is_manager(request.user, "Менеджеры")
+        write, content_type, extension = EXPORT_FORMATS.get(request.GET.get("format"), EXPORT_FORMATS["csv"])
+        try:
+            queryset = self.filter_queryset(self.model.objects.order_by(*self.ordering))
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        response = StreamingHttpResponse(
+            write(self.headers or self.fields, iter_rows(queryset, self.fields)), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{self.filename}.{extension}"'
+        return response
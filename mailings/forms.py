@@ -1,7 +1,8 @@
 from django import forms
-from email_validator import validate_email
 
 from .models import Attempt, MailingList, Message, Recipient
+from .rendering import validate_template
+from .validation import validate_address
 
 
 # =================== Форма модели «Получатель рассылки» =============================================================
@@ -12,21 +13,55 @@ class RecipientForm(forms.ModelForm):
         model = Recipient
         fields = ["email", "full_name", "comment"]
 
-    # Валидатор для проверки поля email
+    # Валидатор для проверки поля email: формат адреса и домен (через кеш проверок доменов)
     def clean_email(self):
         email = self.cleaned_data.get("email")
-        if email and not validate_email(email):
-            raise forms.ValidationError("Неправильный формат Электронной почты.")
+        if email:
+            validate_address(email)
         return email
 
 
+# =================== Форма импорта получателей =======================================================================
+class RecipientImportForm(forms.Form):
+    """Форма загрузки файла с получателями (CSV или XLSX)"""
+
+    file = forms.FileField(label="Файл CSV или XLSX")
+    mailing_list = forms.ModelChoiceField(
+        queryset=MailingList.objects.none(), required=False, label="Добавить в рассылку"
+    )
+
+    # Стилизация полей формы
+    def __init__(self, user=None, *args, **kwargs):
+        super(RecipientImportForm, self).__init__(*args, **kwargs)
+
+        # ---------- File -------------
+        self.fields["file"].widget.attrs.update({"class": "form-control", "accept": ".csv,.xlsx"})
+
+        # ---------- Mailing List -------------
+        self.fields["mailing_list"].widget.attrs.update({"class": "form-select"})
+
+        if user:
+            self.fields["mailing_list"].queryset = MailingList.objects.filter(owner=user).select_related("message")
+
+    # Валидатор для проверки расширения файла
+    def clean_file(self):
+        file = self.cleaned_data.get("file")
+        if file and not file.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError("Поддерживаются только файлы CSV и XLSX.")
+        return file
+
+
 # =================== Форма модели «Сообщение» =======================================================================
 class MessageForm(forms.ModelForm):
     """Форма модели Сообщение"""
 
     class Meta:
         model = Message
-        fields = ["subject", "letter_body"]
+        fields = ["subject", "letter_body", "html_body"]
+        help_texts = {
+            "letter_body": "Подстановки: {{ full_name }}, {{ email }}, {{ unsubscribe_url }}.",
+            "html_body": "Необязательная HTML-версия письма с теми же подстановками.",
+        }
 
     # Стилизация полей формы
     def __init__(self, *args, **kwargs):
@@ -38,6 +73,26 @@ class MessageForm(forms.ModelForm):
         # ---------- Body -------------
         self.fields["letter_body"].widget.attrs.update({"class": "form-control", "placeholder": "Введите текст письма"})
 
+        # ---------- HTML Body -------------
+        self.fields["html_body"].widget.attrs.update({"class": "form-control", "placeholder": "<p>Здравствуйте!</p>"})
+
+    # Проверка шаблона: ошибка в тексте видна при сохранении, а не при отправке. Тексты старых
+    # сообщений (без подстановок) отправляются как есть и не проверяются
+    def clean_template(self, name, autoescape=False):
+        value = self.cleaned_data.get(name)
+        if value and self.instance.is_template:
+            validate_template(value, autoescape=autoescape)
+        return value
+
+    def clean_subject(self):
+        return self.clean_template("subject")
+
+    def clean_letter_body(self):
+        return self.clean_template("letter_body")
+
+    def clean_html_body(self):
+        return self.clean_template("html_body", autoescape=True)
+
 
 # =================== Форма модели «Рассылка» =======================================================================
 class MailingListForm(forms.ModelForm):
@@ -0,0 +1,183 @@
+import csv
+import io
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from config import settings
+
+from .caching import bump_model_version
+from .dedup import normalize_email
+from .models import MailingList, Recipient
+from .validation import domain_validator, get_domain
+
+# Допустимые заголовки столбцов файла импорта; без строки заголовка столбцы читаются как email, Ф.И.О., комментарий
+COLUMN_ALIASES = {
+    "email": "email",
+    "e-mail": "email",
+    "почта": "email",
+    "электронная почта": "email",
+    "full_name": "full_name",
+    "name": "full_name",
+    "фио": "full_name",
+    "ф.и.о.": "full_name",
+    "comment": "comment",
+    "комментарий": "comment",
+}
+DEFAULT_COLUMNS = ("email", "full_name", "comment")
+
+
+# Потоковое чтение строк CSV-файла (файл не загружается в память целиком)
+def iter_csv_rows(file):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        text.detach()
+
+
+# Потоковое чтение строк первого листа XLSX-файла (режим read_only openpyxl)
+def iter_xlsx_rows(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Для импорта XLSX установите пакет openpyxl.")
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ["" if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+# Строки файла в виде словарей email / full_name / comment
+def iter_records(file, filename):
+    rows = iter_xlsx_rows(file) if filename.lower().endswith(".xlsx") else iter_csv_rows(file)
+    first = next(rows, None)
+    if first is None:
+        return
+    header = [COLUMN_ALIASES.get(str(cell).strip().lower()) for cell in first]
+    if "email" in header:
+        columns = header
+    else:
+        columns = DEFAULT_COLUMNS
+        rows = _prepend(first, rows)
+    for row in rows:
+        record = {name: str(value).strip() for name, value in zip(columns, row) if name}
+        if any(record.values()):
+            yield record
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+# Проверка формата адреса валидатором Django: без DNS-запросов и на порядок быстрее email_validator,
+# что заметно на файлах в сотни тысяч строк. Домен приводится к нижнему регистру
+def clean_email(email):
+    try:
+        validate_email(email)
+    except ValidationError:
+        return None
+    local, domain = email.rsplit("@", 1)
+    return f"{local}@{domain.lower()}"
+
+
+class RecipientImporter:
+    """Пакетный импорт получателей: проверка адресов, вставка новых через bulk_create(ignore_conflicts=True)
+    и привязка к рассылке вставкой строк промежуточной таблицы. Память не растёт с размером файла.
+    Адреса сравниваются в нормализованном виде: Foo@x.com и foo@x.com — один получатель.
+    resolve_domains=False — не ждать DNS (импорт из веб-интерфейса): отсеиваются только домены, уже известные
+    кешу как нерабочие, остальные проверяются в фоне и отсеются перед отправкой"""
+
+    def __init__(self, owner, mailing_list=None, batch_size=None, progress=None, resolve_domains=True):
+        self.owner = owner
+        self.mailing_list = mailing_list
+        self.batch_size = batch_size or settings.MAILING_IMPORT_BATCH_SIZE
+        self.progress = progress
+        self.resolve_domains = resolve_domains
+        self.stats = {"rows": 0, "created": 0, "existing": 0, "invalid": 0, "undeliverable": 0, "attached": 0}
+
+    # Импорт всех строк файла; возвращает счётчики
+    def run(self, file, filename):
+        records = iter_records(file, filename)
+        try:
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+                if self.progress:
+                    self.progress(self.stats)
+        finally:
+            # bulk_create не отправляет сигналы, поэтому кеш списков сбрасывается явно
+            bump_model_version(Recipient)
+            if self.mailing_list is not None:
+                bump_model_version(MailingList)
+        return self.stats
+
+    # Импорт одного пакета строк: 2 запроса на получателей и 2 на привязку к рассылке;
+    # адреса с доменом, который не принимает почту, пропускаются
+    def import_batch(self, batch):
+        self.stats["rows"] += len(batch)
+        records = {}
+        for record in batch:
+            email = clean_email(record.get("email", ""))
+            if email is None:
+                self.stats["invalid"] += 1
+            else:
+                records.setdefault(normalize_email(email), {**record, "email": email})
+        # Домены проверяются по одному разу на пакет (и берутся из кеша, если уже проверялись)
+        domains = {get_domain(email) for email in records}
+        if self.resolve_domains:
+            bad_domains = {
+                domain for domain, result in domain_validator.check_many(domains).items() if result is False
+            }
+        else:
+            bad_domains = domain_validator.cached_bad(domains)
+        for normalized in [key for key in records if get_domain(key) in bad_domains]:
+            del records[normalized]
+            self.stats["undeliverable"] += 1
+
+        with transaction.atomic():
+            recipients = Recipient.objects.filter(owner=self.owner, email_normalized__in=records)
+            existing = set(recipients.values_list("email_normalized", flat=True).iterator())
+            Recipient.objects.bulk_create(
+                [
+                    Recipient(
+                        email=record["email"],
+                        full_name=record.get("full_name") or record["email"],
+                        comment=record.get("comment") or None,
+                        owner=self.owner,
+                    )
+                    for normalized, record in records.items()
+                    if normalized not in existing
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            self.stats["created"] += len(records) - len(existing)
+            self.stats["existing"] += len(existing)
+
+            if self.mailing_list is not None:
+                through = MailingList.recipients.through
+                links = [
+                    through(mailinglist_id=self.mailing_list.pk, recipient_id=pk)
+                    for pk in recipients.values_list("id", flat=True)
+                ]
+                through.objects.bulk_create(links, batch_size=self.batch_size, ignore_conflicts=True)
+                self.stats["attached"] += len(links)
+
+
+# Импорт получателей из файла (CSV или XLSX) с необязательной привязкой к рассылке
+def import_recipients(file, filename, owner, mailing_list=None, batch_size=None, progress=None, resolve_domains=True):
+    return RecipientImporter(owner, mailing_list, batch_size, progress, resolve_domains).run(file, filename)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from mailings.benchmarks import seed_dataset
+from mailings.models import Attempt, MailingList, Recipient
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """Планы и время выполнения горячих запросов. Для сравнения «до/после» индексов запустите команду
+    на миграции 0006_mailingstats и после migrate на 0007_hot_path_indexes"""
+
+    help = "Show query plans and timings for the hot filter paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true", help="Сначала наполнить базу синтетическими данными.")
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--recipients", type=int, default=100_000)
+        parser.add_argument("--mailings", type=int, default=2_000)
+        parser.add_argument("--attempts", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=5, help="Сколько раз выполнять каждый запрос.")
+        parser.add_argument("--no-explain", action="store_true", help="Не выводить планы запросов.")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            started = time.perf_counter()
+            seed_dataset(options["users"], options["recipients"], options["mailings"], options["attempts"])
+            self.stdout.write(f"Данные созданы за {time.perf_counter() - started:.1f} с.")
+
+        owner = (
+            CustomUser.objects.annotate(mailings=Count("mailinglist_owner")).order_by("-mailings").first()
+            or CustomUser.objects.first()
+        )
+        queries = {
+            "Запущенные рассылки (send_mailing)": MailingList.objects.filter(status="started"),
+            "Рассылки пользователя по статусу": MailingList.objects.filter(owner=owner, status="started"),
+            "Страница списка попыток": Attempt.objects.filter(mailing_list__owner=owner).order_by("attempt_time")[:50],
+            "Неуспешные попытки пользователя": Attempt.objects.filter(result="failed", mailing_list__owner=owner)[:50],
+            "Страница списка получателей": Recipient.objects.filter(owner=owner).order_by("full_name")[:50],
+            "Агрегат главной страницы": MailingList.objects.filter(owner=owner)
+            .values("owner")
+            .annotate(total=Count("id"), active=Count("id", filter=Q(status="started"))),
+        }
+        for title, queryset in queries.items():
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(self.style.SUCCESS(f"{title}: лучшее {min(timings) * 1000:.2f} мс"))
+            if not options["no_explain"]:
+                self.stdout.write(queryset.explain())
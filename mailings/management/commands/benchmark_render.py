@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from mailings.benchmarks import measure
+from mailings.models import Message
+from mailings.rendering import MessageRenderer
+from mailings.services import RecipientRow
+
+TEXT = "Здравствуйте, {{ full_name }}!\n\nНовости месяца для {{ email }}.\n\nОтписаться: {{ unsubscribe_url }}"
+HTML = (
+    "<p>Здравствуйте, <b>{{ full_name }}</b>!</p><p>Новости месяца.</p><a href='{{ unsubscribe_url }}'>Отписаться</a>"
+)
+TAGS = "{% if full_name %}Здравствуйте, {{ full_name|title }}!{% else %}Здравствуйте!{% endif %} {{ unsubscribe_url }}"
+
+
+class Command(BaseCommand):
+    """Скорость подстановки значений получателей в шаблоны писем и сборки писем"""
+
+    help = "Benchmark personalised message rendering."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=100_000, help="Количество получателей в замере.")
+
+    def handle(self, *args, **options):
+        count = options["recipients"]
+        recipients = [RecipientRow(i, f"recipient{i}@example.com", f"Получатель {i}") for i in range(count)]
+        variants = [
+            ("Текст без подстановок", Message(pk=1, subject="Новости", letter_body="Новости месяца.")),
+            ("Подстановки {{ имя }}, текст", Message(pk=2, subject="Новости для {{ full_name }}", letter_body=TEXT)),
+            (
+                "Подстановки {{ имя }}, текст + HTML",
+                Message(pk=3, subject="Новости для {{ full_name }}", letter_body=TEXT, html_body=HTML),
+            ),
+            ("Шаблонизатор Django (теги и фильтры)", Message(pk=4, subject="Новости", letter_body=TAGS)),
+        ]
+        for title, message in variants:
+            renderer = MessageRenderer(message)
+            context = {"unsubscribe_url": "http://localhost:8000/mailings/unsubscribe/token/"}
+
+            def render_all():
+                for recipient in recipients:
+                    context["full_name"] = recipient.full_name
+                    context["email"] = recipient.email
+                    renderer.render(context)
+
+            def build_all():
+                for recipient in recipients:
+                    renderer.build(1, recipient)
+
+            _, elapsed, rate = measure(render_all, count)
+            self.stdout.write(f"{title}: подстановка — {rate:,.0f} писем/с ({elapsed:.2f} с)")
+            _, elapsed, rate = measure(build_all, count)
+            self.stdout.write(f"{title}: сборка письма с отпиской — {rate:,.0f} писем/с ({elapsed:.2f} с)")
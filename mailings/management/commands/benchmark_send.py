@@ -0,0 +1,101 @@
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.core.management.base import BaseCommand
+
+from mailings.benchmarks import SMTPSink, measure
+from mailings.services import MailingSender
+
+
+class Command(BaseCommand):
+    """Сравнение скорости отправки: новое SMTP-соединение на письмо против одной сессии на запуск"""
+
+    help = "Benchmark mailing delivery against a local SMTP sink."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500, help="Количество писем в замере.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Размер пачки для MailingSender.")
+        parser.add_argument(
+            "--concurrency", type=int, default=20, help="Число одновременных SMTP-сессий асинхронного движка."
+        )
+        parser.add_argument(
+            "--handshake-delay",
+            type=float,
+            default=0.0,
+            help="Искусственная задержка установки SMTP-сессии, сек (имитация TLS + AUTH).",
+        )
+        parser.add_argument(
+            "--reply-delay",
+            type=float,
+            default=0.0,
+            help="Искусственная задержка ответа сервера на каждое письмо, сек.",
+        )
+
+    def handle(self, *args, **options):
+        count = options["messages"]
+        addresses = [f"recipient{i}@example.com" for i in range(count)]
+
+        with SMTPSink(handshake_delay=options["handshake_delay"], reply_delay=options["reply_delay"]) as sink:
+            connection_kwargs = {
+                "backend": "django.core.mail.backends.smtp.EmailBackend",
+                "host": sink.server_address[0],
+                "port": sink.port,
+                "username": "",
+                "password": "",
+                "use_tls": False,
+                "use_ssl": False,
+            }
+
+            # До: send_mail на каждого получателя, каждое письмо открывает свою SMTP-сессию
+            def send_one_by_one():
+                for address in addresses:
+                    send_mail(
+                        "Benchmark",
+                        "Body",
+                        "bench@example.com",
+                        [address],
+                        connection=get_connection(**connection_kwargs),
+                    )
+
+            # Пачка за пачкой через переданный движок отправки
+            def send_with(sender):
+                with sender:
+                    for start in range(0, count, sender.batch_size):
+                        messages = [
+                            EmailMessage("Benchmark", "Body", "bench@example.com", [address])
+                            for address in addresses[start : start + sender.batch_size]
+                        ]
+                        errors = [error for error in sender.send_batch(messages) if error]
+                        if errors:
+                            raise errors[0]
+
+            # После: одна SMTP-сессия на весь запуск, письма уходят пачками
+            variants = [
+                ("send_mail на письмо", send_one_by_one),
+                (
+                    "MailingSender",
+                    lambda: send_with(MailingSender(batch_size=options["batch_size"], **connection_kwargs)),
+                ),
+            ]
+            # Асинхронный движок: пул SMTP-сессий в одном цикле событий
+            try:
+                from mailings.async_sender import AsyncMailingSender
+            except ImportError:
+                self.stdout.write(self.style.WARNING("aiosmtplib не установлен, асинхронный движок пропущен."))
+            else:
+                variants.append(
+                    (
+                        f"AsyncMailingSender x{options['concurrency']}",
+                        lambda: send_with(
+                            AsyncMailingSender(
+                                batch_size=options["batch_size"],
+                                concurrency=options["concurrency"],
+                                **connection_kwargs,
+                            )
+                        ),
+                    )
+                )
+
+            for title, func in variants:
+                sent, elapsed, rate = measure(func, count)
+                self.stdout.write(f"{title}: {sent} писем за {elapsed:.2f} с — {rate:.1f} писем/с")
+
+        self.stdout.write(self.style.SUCCESS(f"Сервер-заглушка принял {sink.received} писем."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mailings.services import dedupe_recipients
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """Слияние получателей с одинаковым нормализованным адресом у одного владельца: связи с рассылками
+    и журнал доставки переносятся на получателя с наименьшим id, остальные удаляются"""
+
+    help = "Merge recipients whose e-mail addresses differ only in case or surrounding spaces."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Email владельца (по умолчанию все владельцы).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Сколько групп дублей сливать за раз.")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать дубли.")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            try:
+                owner = CustomUser.objects.get(email=options["owner"])
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"Пользователь {options['owner']} не найден.")
+        summary = dedupe_recipients(owner, dry_run=options["dry_run"], batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Групп дублей: {summary['groups']}, удалено получателей: {summary['merged']}.")
+        )
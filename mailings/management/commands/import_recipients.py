@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mailings.imports import import_recipients
+from mailings.models import MailingList
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """Импорт получателей из файла CSV или XLSX с выводом прогресса"""
+
+    help = "Import recipients from a CSV or XLSX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу CSV или XLSX.")
+        parser.add_argument("--owner", required=True, help="Email владельца получателей.")
+        parser.add_argument("--mailing-list", type=int, help="Id рассылки, в которую добавить получателей.")
+        parser.add_argument("--batch-size", type=int, help="Сколько строк обрабатывать за один пакет.")
+
+    def handle(self, *args, **options):
+        try:
+            owner = CustomUser.objects.get(email=options["owner"])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Пользователь {options['owner']} не найден.")
+        mailing_list = None
+        if options["mailing_list"]:
+            try:
+                mailing_list = MailingList.objects.get(pk=options["mailing_list"], owner=owner)
+            except MailingList.DoesNotExist:
+                raise CommandError(f"Рассылка {options['mailing_list']} пользователя {owner} не найдена.")
+
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"Обработано строк: {stats['rows']} ({stats['rows'] / elapsed:.0f} строк/с)")
+
+        with open(options["path"], "rb") as file:
+            try:
+                stats = import_recipients(
+                    file, options["path"], owner, mailing_list, options["batch_size"], progress=progress
+                )
+            except (ValueError, UnicodeDecodeError) as e:
+                raise CommandError(f"Не удалось прочитать файл: {e}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово за {time.perf_counter() - started:.1f} с. Добавлено: {stats['created']}, "
+                f"уже были: {stats['existing']}, с ошибкой в адресе: {stats['invalid']}, "
+                f"домен не принимает почту: {stats['undeliverable']}, "
+                f"добавлено в рассылку: {stats['attached']}."
+            )
+        )
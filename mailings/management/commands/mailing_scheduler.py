@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from mailings.scheduler import MailingScheduler
+
+
+class Command(BaseCommand):
+    """Планировщик рассылок: переводит рассылки created → started → completed точно по start_time/end_time
+    и запускает отправку (задачей для run_mailing_worker или прямо в процессе с --inline)"""
+
+    help = "Run the mailing scheduler."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Обработать наступившие события и завершиться.")
+        parser.add_argument("--inline", action="store_true", help="Отправлять рассылки в процессе планировщика.")
+        parser.add_argument("--horizon", type=int, help="На сколько секунд вперёд загружать события.")
+
+    def handle(self, *args, **options):
+        scheduler = MailingScheduler(horizon=options["horizon"], inline=options["inline"])
+        if options["once"]:
+            changed = scheduler.run_due()
+            self.stdout.write(self.style.SUCCESS(f"Рассылок с изменённым статусом: {changed}."))
+        else:
+            self.stdout.write("Планировщик рассылок запущен.")
+            scheduler.run_forever()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from config import settings
+from mailings.services import prune_attempts
+
+
+class Command(BaseCommand):
+    """Очистка журнала попыток: старые попытки сворачиваются в дневные сводки и удаляются,
+    на PostgreSQL заранее создаются секции следующих месяцев. Запускается периодически (например, раз в сутки)"""
+
+    help = "Roll up and drop mailing attempts older than the retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-months",
+            type=int,
+            default=settings.MAILING_ATTEMPT_RETENTION_MONTHS,
+            help="Сколько месяцев хранить подробные попытки.",
+        )
+        parser.add_argument("--months-ahead", type=int, default=2, help="На сколько месяцев вперёд создавать секции.")
+
+    def handle(self, *args, **options):
+        summary = prune_attempts(options["keep_months"], options["months_ahead"])
+        dropped = ", ".join(f"{month:%Y-%m}" for month in summary["dropped_partitions"]) or "нет"
+        created = ", ".join(f"{month:%Y-%m}" for month in summary["created_partitions"]) or "нет"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Сводок записано: {summary['rollups']}, удалено секций: {dropped}, "
+                f"удалено строк: {summary['deleted']}, создано секций: {created}."
+            )
+        )
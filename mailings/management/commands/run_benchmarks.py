@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from mailings.benchmarks import run_suite, seed_dataset
+
+
+class Command(BaseCommand):
+    """Набор замеров производительности: пропускная способность отправки на SMTP-сервер-заглушку,
+    время ответа и число запросов страниц списков, запросы статистики главной страницы.
+    Результат в JSON для сравнения между версиями"""
+
+    help = "Run the performance benchmark suite and emit JSON results."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true", help="Сначала наполнить базу синтетическими данными.")
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--recipients", type=int, default=100_000)
+        parser.add_argument("--mailings", type=int, default=2_000)
+        parser.add_argument("--attempts", type=int, default=1_000_000)
+        parser.add_argument(
+            "--send-recipients", type=int, default=1000, help="Количество получателей в замере отправки."
+        )
+        parser.add_argument("--batch-size", type=int, default=None, help="Размер пачки отправки.")
+        parser.add_argument("--repeat", type=int, default=5, help="Сколько раз запрашивать каждую страницу.")
+        parser.add_argument(
+            "--handshake-delay", type=float, default=0.0, help="Задержка установки SMTP-сессии заглушки, сек."
+        )
+        parser.add_argument("--reply-delay", type=float, default=0.0, help="Задержка ответа заглушки на письмо, сек.")
+        parser.add_argument("--output", help="Записать результат в файл вместо вывода в консоль.")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed_dataset(options["users"], options["recipients"], options["mailings"], options["attempts"])
+        result = run_suite(
+            send_recipients=options["send_recipients"],
+            batch_size=options["batch_size"],
+            repeat=options["repeat"],
+            handshake_delay=options["handshake_delay"],
+            reply_delay=options["reply_delay"],
+        )
+        report = json.dumps(result, ensure_ascii=False, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(report + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Результаты записаны в {options['output']}."))
+        else:
+            self.stdout.write(report)
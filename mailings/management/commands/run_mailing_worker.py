@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mailings.services import claim_job, process_retries, run_job
+
+
+class Command(BaseCommand):
+    """Воркер очереди отправки: забирает задачи SendJob и выполняет рассылки,
+    в перерывах повторно отправляет письма после временных ошибок"""
+
+    help = "Process queued mailing send jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Выполнить задачи из очереди и завершиться.")
+        parser.add_argument("--sleep", type=float, default=5.0, help="Пауза при пустой очереди, сек.")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                retries = process_retries()
+                if retries["retried"]:
+                    self.stdout.write(
+                        f"Повторная отправка: {retries['retried']}, успешно {retries['sent']}, "
+                        f"с ошибкой {retries['failed']}"
+                    )
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+            run_job(job)
+            self.stdout.write(f"{job} (рассылка {job.mailing_list_id})")
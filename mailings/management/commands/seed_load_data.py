@@ -0,0 +1,33 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from mailings.benchmarks import seed_dataset
+
+
+class Command(BaseCommand):
+    """Наполнение базы синтетическими данными для нагрузочных замеров; итог выводится в JSON"""
+
+    help = "Generate synthetic users, recipients, mailings and attempts for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="Количество пользователей.")
+        parser.add_argument("--recipients", type=int, default=100_000, help="Количество получателей.")
+        parser.add_argument("--mailings", type=int, default=2_000, help="Количество рассылок.")
+        parser.add_argument("--attempts", type=int, default=1_000_000, help="Количество попыток рассылки.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Размер пачки bulk_create.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        owners = seed_dataset(
+            options["users"], options["recipients"], options["mailings"], options["attempts"], options["batch_size"]
+        )
+        result = {
+            "users": len(owners),
+            "recipients": options["recipients"],
+            "mailings": options["mailings"],
+            "attempts": options["attempts"],
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        self.stdout.write(json.dumps(result, ensure_ascii=False))
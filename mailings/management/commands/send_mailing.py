@@ -1,36 +1,83 @@
 import logging
-import os
 
-from django.core.mail import send_mail
 from django.core.management.base import BaseCommand
 from django.utils.timezone import now
 
-from config import settings
-from mailings.models import Attempt, MailingList
+from mailings import metrics
+from mailings.models import MailingList
+from mailings.services import deliver_mailinglists, process_retries
 
 logger = logging.getLogger(__name__)
-log_file_path = os.path.join(settings.BASE_DIR, "logs", "mailing_send.log")
-file_handler = logging.FileHandler(log_file_path, encoding="utf-8")
-formatter = logging.Formatter("%(asctime)s [%(levelname)s]: %(message)s")
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
-logger.setLevel(logging.INFO)
+
+# Сколько доменов показывать в сводке запуска
+DOMAIN_SUMMARY_SIZE = 10
 
 
 class Command(BaseCommand):
     help = "Send mailings to recipients."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Количество писем в одной пачке отправки (по умолчанию MAILING_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Количество потоков отправки, у каждого своя SMTP-сессия.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Максимум пачек, ожидающих отправки в очереди (по умолчанию workers * 2).",
+        )
+
     def handle(self, *args, **options):
-        from_email = settings.EMAIL_HOST_USER
-        for mailing in MailingList.objects.filter(status="started"):
-            if not mailing.end_time or mailing.start_time <= now() < mailing.end_time:
-                for recipient in mailing.recipients.all():
-                    try:
-                        send_mail(mailing.message.subject, mailing.message.letter_body, from_email, [recipient.email])
-                        Attempt.objects.create(result="successful", mailing_list_id=mailing.id)
-                        logger.info(
-                            f"Рассылка с идентификатором={mailing.id} для клиента: {recipient} произведена успешно."
-                        )
-                    except Exception as e:
-                        Attempt.objects.create(result="failed", server_response=str(e), mailing_list_id=mailing.id)
-                        logger.error(f"Ошибка отправки: {e}")
+        mailings = (
+            mailing
+            for mailing in MailingList.objects.filter(status="started").select_related("message")
+            if not mailing.end_time or mailing.start_time <= now() < mailing.end_time
+        )
+        summary = deliver_mailinglists(
+            mailings,
+            workers=options["workers"],
+            concurrency=options["concurrency"],
+            batch_size=options["batch_size"],
+        )
+        # Получатели, срок повторной отправки которых уже наступил
+        retries = process_retries(batch_size=options["batch_size"])
+        report = (
+            f"Рассылок: {summary['mailings']}, отправлено: {summary['sent']}, ошибок: {summary['failed']}, "
+            f"повторов: {retries['retried']} (успешно {retries['sent']}), "
+            f"потоков: {summary['workers']}, время: {summary['elapsed']:.2f} с."
+        )
+        logger.info(report)
+        self.stdout.write(self.style.SUCCESS(report))
+        self.write_domain_summary(summary["domains"])
+        self.write_stage_summary()
+
+    # Скорость и доля ошибок по доменам с наибольшим числом писем
+    def write_domain_summary(self, stats):
+        for domain, total, failed, rate, failure_rate in stats.report(DOMAIN_SUMMARY_SIZE):
+            line = f"  {domain}: {total} писем, ошибок {failed} ({failure_rate:.1%})"
+            if rate is not None:
+                line += f", {rate:.1f} писем/с"
+            logger.info(line.strip())
+            self.stdout.write(line)
+
+    # Сводка метрик этапов отправки за этот запуск
+    def write_stage_summary(self):
+        for name, series in metrics.registry.snapshot().items():
+            for labels, values in series:
+                title = name + metrics.format_labels(labels)
+                if "count" in values:
+                    average = values["sum"] / values["count"] * 1000 if values["count"] else 0
+                    self.stdout.write(
+                        f"  {title}: {values['count']} раз, всего {values['sum']:.3f} с, в среднем {average:.2f} мс"
+                    )
+                else:
+                    self.stdout.write(f"  {title}: {values['value']}")
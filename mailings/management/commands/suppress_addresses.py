@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mailings.models import SUPPRESSION_REASON_CHOICES
+from mailings.suppression import suppress
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """Добавление адресов в список подавления, например по отчётам о жалобах (feedback loop) почтовых служб
+    или по отказам, полученным вне отправки. Адреса берутся из аргументов и из файла (по одному в строке)"""
+
+    help = "Add e-mail addresses to the suppression list."
+
+    def add_arguments(self, parser):
+        parser.add_argument("emails", nargs="*", help="Адреса.")
+        parser.add_argument("--file", help="Файл с адресами, по одному в строке.")
+        parser.add_argument(
+            "--reason",
+            choices=[reason for reason, _ in SUPPRESSION_REASON_CHOICES],
+            default="complaint",
+            help="Причина подавления.",
+        )
+        parser.add_argument("--owner", help="Email владельца: подавить только для его рассылок.")
+
+    def handle(self, *args, **options):
+        emails = list(options["emails"])
+        if options["file"]:
+            with open(options["file"], encoding="utf-8") as file:
+                emails += [line.strip() for line in file if line.strip()]
+        if not emails:
+            raise CommandError("Укажите адреса или файл с адресами.")
+        owner_id = None
+        if options["owner"]:
+            try:
+                owner_id = CustomUser.objects.get(email=options["owner"]).pk
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"Пользователь {options['owner']} не найден.")
+        count = suppress(emails, options["reason"], owner_id=owner_id)
+        self.stdout.write(self.style.SUCCESS(f"Адресов в списке подавления: {count}."))
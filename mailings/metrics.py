@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from config import settings
+
+# Границы корзин гистограмм длительности, сек
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Ключ списка известных серий в кеше
+INDEX_KEY = "metrics:index"
+# Суммы длительностей хранятся в кеше целыми микросекундами (incr работает только с целыми)
+MICROSECONDS = 1_000_000
+
+# Описания метрик для вывода # HELP
+DESCRIPTIONS = {
+    "mailing_db_fetch_seconds": "Чтение порции получателей из базы",
+    "mailing_render_seconds": "Сборка персонального письма",
+    "mailing_smtp_connect_seconds": "Открытие SMTP-сессии",
+    "mailing_smtp_send_seconds": "Отправка одного письма по SMTP",
+    "mailing_attempt_flush_seconds": "Запись буфера попыток в базу",
+    "mailing_attempts_total": "Записанные попытки отправки",
+    "mailing_send_errors_total": "Ошибки отправки по видам",
+    "mailing_suppressed_total": "Письма, не отправленные адресам из списка подавления",
+    "mailing_queue_depth": "Пачек в очереди потоков отправки",
+    "mailing_send_jobs_queued": "Задач отправки в очереди",
+    "mailing_retries_due": "Доставок, ожидающих повторной отправки",
+}
+
+
+# Ключ серии в кеше: имя и метки без пробелов (допустимый ключ и для memcached)
+def series_key(name, labels):
+    return f"{name}:{json.dumps(labels, sort_keys=True, separators=(',', ':'))}" if labels else name
+
+
+def _incr(key, delta):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+class MetricsRegistry:
+    """Счётчики, гистограммы и показатели процесса. Изменения копятся в памяти и раз в
+    MAILING_METRICS_FLUSH_INTERVAL секунд прибавляются к общим значениям в кеше (incr), поэтому
+    эндпоинт /metrics видит сумму по всем воркерам. Итоги процесса хранятся отдельно для сводки"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.totals = {}
+        self.gauges = {}
+        self.last_flush = time.monotonic()
+
+    # Метод увеличения счётчика
+    def inc(self, name, value=1, **labels):
+        key = (name, series_key(name, labels))
+        with self.lock:
+            for store in (self.pending, self.totals):
+                entry = store.setdefault(key, {"type": "counter", "labels": labels, "value": 0})
+                entry["value"] += value
+        self.maybe_flush()
+
+    # Метод записи длительности в гистограмму
+    def observe(self, name, seconds, **labels):
+        key = (name, series_key(name, labels))
+        bucket = bisect_left(BUCKETS, seconds)
+        with self.lock:
+            for store in (self.pending, self.totals):
+                entry = store.setdefault(
+                    key,
+                    {
+                        "type": "histogram",
+                        "labels": labels,
+                        "buckets": [0] * (len(BUCKETS) + 1),
+                        "sum": 0.0,
+                        "count": 0,
+                    },
+                )
+                entry["buckets"][bucket] += 1
+                entry["sum"] += seconds
+                entry["count"] += 1
+        self.maybe_flush()
+
+    # Метод установки текущего значения показателя (например, глубины очереди)
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, series_key(name, labels))] = {"type": "gauge", "labels": labels, "value": value}
+
+    # Замер длительности блока кода
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= settings.MAILING_METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    # Метод переноса накопленных изменений в кеш
+    def flush(self):
+        with self.lock:
+            pending, gauges = self.pending, self.gauges
+            self.pending, self.gauges = {}, {}
+            self.last_flush = time.monotonic()
+        if not pending and not gauges:
+            return
+        index = cache.get(INDEX_KEY) or {}
+        missing = {}
+        for (name, key), entry in list(pending.items()) + list(gauges.items()):
+            if key not in index:
+                missing[key] = {"name": name, "type": entry["type"], "labels": entry["labels"]}
+            if entry["type"] == "counter":
+                _incr(f"metrics:{key}", entry["value"])
+            elif entry["type"] == "gauge":
+                cache.set(f"metrics:{key}", entry["value"], None)
+            else:
+                for i, count in enumerate(entry["buckets"]):
+                    if count:
+                        _incr(f"metrics:{key}:b{i}", count)
+                _incr(f"metrics:{key}:sum", round(entry["sum"] * MICROSECONDS))
+                _incr(f"metrics:{key}:count", entry["count"])
+        if missing:
+            # Список серий дописывается без блокировки: потерянная при гонке серия добавится при следующем сбросе
+            cache.set(INDEX_KEY, {**(cache.get(INDEX_KEY) or {}), **missing}, None)
+
+    # Итоги процесса: {имя: [(метки, значения)]} для сводки в конце запуска
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for (name, _), entry in sorted(self.totals.items()):
+                result.setdefault(name, []).append(
+                    (entry["labels"], {key: value for key, value in entry.items() if key not in ("labels", "type")})
+                )
+            return result
+
+
+registry = MetricsRegistry()
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set_gauge
+timer = registry.timer
+
+
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+# Текстовый формат Prometheus по общим значениям из кеша; extra_gauges — показатели, вычисленные при запросе
+def render_prometheus(extra_gauges=None):
+    index = cache.get(INDEX_KEY) or {}
+    keys = []
+    for key, meta in index.items():
+        if meta["type"] == "histogram":
+            keys += [f"metrics:{key}:b{i}" for i in range(len(BUCKETS) + 1)]
+            keys += [f"metrics:{key}:sum", f"metrics:{key}:count"]
+        else:
+            keys.append(f"metrics:{key}")
+    values = cache.get_many(keys)
+
+    series = {}
+    for key, meta in index.items():
+        series.setdefault(meta["name"], (meta["type"], []))[1].append((key, meta["labels"]))
+    for name, value in (extra_gauges or {}).items():
+        series[name] = ("gauge", [(None, value)])
+
+    lines = []
+    for name in sorted(series):
+        kind, items = series[name]
+        if name in DESCRIPTIONS:
+            lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, labels in items:
+            if key is None:
+                lines.append(f"{name} {labels}")
+            elif kind == "histogram":
+                cumulative = 0
+                for i, bound in enumerate((*BUCKETS, "+Inf")):
+                    cumulative += values.get(f"metrics:{key}:b{i}", 0)
+                    lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+                total = values.get(f"metrics:{key}:sum", 0) / MICROSECONDS
+                lines.append(f"{name}_sum{format_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {values.get(f'metrics:{key}:count', 0)}")
+            else:
+                lines.append(f"{name}{format_labels(labels)} {values.get(f'metrics:{key}', 0)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0003_message_owner"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SendJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Выполнена"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата и время постановки в очередь"),
+                ),
+                ("started_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата и время начала")),
+                ("finished_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата и время окончания")),
+                ("error", models.TextField(blank=True, null=True, verbose_name="Ошибка")),
+                (
+                    "mailing_list",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="send_jobs",
+                        to="mailings.mailinglist",
+                        verbose_name="Рассылка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Задача отправки",
+                "verbose_name_plural": "Задачи отправки",
+                "ordering": ["created_at"],
+                "indexes": [models.Index(fields=["status", "created_at"], name="sendjob_status_created_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0004_sendjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailingRun",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("running", "Выполняется"), ("completed", "Завершён")],
+                        default="running",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("started_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата и время начала")),
+                ("finished_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата и время окончания")),
+                (
+                    "checkpoint",
+                    models.BigIntegerField(default=0, verbose_name="Последний обработанный получатель (id)"),
+                ),
+                (
+                    "mailing_list",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="runs",
+                        to="mailings.mailinglist",
+                        verbose_name="Рассылка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запуск рассылки",
+                "verbose_name_plural": "Запуски рассылок",
+                "ordering": ["started_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="Delivery",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "result",
+                    models.CharField(
+                        choices=[("successful", "Успешно"), ("failed", "Не успешно")],
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата и время")),
+                (
+                    "mailing_list",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="mailings.mailinglist", verbose_name="Рассылка"
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="mailings.recipient", verbose_name="Получатель"
+                    ),
+                ),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="mailings.mailingrun",
+                        verbose_name="Запуск",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Доставка получателю",
+                "verbose_name_plural": "Доставки получателям",
+                "ordering": ["created_at"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("mailing_list", "recipient", "run"), name="unique_delivery_per_run"
+                    )
+                ],
+            },
+        ),
+    ]
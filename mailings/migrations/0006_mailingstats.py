@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+# Заполнение счётчиков по уже записанным попыткам
+def fill_mailing_stats(apps, schema_editor):
+    Attempt = apps.get_model("mailings", "Attempt")
+    MailingStats = apps.get_model("mailings", "MailingStats")
+    rows = (
+        Attempt.objects.order_by()
+        .values("mailing_list__owner")
+        .annotate(
+            total=Count("id"),
+            success=Count("id", filter=Q(result="successful")),
+            failed=Count("id", filter=Q(result="failed")),
+        )
+    )
+    MailingStats.objects.bulk_create(
+        MailingStats(
+            owner_id=row["mailing_list__owner"],
+            total_attempts=row["total"],
+            success_attempts=row["success"],
+            failed_attempts=row["failed"],
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0005_mailingrun_delivery"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailingStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("total_attempts", models.BigIntegerField(default=0, verbose_name="Всего попыток")),
+                ("success_attempts", models.BigIntegerField(default=0, verbose_name="Успешных попыток")),
+                ("failed_attempts", models.BigIntegerField(default=0, verbose_name="Неуспешных попыток")),
+                (
+                    "owner",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mailing_stats",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика рассылок",
+                "verbose_name_plural": "Статистика рассылок",
+            },
+        ),
+        migrations.RunPython(fill_mailing_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0006_mailingstats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["attempt_time"], name="attempt_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["mailing_list", "attempt_time"], name="attempt_mailing_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["mailing_list", "result"], name="attempt_mailing_result_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="mailinglist",
+            index=models.Index(fields=["owner", "status"], name="mailinglist_owner_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="mailinglist",
+            index=models.Index(
+                condition=models.Q(("status", "started")), fields=["start_time"], name="mailinglist_started_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["owner", "subject"], name="message_owner_subject_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipient",
+            index=models.Index(fields=["owner", "full_name"], name="recipient_owner_name_idx"),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:57
+
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+# Копия нужной части mailings.partitions на момент миграции: миграция не должна зависеть от текущего кода
+ATTEMPT_TABLE = "mailings_attempt"
+DEFAULT_PARTITION = f"{ATTEMPT_TABLE}_default"
+# Сколько месяцев вперёд создаются секции при переходе
+MONTHS_AHEAD = 2
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def month_bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+# Создание помесячных секций с первого месяца по последний включительно. Таблица только что создана,
+# секция по умолчанию пуста, поэтому переносить из неё строки не нужно
+def create_partitions(cursor, first_month, last_month):
+    month = first_month
+    while month <= last_month:
+        start, end = month_bound(month).isoformat(), month_bound(add_months(month, 1)).isoformat()
+        cursor.execute(
+            f'CREATE TABLE "{ATTEMPT_TABLE}_p{month:%Y_%m}" PARTITION OF "{ATTEMPT_TABLE}" '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        month = add_months(month, 1)
+
+
+# Перевод таблицы попыток в таблицу, секционированную по месяцам attempt_time (только PostgreSQL).
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования, поэтому он составной
+# (id, attempt_time); для Django id остаётся уникальным благодаря последовательности
+def partition_attempts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{ATTEMPT_TABLE}" RENAME TO mailings_attempt_old')
+        cursor.execute("SELECT min(attempt_time), max(attempt_time) FROM mailings_attempt_old")
+        first, last = cursor.fetchone()
+        cursor.execute("CREATE SEQUENCE mailings_attempt_new_id_seq")
+        cursor.execute(
+            f'CREATE TABLE "{ATTEMPT_TABLE}" ('
+            " id bigint NOT NULL DEFAULT nextval('mailings_attempt_new_id_seq'),"
+            " attempt_time timestamp with time zone NOT NULL,"
+            " result varchar(20) NOT NULL,"
+            " server_response text NULL,"
+            " mailing_list_id bigint NOT NULL,"
+            " PRIMARY KEY (id, attempt_time)"
+            ") PARTITION BY RANGE (attempt_time)"
+        )
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{ATTEMPT_TABLE}" DEFAULT')
+        now = timezone.now()
+        create_partitions(
+            cursor,
+            month_start((first or now).astimezone(dt_timezone.utc)),
+            add_months(month_start(max(last or now, now).astimezone(dt_timezone.utc)), MONTHS_AHEAD),
+        )
+        cursor.execute(
+            f'INSERT INTO "{ATTEMPT_TABLE}" (id, attempt_time, result, server_response, mailing_list_id) '
+            "SELECT id, attempt_time, result, server_response, mailing_list_id FROM mailings_attempt_old"
+        )
+        cursor.execute("DROP TABLE mailings_attempt_old")
+        cursor.execute(
+            "SELECT setval('mailings_attempt_new_id_seq', COALESCE(max(id), 1), max(id) IS NOT NULL) "
+            f'FROM "{ATTEMPT_TABLE}"'
+        )
+        cursor.execute(f'ALTER SEQUENCE mailings_attempt_new_id_seq RENAME TO "{ATTEMPT_TABLE}_id_seq"')
+        cursor.execute(f'ALTER SEQUENCE "{ATTEMPT_TABLE}_id_seq" OWNED BY "{ATTEMPT_TABLE}".id')
+        # Индексы и внешний ключ с прежними именами, чтобы состояние схемы совпадало с моделью
+        cursor.execute(
+            f'ALTER TABLE "{ATTEMPT_TABLE}" '
+            "ADD CONSTRAINT mailings_attempt_mailing_list_id_4ec7ac5a_fk_mailings_mailinglist_id FOREIGN KEY"
+            " (mailing_list_id) REFERENCES mailings_mailinglist (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        for name, columns in (
+            ("mailings_attempt_mailing_list_id_4ec7ac5a", "mailing_list_id"),
+            ("attempt_time_idx", "attempt_time"),
+            ("attempt_mailing_time_idx", "mailing_list_id, attempt_time"),
+            ("attempt_mailing_result_idx", "mailing_list_id, result"),
+        ):
+            cursor.execute(f'CREATE INDEX "{name}" ON "{ATTEMPT_TABLE}" ({columns})')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0007_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AttemptDailyRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField(verbose_name="День")),
+                ("successful", models.PositiveIntegerField(default=0, verbose_name="Успешных попыток")),
+                ("failed", models.PositiveIntegerField(default=0, verbose_name="Неуспешных попыток")),
+                ("top_errors", models.JSONField(blank=True, default=list, verbose_name="Частые ошибки")),
+                (
+                    "mailing_list",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to="mailings.mailinglist",
+                        verbose_name="Рассылка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Сводка попыток за день",
+                "verbose_name_plural": "Сводки попыток за день",
+                "ordering": ["day"],
+                "constraints": [models.UniqueConstraint(fields=("mailing_list", "day"), name="unique_rollup_per_day")],
+            },
+        ),
+        migrations.RunPython(partition_attempts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0008_attempt_partitions_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="delivery",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=1, verbose_name="Число попыток"),
+        ),
+        migrations.AddField(
+            model_name="delivery",
+            name="next_retry_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Дата и время повторной попытки"),
+        ),
+        migrations.AddIndex(
+            model_name="delivery",
+            index=models.Index(
+                condition=models.Q(("next_retry_at__isnull", False)),
+                fields=["next_retry_at"],
+                name="delivery_retry_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0009_delivery_retries"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="mailinglist",
+            index=models.Index(fields=["status", "start_time"], name="mailinglist_status_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="mailinglist",
+            index=models.Index(fields=["status", "end_time"], name="mailinglist_status_end_idx"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0010_scheduler_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="html_body",
+            field=models.TextField(blank=True, null=True, verbose_name="Тело письма (HTML)"),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now, verbose_name="Дата и время изменения"
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.db.models.functions import Lower, Trim
+
+# Копия логики слияния из mailings.dedup на момент миграции: миграция работает только с историческими
+# моделями и не зависит от текущего кода
+BATCH_SIZE = 1000
+
+
+# Слияние одной пачки групп дублей: связи с рассылками и журнал доставки переносятся на получателя
+# с наименьшим id (повторяющиеся связи отбрасываются), остальные получатели удаляются
+def merge_groups(Recipient, Through, Delivery, groups):
+    keep_ids = {(owner_id, normalized): keep for owner_id, normalized, keep in groups}
+    rows = (
+        Recipient.objects.annotate(normalized=Lower(Trim("email")))
+        .filter(owner_id__in={owner_id for owner_id, _, _ in groups}, normalized__in={key[1] for key in keep_ids})
+        .values_list("id", "owner_id", "normalized")
+    )
+    # id дубля -> id сохраняемого получателя
+    targets = {
+        pk: keep_ids[(owner_id, normalized)]
+        for pk, owner_id, normalized in rows
+        if (owner_id, normalized) in keep_ids and pk != keep_ids[(owner_id, normalized)]
+    }
+    if not targets:
+        return
+
+    links = Through.objects.filter(recipient_id__in=targets)
+    Through.objects.bulk_create(
+        [
+            Through(mailinglist_id=mailinglist_id, recipient_id=targets[recipient_id])
+            for mailinglist_id, recipient_id in links.values_list("mailinglist_id", "recipient_id")
+        ],
+        ignore_conflicts=True,
+    )
+    links.delete()
+
+    # Доставка уникальна в пределах запуска: запись дубля, для которой у сохраняемого получателя уже есть
+    # запись того же запуска, удаляется, остальные переносятся
+    seen = set(
+        Delivery.objects.filter(recipient_id__in=set(targets.values())).values_list(
+            "run_id", "mailing_list_id", "recipient_id"
+        )
+    )
+    moved, dropped = [], []
+    deliveries = Delivery.objects.filter(recipient_id__in=targets).order_by("id")
+    for pk, run_id, mailing_list_id, recipient_id in deliveries.values_list(
+        "id", "run_id", "mailing_list_id", "recipient_id"
+    ):
+        key = (run_id, mailing_list_id, targets[recipient_id])
+        if key in seen:
+            dropped.append(pk)
+        else:
+            seen.add(key)
+            moved.append(Delivery(id=pk, recipient_id=key[2]))
+    Delivery.objects.filter(id__in=dropped).delete()
+    Delivery.objects.bulk_update(moved, ["recipient"])
+
+    Recipient.objects.filter(id__in=targets).delete()
+
+
+# Слияние получателей, адреса которых совпадают без учёта регистра и пробелов, до создания уникального индекса
+def merge_duplicates(apps, schema_editor):
+    Recipient = apps.get_model("mailings", "Recipient")
+    Through = apps.get_model("mailings", "MailingList").recipients.through
+    Delivery = apps.get_model("mailings", "Delivery")
+    groups = list(
+        Recipient.objects.annotate(normalized=Lower(Trim("email")))
+        .values("owner_id", "normalized")
+        .annotate(count=Count("id"), keep=Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+        .values_list("owner_id", "normalized", "keep")
+    )
+    for start in range(0, len(groups), BATCH_SIZE):
+        merge_groups(Recipient, Through, Delivery, groups[start : start + BATCH_SIZE])
+    if schema_editor.connection.vendor == "postgresql":
+        # Отложенные проверки внешних ключей после удаления строк не дают изменить таблицу в той же транзакции
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0011_message_html_body_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="recipient",
+            name="email",
+            field=models.CharField(max_length=250, verbose_name="Электронная почта"),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="recipient",
+            name="email_normalized",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim("email")),
+                output_field=models.CharField(max_length=250),
+                verbose_name="Нормализованная электронная почта",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="recipient",
+            constraint=models.UniqueConstraint(
+                fields=("email_normalized", "owner"), name="unique_recipient_email_per_owner"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:22
+
+import django.db.models.expressions
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0012_recipient_email_normalized"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailingrun",
+            name="checkpoint_domain",
+            field=models.CharField(
+                blank=True, default="", max_length=250, verbose_name="Домен последнего обработанного получателя"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipient",
+            name="domain",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.functions.text.Substr(
+                    django.db.models.functions.text.Lower(django.db.models.functions.text.Trim("email")),
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.functions.text.StrIndex(
+                            django.db.models.functions.text.Lower(django.db.models.functions.text.Trim("email")),
+                            models.Value("@"),
+                        ),
+                        "+",
+                        models.Value(1),
+                    ),
+                ),
+                output_field=models.CharField(max_length=250),
+                verbose_name="Домен",
+            ),
+        ),
+    ]
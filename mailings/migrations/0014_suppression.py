@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0013_recipient_domain"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Suppression",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("email", models.CharField(max_length=250, verbose_name="Электронная почта (нормализованная)")),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("bounce", "Жёсткий отказ"),
+                            ("complaint", "Жалоба на спам"),
+                            ("unsubscribe", "Отписка"),
+                        ],
+                        max_length=20,
+                        verbose_name="Причина",
+                    ),
+                ),
+                ("detail", models.TextField(blank=True, default="", verbose_name="Ответ сервера")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата и время")),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="suppressions",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Подавленный адрес",
+                "verbose_name_plural": "Подавленные адреса",
+                "ordering": ["created_at"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("owner__isnull", True)),
+                        fields=("email",),
+                        name="unique_global_suppression",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("owner__isnull", False)),
+                        fields=("email", "owner"),
+                        name="unique_owner_suppression",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Существующие сообщения писались без подстановок: их тексты остаются обычным текстом,
+    шаблонами считаются только сообщения, созданные после миграции"""
+
+    dependencies = [
+        ("mailings", "0014_suppression"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="is_template",
+            field=models.BooleanField(default=False, verbose_name="Шаблон с подстановками"),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="is_template",
+            field=models.BooleanField(default=True, verbose_name="Шаблон с подстановками"),
+        ),
+    ]
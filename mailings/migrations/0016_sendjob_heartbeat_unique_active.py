@@ -0,0 +1,48 @@
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+# Продление аренды начатых задач считается от их начала; из нескольких незавершённых задач рассылки
+# остаётся самая ранняя (выполняемая, если такая есть), остальные закрываются до создания уникального индекса
+def prepare_jobs(apps, schema_editor):
+    SendJob = apps.get_model("mailings", "SendJob")
+    SendJob.objects.filter(status="running").update(heartbeat_at=F("started_at"))
+    active = SendJob.objects.filter(status__in=["queued", "running"])
+    duplicated = list(
+        active.order_by()
+        .values("mailing_list_id")
+        .annotate(jobs=Count("id"))
+        .filter(jobs__gt=1)
+        .values_list("mailing_list_id", flat=True)
+    )
+    for mailing_list_id in duplicated:
+        jobs = active.filter(mailing_list_id=mailing_list_id)
+        keep = jobs.filter(status="running").order_by("created_at").first() or jobs.order_by("created_at").first()
+        jobs.exclude(pk=keep.pk).update(status="failed", error="Дубликат задачи рассылки.")
+    if schema_editor.connection.vendor == "postgresql":
+        # Отложенные проверки внешних ключей после изменения строк не дают изменить таблицу в той же транзакции
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0015_message_is_template"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sendjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Дата и время продления аренды"),
+        ),
+        migrations.RunPython(prepare_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="sendjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["queued", "running"])),
+                fields=("mailing_list",),
+                name="unique_active_sendjob",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailings", "0016_sendjob_heartbeat_unique_active"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailingrun",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Дата и время продления аренды"),
+        ),
+        migrations.AddField(
+            model_name="mailingrun",
+            name="leased_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Дата и время захвата"),
+        ),
+    ]
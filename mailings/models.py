@@ -2,12 +2,29 @@ from django.db import models
 
 from users.models import CustomUser
 
+from .dedup import email_domain_expression, normalized_email_expression
+
 
 # =================== Модель «Получатель рассылки» ====================================================================
 class Recipient(models.Model):
     """Описание модели Получатель рассылки"""
 
-    email = models.CharField(max_length=250, verbose_name="Электронная почта", unique=True)
+    email = models.CharField(max_length=250, verbose_name="Электронная почта")
+    # Адрес без пробелов по краям в нижнем регистре. Столбец вычисляет база, поэтому он заполнен
+    # и при bulk_create; уникален в пределах владельца, один адрес могут добавить разные пользователи
+    email_normalized = models.GeneratedField(
+        expression=normalized_email_expression(),
+        output_field=models.CharField(max_length=250),
+        db_persist=True,
+        verbose_name="Нормализованная электронная почта",
+    )
+    # Домен адреса: по нему получатели группируются при отправке
+    domain = models.GeneratedField(
+        expression=email_domain_expression(),
+        output_field=models.CharField(max_length=250),
+        db_persist=True,
+        verbose_name="Домен",
+    )
     full_name = models.CharField(max_length=250, verbose_name="Ф.И.О.")
     comment = models.TextField(verbose_name="Комментарий", blank=True, null=True)
     owner = models.ForeignKey(
@@ -24,6 +41,11 @@ class Recipient(models.Model):
         verbose_name = "Получатель рассылки"
         verbose_name_plural = "Получатели рассылки"
         ordering = ["full_name"]
+        indexes = [models.Index(fields=["owner", "full_name"], name="recipient_owner_name_idx")]
+        # Индекс ограничения начинается с адреса: им же пользуются поиск дублей в рассылке и импорт
+        constraints = [
+            models.UniqueConstraint(fields=["email_normalized", "owner"], name="unique_recipient_email_per_owner")
+        ]
 
 
 # =================== Модель «Сообщение» =============================================================================
@@ -32,6 +54,9 @@ class Message(models.Model):
 
     subject = models.CharField(max_length=250, verbose_name="Тема письма")
     letter_body = models.TextField(verbose_name="Тело письма")
+    html_body = models.TextField(verbose_name="Тело письма (HTML)", blank=True, null=True)
+    # Тексты сообщений, созданных до появления подстановок, отправляются как есть: «{{» в них — обычный текст
+    is_template = models.BooleanField(default=True, verbose_name="Шаблон с подстановками")
     owner = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
@@ -39,6 +64,8 @@ class Message(models.Model):
         verbose_name="Владелец",
         default=2
     )
+    # Версия текста: по ней кешируются скомпилированные шаблоны письма
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата и время изменения")
 
     def __str__(self):
         return f"{self.subject}"
@@ -47,6 +74,7 @@ class Message(models.Model):
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
         ordering = ["subject"]
+        indexes = [models.Index(fields=["owner", "subject"], name="message_owner_subject_idx")]
 
 
 # =================== Модель «Рассылка» ============================================================================
@@ -75,6 +103,14 @@ class MailingList(models.Model):
         verbose_name = "Рассылка"
         verbose_name_plural = "Рассылки"
         ordering = ["start_time"]
+        indexes = [
+            models.Index(fields=["owner", "status"], name="mailinglist_owner_status_idx"),
+            # Частичный индекс: запущенных рассылок мало, а send_mailing выбирает только их
+            models.Index(fields=["start_time"], condition=models.Q(status="started"), name="mailinglist_started_idx"),
+            # События планировщика: ближайшие начала созданных и окончания запущенных рассылок
+            models.Index(fields=["status", "start_time"], name="mailinglist_status_start_idx"),
+            models.Index(fields=["status", "end_time"], name="mailinglist_status_end_idx"),
+        ]
 
 
 # =================== Модель «Попытка рассылки» ======================================================================
@@ -94,3 +130,195 @@ class Attempt(models.Model):
         verbose_name = "Попытка рассылки"
         verbose_name_plural = "Попытки рассылок"
         ordering = ["attempt_time"]
+        indexes = [
+            models.Index(fields=["attempt_time"], name="attempt_time_idx"),
+            models.Index(fields=["mailing_list", "attempt_time"], name="attempt_mailing_time_idx"),
+            models.Index(fields=["mailing_list", "result"], name="attempt_mailing_result_idx"),
+        ]
+
+
+# =================== Модель «Задача отправки рассылки» ===============================================================
+JOB_STATUS_CHOICES = [("queued", "В очереди"), ("running", "Выполняется"), ("done", "Выполнена"), ("failed", "Ошибка")]
+# Статусы незавершённой задачи: у рассылки может быть только одна такая задача
+ACTIVE_JOB_STATUSES = ["queued", "running"]
+
+
+class SendJob(models.Model):
+    """Описание модели Задача отправки рассылки (очередь для run_mailing_worker)"""
+
+    mailing_list = models.ForeignKey(
+        MailingList, on_delete=models.CASCADE, related_name="send_jobs", verbose_name="Рассылка"
+    )
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default="queued", verbose_name="Статус")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время постановки в очередь")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата и время начала")
+    # Аренда задачи: воркер продлевает её после каждой записи буфера попыток; задача, аренда которой
+    # не продлевалась MAILING_JOB_TIMEOUT секунд, выдаётся другому воркеру
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата и время продления аренды")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата и время окончания")
+    error = models.TextField(blank=True, null=True, verbose_name="Ошибка")
+
+    def __str__(self):
+        return f"Задача №{self.pk}: {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Задача отправки"
+        verbose_name_plural = "Задачи отправки"
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "created_at"], name="sendjob_status_created_idx")]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mailing_list"],
+                condition=models.Q(status__in=ACTIVE_JOB_STATUSES),
+                name="unique_active_sendjob",
+            )
+        ]
+
+
+# =================== Модель «Запуск рассылки» =======================================================================
+RUN_STATUS_CHOICES = [("running", "Выполняется"), ("completed", "Завершён")]
+
+
+class MailingRun(models.Model):
+    """Описание модели Запуск рассылки (один проход по всем получателям)"""
+
+    mailing_list = models.ForeignKey(
+        MailingList, on_delete=models.CASCADE, related_name="runs", verbose_name="Рассылка"
+    )
+    status = models.CharField(max_length=20, choices=RUN_STATUS_CHOICES, default="running", verbose_name="Статус")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время начала")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата и время окончания")
+    # Получатели обрабатываются по (домен, id): контрольная точка — последняя такая пара
+    checkpoint_domain = models.CharField(
+        max_length=250, default="", blank=True, verbose_name="Домен последнего обработанного получателя"
+    )
+    checkpoint = models.BigIntegerField(default=0, verbose_name="Последний обработанный получатель (id)")
+    # Аренда запуска: процесс отправки продлевает её перед пачками; запуск, аренда которого не продлевалась
+    # MAILING_RUN_TIMEOUT секунд, продолжает другой процесс (leased_at — отметка владельца)
+    leased_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата и время захвата")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата и время продления аренды")
+
+    def __str__(self):
+        return f"Запуск №{self.pk} рассылки {self.mailing_list_id}: {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Запуск рассылки"
+        verbose_name_plural = "Запуски рассылок"
+        ordering = ["started_at"]
+
+
+# =================== Модель «Доставка получателю» ===================================================================
+class Delivery(models.Model):
+    """Описание модели Доставка получателю: журнал обработанных получателей в рамках запуска"""
+
+    mailing_list = models.ForeignKey(MailingList, on_delete=models.CASCADE, verbose_name="Рассылка")
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE, verbose_name="Получатель")
+    run = models.ForeignKey(MailingRun, on_delete=models.CASCADE, related_name="deliveries", verbose_name="Запуск")
+    result = models.CharField(max_length=20, choices=RESULT_CHOICES, verbose_name="Статус")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время")
+    attempts = models.PositiveSmallIntegerField(default=1, verbose_name="Число попыток")
+    # Заполнено, пока после временной ошибки ожидается повторная отправка
+    next_retry_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата и время повторной попытки")
+
+    def __str__(self):
+        return f"{self.recipient_id} в запуске №{self.run_id}: {self.result}"
+
+    class Meta:
+        verbose_name = "Доставка получателю"
+        verbose_name_plural = "Доставки получателям"
+        ordering = ["created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["mailing_list", "recipient", "run"], name="unique_delivery_per_run")
+        ]
+        indexes = [
+            models.Index(
+                fields=["next_retry_at"], name="delivery_retry_idx", condition=models.Q(next_retry_at__isnull=False)
+            )
+        ]
+
+
+# =================== Модель «Статистика рассылок пользователя» ======================================================
+class MailingStats(models.Model):
+    """Описание модели Статистика рассылок пользователя: счётчики попыток, которые обновляются при их записи,
+    изменении и удалении. Попытки, свёрнутые в дневные сводки, остаются в счётчиках до удаления рассылки"""
+
+    owner = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="mailing_stats",
+        verbose_name="Владелец",
+    )
+    total_attempts = models.BigIntegerField(default=0, verbose_name="Всего попыток")
+    success_attempts = models.BigIntegerField(default=0, verbose_name="Успешных попыток")
+    failed_attempts = models.BigIntegerField(default=0, verbose_name="Неуспешных попыток")
+
+    def __str__(self):
+        return f"{self.owner}: {self.total_attempts}"
+
+    class Meta:
+        verbose_name = "Статистика рассылок"
+        verbose_name_plural = "Статистика рассылок"
+
+
+# =================== Модель «Сводка попыток за день» ================================================================
+class AttemptDailyRollup(models.Model):
+    """Описание модели Сводка попыток за день: остаётся после удаления старых попыток командой prune_attempts"""
+
+    mailing_list = models.ForeignKey(
+        MailingList, on_delete=models.CASCADE, related_name="daily_rollups", verbose_name="Рассылка"
+    )
+    day = models.DateField(verbose_name="День")
+    successful = models.PositiveIntegerField(default=0, verbose_name="Успешных попыток")
+    failed = models.PositiveIntegerField(default=0, verbose_name="Неуспешных попыток")
+    top_errors = models.JSONField(default=list, blank=True, verbose_name="Частые ошибки")
+
+    def __str__(self):
+        return f"{self.day}: {self.successful}/{self.failed}"
+
+    class Meta:
+        verbose_name = "Сводка попыток за день"
+        verbose_name_plural = "Сводки попыток за день"
+        ordering = ["day"]
+        constraints = [models.UniqueConstraint(fields=["mailing_list", "day"], name="unique_rollup_per_day")]
+
+
+# =================== Модель «Подавленный адрес» =====================================================================
+SUPPRESSION_REASON_CHOICES = [
+    ("bounce", "Жёсткий отказ"),
+    ("complaint", "Жалоба на спам"),
+    ("unsubscribe", "Отписка"),
+]
+
+
+class Suppression(models.Model):
+    """Описание модели Подавленный адрес: письма на него не отправляются. Запись без владельца действует
+    для всех рассылок (жёсткий отказ, жалоба), с владельцем — только для рассылок этого владельца (отписка)"""
+
+    email = models.CharField(max_length=250, verbose_name="Электронная почта (нормализованная)")
+    owner = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="suppressions",
+        verbose_name="Владелец",
+    )
+    reason = models.CharField(max_length=20, choices=SUPPRESSION_REASON_CHOICES, verbose_name="Причина")
+    detail = models.TextField(blank=True, default="", verbose_name="Ответ сервера")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время")
+
+    def __str__(self):
+        return f"{self.email}: {self.get_reason_display()}"
+
+    class Meta:
+        verbose_name = "Подавленный адрес"
+        verbose_name_plural = "Подавленные адреса"
+        ordering = ["created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["email"], condition=models.Q(owner__isnull=True), name="unique_global_suppression"
+            ),
+            models.UniqueConstraint(
+                fields=["email", "owner"], condition=models.Q(owner__isnull=False), name="unique_owner_suppression"
+            ),
+        ]
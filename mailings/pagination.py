@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage(list):
+    """Строки страницы вместе с курсорами соседних страниц (кешируются вместе со строками)"""
+
+    next_cursor = None
+    previous_cursor = None
+
+
+class KeysetPaginationMixin:
+    """Постраничный вывод ListView по курсору (seek): страница N стоит столько же, сколько первая.
+    Курсор — значения полей keyset последней (after) или первой (before) строки соседней страницы"""
+
+    page_size = 20
+    # Поля сортировки; последнее поле должно быть уникальным (обычно id)
+    keyset = ("id",)
+
+    # Метод кодирования значений полей строки в курсор для URL
+    def encode_cursor(self, row):
+        values = [self.serialize_value(getattr(row, name)) for name in self.keyset]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+    # Метод разбора курсора из URL; неправильный курсор означает первую страницу
+    def decode_cursor(self, token):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            if len(values) != len(self.keyset):
+                return None
+            return [self.model._meta.get_field(name).to_python(value) for name, value in zip(self.keyset, values)]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+
+    @staticmethod
+    def serialize_value(value):
+        return value.isoformat() if hasattr(value, "isoformat") else value
+
+    # Метод построения условия «строго после/до» курсора по всем полям keyset
+    def get_seek_filter(self, values, lookup):
+        conditions = []
+        for i, name in enumerate(self.keyset):
+            equal = {field: value for field, value in zip(self.keyset[:i], values[:i])}
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": values[i]}))
+        return reduce(or_, conditions)
+
+    # Метод получения направления и значений курсора из запроса
+    def get_cursor(self):
+        for direction in ("after", "before"):
+            token = self.request.GET.get(direction)
+            if token:
+                values = self.decode_cursor(token)
+                if values is not None:
+                    return direction, token, values
+        return None, None, None
+
+    # Ключ кеша страницы зависит от курсора
+    def get_cache_variant(self):
+        direction, token, _ = self.get_cursor()
+        return f"{direction}:{token}" if direction else ""
+
+    # Метод выборки одной страницы (плюс одна строка, чтобы узнать о наличии следующей)
+    def get_rows(self, queryset):
+        direction, _, values = self.get_cursor()
+        if direction == "before":
+            queryset = queryset.filter(self.get_seek_filter(values, "lt"))
+            queryset = queryset.order_by(*(f"-{name}" for name in self.keyset))
+        else:
+            if direction == "after":
+                queryset = queryset.filter(self.get_seek_filter(values, "gt"))
+            queryset = queryset.order_by(*self.keyset)
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        page = KeysetPage(reversed(rows) if direction == "before" else rows)
+        if page:
+            if direction == "before":
+                page.next_cursor = self.encode_cursor(page[-1])
+                page.previous_cursor = self.encode_cursor(page[0]) if has_more else None
+            else:
+                page.next_cursor = self.encode_cursor(page[-1]) if has_more else None
+                page.previous_cursor = self.encode_cursor(page[0]) if direction == "after" else None
+        return page
+
+    # Метод установки курсоров соседних страниц в контекст шаблона
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["next_cursor"] = getattr(self.object_list, "next_cursor", None)
+        context["previous_cursor"] = getattr(self.object_list, "previous_cursor", None)
+        return context
@@ -0,0 +1,91 @@
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
+
+# Помесячное секционирование таблицы попыток на PostgreSQL. Модуль не зависит от моделей; используется
+# в команде prune_attempts (миграция 0008 хранит собственную копию нужных функций)
+ATTEMPT_TABLE = "mailings_attempt"
+DEFAULT_PARTITION = f"{ATTEMPT_TABLE}_default"
+
+
+# Первое число месяца
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+# Сдвиг месяца на count месяцев (вперёд или назад)
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+# Начало месяца как момент времени в UTC: границы секций и дневные сводки считаются в UTC
+def month_bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f"{ATTEMPT_TABLE}_p{month:%Y_%m}"
+
+
+# Проверка, что таблица попыток секционирована (только PostgreSQL)
+def is_partitioned(connection):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [ATTEMPT_TABLE])
+        return cursor.fetchone() is not None
+
+
+# Месяцы существующих помесячных секций
+def list_partition_months(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [ATTEMPT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{ATTEMPT_TABLE}_p"
+    return sorted(datetime.strptime(name[len(prefix) :], "%Y_%m").date() for name in names if name.startswith(prefix))
+
+
+# Создание секции за месяц. Строки этого месяца, успевшие попасть в секцию по умолчанию, переносятся в новую
+def create_partition(connection, month):
+    start, end = month_bound(month).isoformat(), month_bound(add_months(month, 1)).isoformat()
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{ATTEMPT_TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "{ATTEMPT_TABLE}" '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE attempt_time >= %s AND attempt_time < %s '
+            f'RETURNING *) INSERT INTO "{ATTEMPT_TABLE}" SELECT * FROM moved',
+            [start, end],
+        )
+        cursor.execute(f'ALTER TABLE "{ATTEMPT_TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+
+
+# Создание недостающих секций с первого месяца по последний включительно
+def ensure_partitions(connection, first_month, last_month):
+    existing = set(list_partition_months(connection))
+    created = []
+    month = first_month
+    while month <= last_month:
+        if month not in existing:
+            create_partition(connection, month)
+            created.append(month)
+        month = add_months(month, 1)
+    return created
+
+
+# Отсоединение и удаление секций месяцев раньше cutoff_month
+def drop_partitions_before(connection, cutoff_month):
+    dropped = []
+    with connection.cursor() as cursor:
+        for month in list_partition_months(connection):
+            if month < cutoff_month:
+                cursor.execute(f'ALTER TABLE "{ATTEMPT_TABLE}" DETACH PARTITION "{partition_name(month)}"')
+                cursor.execute(f'DROP TABLE "{partition_name(month)}"')
+                dropped.append(month)
+    return dropped
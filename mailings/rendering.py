@@ -0,0 +1,159 @@
+import html
+import re
+import threading
+from collections import OrderedDict
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMultiAlternatives
+from django.template import Context, Engine, TemplateSyntaxError
+from django.urls import reverse
+
+from config import settings
+
+# Подстановка вида {{ имя }} без фильтров
+SIMPLE_VARIABLE = re.compile(r"{{\s*(\w+)\s*}}")
+UNSUBSCRIBE_SALT = "mailings.unsubscribe"
+# Сколько скомпилированных сообщений держать в памяти процесса
+COMPILED_CACHE_SIZE = 256
+# Значения подстановок для пробной сборки шаблона при проверке формы
+SAMPLE_CONTEXT = {
+    "full_name": "Иван Иванов",
+    "email": "ivan@example.com",
+    "unsubscribe_url": "https://example.com/unsubscribe/",
+}
+
+text_engine = Engine(autoescape=False)
+html_engine = Engine()
+
+
+class MessageTemplateError(ValueError):
+    """Шаблон сообщения не компилируется или не собирается для получателя"""
+
+
+class CompiledTemplate:
+    """Шаблон, разобранный один раз на запуск. Шаблон только из подстановок {{ имя }} хранится
+    чередованием литералов и имён и собирается одним join; шаблоны с тегами и фильтрами
+    компилируются шаблонизатором Django. literal — текст без подстановок (отправляется как есть)"""
+
+    def __init__(self, source, autoescape=False, literal=False):
+        self.source = source
+        self.autoescape = autoescape
+        self.template = None
+        if literal:
+            self.literals, self.names = [source], []
+            return
+        parts = SIMPLE_VARIABLE.split(source)
+        self.literals = parts[::2]
+        self.names = parts[1::2]
+        if any(marker in literal for literal in self.literals for marker in ("{{", "{%", "{#")):
+            engine = html_engine if autoescape else text_engine
+            self.template = engine.from_string(source)
+
+    # Метод подстановки значений получателя
+    def render(self, context):
+        if self.template is not None:
+            return self.template.render(Context(context))
+        if not self.names:
+            return self.source
+        escape = html.escape if self.autoescape else str
+        values = [escape(context.get(name, "")) for name in self.names]
+        parts = [None] * (len(self.literals) + len(values))
+        parts[::2] = self.literals
+        parts[1::2] = values
+        return "".join(parts)
+
+
+class MessageRenderer:
+    """Скомпилированные тема, текст и HTML-версия сообщения; собирает персональное письмо получателю"""
+
+    def __init__(self, message):
+        literal = not message.is_template
+        try:
+            self.subject = CompiledTemplate(message.subject, literal=literal)
+            self.text = CompiledTemplate(message.letter_body, literal=literal)
+            self.html = (
+                CompiledTemplate(message.html_body, autoescape=True, literal=literal) if message.html_body else None
+            )
+        except TemplateSyntaxError as e:
+            raise MessageTemplateError(f"Ошибка в шаблоне сообщения «{message.subject}»: {e}") from e
+        self.unsubscribe_prefix = None
+
+    # Метод получения ссылки отписки: адрес сайта и путь вычисляются один раз, на получателя — только подпись
+    def get_unsubscribe_url(self, mailing_list_id, recipient_id):
+        if self.unsubscribe_prefix is None:
+            path = reverse("mailings:unsubscribe", args=["token"])
+            self.unsubscribe_prefix = f"{settings.MAILING_SITE_URL.rstrip('/')}{path[: -len('token/')]}"
+        return f"{self.unsubscribe_prefix}{make_unsubscribe_token(mailing_list_id, recipient_id)}/"
+
+    # Метод подстановки значений получателя в тему, текст и HTML-версию; ошибка тега или фильтра
+    # при сборке — MessageTemplateError
+    def render(self, context):
+        try:
+            return (
+                self.subject.render(context),
+                self.text.render(context),
+                self.html.render(context) if self.html is not None else None,
+            )
+        except Exception as e:
+            raise MessageTemplateError(f"Ошибка сборки письма по шаблону: {e}") from e
+
+    # Метод сборки письма получателю (text/plain и, если задан, text/html) с заголовками отписки
+    def build(self, mailing_list_id, recipient):
+        unsubscribe_url = self.get_unsubscribe_url(mailing_list_id, recipient.id)
+        subject, text, html_body = self.render(
+            {"full_name": recipient.full_name, "email": recipient.email, "unsubscribe_url": unsubscribe_url}
+        )
+        message = EmailMultiAlternatives(
+            subject,
+            text,
+            settings.EMAIL_HOST_USER,
+            [recipient.email],
+            headers={
+                "List-Unsubscribe": f"<{unsubscribe_url}>",
+                "List-Unsubscribe-Post": "List-Unsubscribe=One-Click",
+            },
+        )
+        if html_body is not None:
+            message.attach_alternative(html_body, "text/html")
+        return message
+
+
+# Проверка текста шаблона при сохранении сообщения: компиляция и пробная сборка с условными значениями
+def validate_template(source, autoescape=False):
+    try:
+        CompiledTemplate(source, autoescape=autoescape).render(SAMPLE_CONTEXT)
+    except TemplateSyntaxError as e:
+        raise ValidationError(f"Ошибка в шаблоне: {e}")
+    except Exception as e:
+        raise ValidationError(f"Шаблон не собирается: {e}")
+    return source
+
+
+compiled = OrderedDict()
+compiled_lock = threading.Lock()
+
+
+# Скомпилированное сообщение из кеша процесса; ключ (id, updated_at) меняется при редактировании сообщения
+def get_renderer(message):
+    key = (message.pk, message.updated_at)
+    renderer = compiled.get(key)
+    if renderer is None:
+        renderer = MessageRenderer(message)
+        with compiled_lock:
+            compiled[key] = renderer
+            while len(compiled) > COMPILED_CACHE_SIZE:
+                compiled.popitem(last=False)
+    return renderer
+
+
+# Подписанный токен ссылки отписки (рассылка + получатель)
+def make_unsubscribe_token(mailing_list_id, recipient_id):
+    return signing.Signer(salt=UNSUBSCRIBE_SALT).sign(f"{mailing_list_id}-{recipient_id}")
+
+
+# Разбор токена отписки, возвращает (id рассылки, id получателя); подделанный токен — signing.BadSignature
+def parse_unsubscribe_token(token):
+    value = signing.Signer(salt=UNSUBSCRIBE_SALT).unsign(token)
+    mailing_list_id, recipient_id = value.split("-")
+    return int(mailing_list_id), int(recipient_id)
@@ -0,0 +1,121 @@
+import heapq
+import logging
+import time
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from config import settings
+
+from .caching import bump_model_version, get_model_versions
+from .models import MailingList
+from .services import enqueue_mailinglist, send_mailinglist
+
+logger = logging.getLogger(__name__)
+
+# Виды событий расписания
+START = "start"
+END = "end"
+
+
+class MailingScheduler:
+    """Планировщик рассылок: куча (min-heap) ближайших событий начала и окончания рассылок.
+    В память загружаются только события окна horizon вперёд (запросы по индексам status + время);
+    окно перечитывается при его исчерпании и при изменении рассылок (версия MailingList в кеше)"""
+
+    def __init__(self, horizon=None, poll_interval=None, inline=False):
+        self.horizon = timedelta(seconds=horizon or settings.MAILING_SCHEDULER_HORIZON)
+        self.poll_interval = poll_interval or settings.MAILING_SCHEDULER_POLL_INTERVAL
+        # inline — отправлять рассылку в процессе планировщика, иначе ставить задачу в очередь run_mailing_worker
+        self.inline = inline
+        self.heap = []
+        self.loaded_until = None
+        self.version = None
+
+    # Метод загрузки событий окна [.., now + horizon) в кучу; просроченные события тоже попадают в окно
+    def load(self, now):
+        self.loaded_until = now + self.horizon
+        self.version = get_model_versions([MailingList])[0]
+        starts = MailingList.objects.filter(status="created", start_time__lt=self.loaded_until).values_list(
+            "id", "start_time"
+        )
+        ends = MailingList.objects.filter(status="started", end_time__lt=self.loaded_until).values_list(
+            "id", "end_time"
+        )
+        self.heap = [(when, START, pk) for pk, when in starts] + [(when, END, pk) for pk, when in ends]
+        heapq.heapify(self.heap)
+        logger.info(f"Планировщик: загружено событий {len(self.heap)} до {self.loaded_until}.")
+
+    # Окно нужно перечитать, если оно закончилось или рассылки изменились с момента загрузки
+    def needs_reload(self, now):
+        return (
+            self.loaded_until is None
+            or now >= self.loaded_until
+            or get_model_versions([MailingList])[0] != self.version
+        )
+
+    # Метод запуска рассылки: статус меняется условным UPDATE, поэтому параллельные планировщики
+    # не запустят рассылку дважды. Рассылка, окно которой уже прошло, сразу завершается
+    def start(self, pk, now):
+        active = Q(end_time__isnull=True) | Q(end_time__gt=now)
+        if MailingList.objects.filter(active, pk=pk, status="created", start_time__lte=now).update(status="started"):
+            logger.info(f"Планировщик: рассылка {pk} запущена.")
+            if self.inline:
+                send_mailinglist(pk)
+            else:
+                enqueue_mailinglist(pk)
+            return True
+        if MailingList.objects.filter(pk=pk, status="created", end_time__lte=now).update(status="completed"):
+            logger.info(f"Планировщик: рассылка {pk} завершена, не начавшись (время окончания прошло).")
+            return True
+        return False
+
+    # Метод завершения рассылки по наступлении end_time
+    def finish(self, pk, now):
+        if MailingList.objects.filter(pk=pk, status="started", end_time__lte=now).update(status="completed"):
+            logger.info(f"Планировщик: рассылка {pk} завершена.")
+            return True
+        return False
+
+    # Метод обработки наступивших событий, возвращает число изменённых рассылок
+    def run_due(self, now=None):
+        now = now or timezone.now()
+        if self.needs_reload(now):
+            self.load(now)
+        changed = 0
+        while self.heap and self.heap[0][0] <= now:
+            _, kind, pk = heapq.heappop(self.heap)
+            # Ошибка одной рассылки (например, при отправке с inline) не останавливает обработку остальных;
+            # статус мог успеть измениться, поэтому окно перечитывается
+            try:
+                changed += self.start(pk, now) if kind == START else self.finish(pk, now)
+            except Exception:
+                logger.exception(f"Планировщик: ошибка обработки события {kind} рассылки {pk}.")
+                changed += 1
+        if changed:
+            # UPDATE не отправляет сигналы: кеш списков сбрасывается явно, окно перечитывается
+            # (у запущенных рассылок появились события окончания)
+            bump_model_version(MailingList)
+            self.load(now)
+        return changed
+
+    # Сколько секунд спать до следующего события (но не дольше интервала проверки изменений)
+    def get_sleep(self, now=None):
+        now = now or timezone.now()
+        delay = self.poll_interval
+        if self.heap:
+            delay = min(delay, (self.heap[0][0] - now).total_seconds())
+        if self.loaded_until is not None:
+            delay = min(delay, (self.loaded_until - now).total_seconds())
+        return max(delay, 0)
+
+    # Основной цикл: пробуждение точно к ближайшему событию
+    def run_forever(self):
+        while True:
+            try:
+                self.run_due()
+            except Exception:
+                # Например, база недоступна: следующая попытка через интервал проверки
+                logger.exception("Планировщик: ошибка обработки событий.")
+            time.sleep(self.get_sleep())
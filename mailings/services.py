@@ -1,45 +1,965 @@
 import logging
-import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from itertools import groupby
 
-from django.core.mail import send_mail
+from django.core.mail import get_connection
+from django.db import IntegrityError
+from django.db import connection as db_connection
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 
 from config import settings
+from users.models import CustomUser
 
-from .models import Attempt, MailingList
+from . import metrics
+from .caching import bump_model_version
+from .dedup import merge_duplicate_recipients
+from .models import (
+    ACTIVE_JOB_STATUSES,
+    Attempt,
+    AttemptDailyRollup,
+    Delivery,
+    MailingList,
+    MailingRun,
+    MailingStats,
+    Recipient,
+    SendJob,
+)
+from .partitions import add_months, drop_partitions_before, ensure_partitions, is_partitioned, month_bound, month_start
+from .rendering import MessageTemplateError, get_renderer
+from .suppression import SuppressedAddressError, suppress, suppression_list
+from .throttling import ConnectionSlots, Throttle
+from .validation import UndeliverableDomainError, domain_validator, get_domain
 
+# Обработчики журнала (файл MAILING_LOG_FILE, по умолчанию logs/mailing_send.log) настраиваются в settings.LOGGING
 logger = logging.getLogger(__name__)
-log_file_path = os.path.join(settings.BASE_DIR, "logs", "mailing_send.log")
-file_handler = logging.FileHandler(log_file_path, encoding="utf-8")
-formatter = logging.Formatter("%(asctime)s [%(levelname)s]: %(message)s")
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
-logger.setLevel(logging.INFO)
 
+# Получатель в конвейере отправки: только поля, нужные для письма
+RecipientRow = namedtuple("RecipientRow", ["id", "email", "full_name", "domain"], defaults=[None])
 
-def send_mailinglist(pk):
-    """Отправка рассылки по требованию"""
-    mailinglist = MailingList.objects.get(pk=pk)
+# Ошибки, после которых SMTP-сессию нужно открыть заново
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+# Ответы на RCPT TO, после которых адрес попадает в список подавления, и признак отказа по политике сервера
+HARD_BOUNCE_CODES = (550, 551, 553)
+POLICY_STATUS = "5.7."
+
+
+# Код ответа SMTP-сервера из исключения smtplib или aiosmtplib (None, если ответа не было)
+def get_smtp_code(error):
+    recipients = getattr(error, "recipients", None)
+    if isinstance(recipients, dict) and recipients:
+        return next(iter(recipients.values()))[0]
+    if isinstance(recipients, list) and recipients:
+        return getattr(recipients[0], "code", None)
+    return getattr(error, "smtp_code", None) or getattr(error, "code", None)
+
+
+# Классификация ошибки отправки: ответы 4xx и сетевые сбои временные (письмо стоит отправить повторно),
+# ответы 5xx и прочие ошибки постоянные. Ошибки соединения smtplib и aiosmtplib — наследники OSError
+def is_temporary_error(error):
+    code = get_smtp_code(error)
+    if isinstance(code, int):
+        return 400 <= code < 500
+    return isinstance(error, OSError)
+
+
+# Классификация ошибки с учётом в метриках по виду и классу исключения, возвращает признак временной ошибки
+def count_error(error):
+    temporary = is_temporary_error(error)
+    metrics.inc(
+        "mailing_send_errors_total", kind="temporary" if temporary else "permanent", error=type(error).__name__
+    )
+    return temporary
+
+
+# Жёсткий отказ: сервер отклонил сам адрес получателя (ящика нет, адрес недопустим). Отказы по политике
+# сервера (расширенный код 5.7.x: спам, репутация) и ошибки отправителя или содержимого письма не в счёт
+def is_hard_bounce(error):
+    return (
+        getattr(error, "recipients", None) is not None
+        and get_smtp_code(error) in HARD_BOUNCE_CODES
+        and POLICY_STATUS not in str(error)
+    )
+
+
+# Время следующей попытки после attempts неудачных: экспоненциальная задержка со случайным разбросом
+# (половина задержки фиксирована, половина случайна), чтобы повторы разных получателей не совпадали
+def get_next_retry_at(attempts):
+    if attempts >= settings.MAILING_MAX_ATTEMPTS:
+        return None
+    delay = min(settings.MAILING_RETRY_MAX_DELAY, settings.MAILING_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return timezone.now() + timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+# =================== Движок отправки писем ==========================================================================
+class MailingSender:
+    """Отправка писем через одну SMTP-сессию на весь запуск рассылки"""
+
+    def __init__(self, batch_size=None, throttle=None, **connection_kwargs):
+        self.batch_size = batch_size or settings.MAILING_BATCH_SIZE
+        self.connection_kwargs = connection_kwargs
+        self.throttle = throttle or Throttle(connection_kwargs.get("host"))
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Метод открытия SMTP-сессии (повторный вызов на открытой сессии ничего не делает)
+    def open(self):
+        if self.connection is None:
+            self.throttle.connections.acquire()
+            self.connection = get_connection(**self.connection_kwargs)
+            with metrics.timer("mailing_smtp_connect_seconds"):
+                self.connection.open()
+
+    # Метод закрытия SMTP-сессии
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            self.throttle.connections.release()
+
+    # Метод отправки пачки писем, возвращает ошибку (или None) для каждого письма.
+    # Перед каждым письмом ожидается разрешение ограничителя скорости сервера и владельца рассылки
+    def send_batch(self, messages, owner_id=None):
+        errors = []
+        for message in messages:
+            self.throttle.wait(owner_id)
+            errors.append(self._send(message))
+        return errors
+
+    # Метод отправки одного письма с переподключением при разрыве сессии
+    def _send(self, message):
+        error = None
+        for _ in range(2):
+            try:
+                self.open()
+                with metrics.timer("mailing_smtp_send_seconds"):
+                    self.connection.send_messages([message])
+                return None
+            except RECONNECT_ERRORS as e:
+                logger.warning(f"SMTP-сессия разорвана ({e}), переподключение.")
+                self.close()
+                error = e
+            except Exception as e:
+                return e
+        return error
+
+
+# Создание движка отправки, выбранного в настройках MAILING_DELIVERY_BACKEND
+def get_backend_sender(batch_size=None, throttle=None, **connection_kwargs):
+    if settings.MAILING_DELIVERY_BACKEND == "async":
+        from .async_sender import AsyncMailingSender
+
+        return AsyncMailingSender(batch_size=batch_size, throttle=throttle, **connection_kwargs)
+    return MailingSender(batch_size=batch_size, throttle=throttle, **connection_kwargs)
+
+
+# Создание движка отправки рассылок: письма группируются по доменам получателей
+def get_sender(batch_size=None, throttle=None, **connection_kwargs):
+    return DomainSender(batch_size=batch_size, throttle=throttle, **connection_kwargs)
+
+
+# =================== Отправка по доменам получателей ================================================================
+# Маршруты доменов из настройки MAILING_DOMAIN_ROUTES ("домен=хост[:порт],..."): {домен: (хост, порт)}
+@lru_cache(maxsize=4)
+def parse_domain_routes(value):
+    routes = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        domain, _, target = item.partition("=")
+        host, _, port = target.strip().partition(":")
+        routes[domain.strip().lower()] = (host, int(port) if port else None)
+    return routes
+
+
+class DomainStats:
+    """Итоги отправки по доменам: писем, ошибок, секунд на отправку"""
+
+    def __init__(self):
+        self.domains = {}
+
+    def add(self, domain, sent, failed, seconds):
+        entry = self.domains.setdefault(domain, {"sent": 0, "failed": 0, "seconds": 0.0})
+        entry["sent"] += sent
+        entry["failed"] += failed
+        entry["seconds"] += seconds
+
+    def merge(self, other):
+        for domain, entry in other.domains.items():
+            self.add(domain, entry["sent"], entry["failed"], entry["seconds"])
+
+    # Домены по убыванию числа писем: [(домен, писем, ошибок, писем в секунду, доля ошибок)]
+    def report(self, limit=None):
+        rows = []
+        for domain, entry in sorted(self.domains.items(), key=lambda item: -(item[1]["sent"] + item[1]["failed"])):
+            total = entry["sent"] + entry["failed"]
+            rate = total / entry["seconds"] if entry["seconds"] else None
+            rows.append((domain, total, entry["failed"], rate, entry["failed"] / total if total else 0.0))
+        return rows[:limit]
+
+
+class DomainSender:
+    """Отправка пачек, сгруппированных по домену получателей. Домены с маршрутом в MAILING_DOMAIN_ROUTES
+    уходят через свой smart host, остальные — через EMAIL_HOST; у каждого маршрута своя SMTP-сессия
+    на весь запуск. Одновременных сессий на домен (во всех процессах) не больше MAILING_DOMAIN_CONNECTIONS"""
+
+    def __init__(self, batch_size=None, throttle=None, **connection_kwargs):
+        self.batch_size = batch_size or settings.MAILING_BATCH_SIZE
+        self.throttle = throttle
+        self.connection_kwargs = connection_kwargs
+        self.senders = {}
+        self.stats = DomainStats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Движок отправки маршрута домена (создаётся при первом письме маршрута)
+    def get_route_sender(self, domain):
+        route = parse_domain_routes(settings.MAILING_DOMAIN_ROUTES).get(domain)
+        if route not in self.senders:
+            kwargs = dict(self.connection_kwargs)
+            if route is not None:
+                kwargs["host"] = route[0]
+                if route[1] is not None:
+                    kwargs["port"] = route[1]
+            self.senders[route] = get_backend_sender(self.batch_size, self.throttle, **kwargs)
+        return self.senders[route]
+
+    def close(self):
+        for sender in self.senders.values():
+            sender.close()
+        self.senders = {}
+
+    # Метод отправки пачки: подряд идущие письма одного домена уходят одной группой через сессию маршрута
+    def send_batch(self, messages, owner_id=None):
+        errors = []
+        for domain, group in groupby(messages, key=lambda message: get_domain(message.to[0])):
+            group = list(group)
+            slots = ConnectionSlots(f"domain:{domain}", settings.MAILING_DOMAIN_CONNECTIONS)
+            slots.acquire()
+            started = time.perf_counter()
+            try:
+                group_errors = self.get_route_sender(domain).send_batch(group, owner_id=owner_id)
+            finally:
+                slots.release()
+            failed = sum(1 for error in group_errors if error is not None)
+            self.stats.add(domain, len(group) - failed, failed, time.perf_counter() - started)
+            errors += group_errors
+        return errors
+
+
+# =================== Буферизованная запись попыток рассылки ==========================================================
+class AttemptRecorder:
+    """Накопление попыток и записей журнала доставки и запись их пачками через bulk_create"""
+
+    def __init__(self, flush_size=None, flush_interval=None, checkpoints=True, heartbeat=None):
+        self.flush_size = flush_size or settings.MAILING_ATTEMPT_FLUSH_SIZE
+        self.flush_interval = settings.MAILING_ATTEMPT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        # Контрольную точку можно сдвигать, только если получатели обрабатываются строго по возрастанию id
+        self.checkpoints = checkpoints
+        self.buffer = []
+        self.deliveries = []
+        # Позиции (запуск, домен, id) записанных получателей для контрольных точек
+        self.positions = []
+        self.counters = {}
+        # Вызывается после каждой записи буфера (продление аренды задачи отправки)
+        self.heartbeat = heartbeat
+        self.last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    # Оставшиеся в буфере попытки записываются и при штатном завершении, и при исключении
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    # Метод добавления попытки (и записи журнала доставки, если известен запуск) в буфер
+    def add(
+        self,
+        mailing_list_id,
+        result,
+        server_response=None,
+        recipient_id=None,
+        run_id=None,
+        owner_id=None,
+        next_retry_at=None,
+        domain="",
+    ):
+        self.buffer.append(Attempt(result=result, server_response=server_response, mailing_list_id=mailing_list_id))
+        metrics.inc("mailing_attempts_total", result=result)
+        if owner_id is not None:
+            self.counters.setdefault(owner_id, Counter())[result] += 1
+        if run_id is not None:
+            self.positions.append((run_id, domain, recipient_id))
+            self.deliveries.append(
+                Delivery(
+                    mailing_list_id=mailing_list_id,
+                    recipient_id=recipient_id,
+                    run_id=run_id,
+                    result=result,
+                    next_retry_at=next_retry_at,
+                )
+            )
+        if len(self.buffer) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    # Метод записи накопленных попыток, журнала доставки и контрольных точек одной транзакцией
+    def flush(self):
+        if self.buffer:
+            with metrics.timer("mailing_attempt_flush_seconds"), transaction.atomic():
+                Attempt.objects.bulk_create(self.buffer, batch_size=self.flush_size)
+                Delivery.objects.bulk_create(self.deliveries, batch_size=self.flush_size, ignore_conflicts=True)
+                if self.checkpoints:
+                    # Получатели обрабатываются по (домен, id), контрольная точка — наибольшая такая пара
+                    checkpoints = {}
+                    for run_id, domain, recipient_id in self.positions:
+                        checkpoints[run_id] = max(checkpoints.get(run_id, ("", 0)), (domain or "", recipient_id))
+                    for run_id, (domain, recipient_id) in checkpoints.items():
+                        MailingRun.objects.filter(
+                            Q(checkpoint_domain__lt=domain) | Q(checkpoint_domain=domain, checkpoint__lt=recipient_id),
+                            pk=run_id,
+                        ).update(checkpoint_domain=domain, checkpoint=recipient_id)
+                update_mailing_stats(self.counters)
+            # bulk_create не отправляет сигналы, поэтому кеш списка попыток сбрасывается явно
+            bump_model_version(Attempt)
+            self.buffer = []
+            self.deliveries = []
+            self.positions = []
+            self.counters = {}
+        self.last_flush = time.monotonic()
+        if self.heartbeat is not None:
+            self.heartbeat()
+
+
+# =================== Статистика рассылок ============================================================================
+# Увеличение счётчиков попыток пользователей; counters: {owner_id: Counter({"successful": n, "failed": m})}
+def update_mailing_stats(counters):
+    for owner_id, results in counters.items():
+        changes = {
+            "total_attempts": F("total_attempts") + results.total(),
+            "success_attempts": F("success_attempts") + results["successful"],
+            "failed_attempts": F("failed_attempts") + results["failed"],
+        }
+        # Строка счётчиков создаётся только для новых попыток: вычитание (удаление попыток и рассылок,
+        # в том числе каскадное вместе с владельцем) меняет лишь существующую строку
+        if MailingStats.objects.filter(owner_id=owner_id).update(**changes) or min(results.values(), default=0) < 0:
+            continue
+        MailingStats.objects.get_or_create(owner_id=owner_id)
+        MailingStats.objects.filter(owner_id=owner_id).update(**changes)
+
+
+# Статистика для главной страницы: два запроса вне зависимости от числа попыток
+def get_dashboard_stats(owner):
+    stats = MailingList.objects.filter(owner=owner).aggregate(
+        total_mailings=Count("id"),
+        active_mailings=Count("id", filter=Q(status="started")),
+    )
+    recipients = Recipient.objects.filter(owner=OuterRef("pk")).order_by().values("owner").annotate(count=Count("id"))
+    counters = (
+        CustomUser.objects.filter(pk=owner.pk)
+        .annotate(unique_recipients=Subquery(recipients.values("count")))
+        .values(
+            "unique_recipients",
+            "mailing_stats__total_attempts",
+            "mailing_stats__success_attempts",
+            "mailing_stats__failed_attempts",
+        )
+        .first()
+    )
+    stats["unique_recipients"] = counters["unique_recipients"] or 0
+    stats["total_attempts"] = counters["mailing_stats__total_attempts"] or 0
+    stats["success_attempts"] = counters["mailing_stats__success_attempts"] or 0
+    stats["failed_attempts"] = counters["mailing_stats__failed_attempts"] or 0
+    return stats
+
+
+# =================== Запуски рассылки и журнал доставки ============================================================
+class RunLeaseLost(Exception):
+    """Аренда запуска истекла, и запуск продолжил другой процесс: отправку рассылки нужно прекратить"""
+
+
+# Начало нового запуска рассылки или продолжение незавершённого, аренда которого истекла (процесс отправки
+# упал или завис). Запуск с действующей арендой выполняет другой процесс: возвращается None. Время захвата
+# (leased_at) служит отметкой владельца, как started_at у задачи отправки
+def start_run(mailinglist):
+    now = timezone.now()
+    with transaction.atomic():
+        MailingList.objects.select_for_update().filter(pk=mailinglist.pk).first()
+        run = MailingRun.objects.filter(mailing_list=mailinglist, status="running").first()
+        if run is None:
+            run = MailingRun.objects.create(mailing_list=mailinglist, leased_at=now, heartbeat_at=now)
+        elif run.heartbeat_at is not None and run.heartbeat_at > now - timedelta(seconds=settings.MAILING_RUN_TIMEOUT):
+            logger.info(f"Рассылка {mailinglist.id}: запуск №{run.pk} выполняется другим процессом.")
+            return None
+        else:
+            logger.info(
+                f"Рассылка {mailinglist.id}: продолжение запуска №{run.pk} "
+                f"после получателя id={run.checkpoint} домена {run.checkpoint_domain or '-'}."
+            )
+            run.leased_at = run.heartbeat_at = now
+            run.save(update_fields=["leased_at", "heartbeat_at"])
+    run.mailing_list = mailinglist
+    return run
+
+
+# Продление аренды запуска перед очередной пачкой; запрос к базе — не чаще десятой доли MAILING_RUN_TIMEOUT
+def renew_run(run):
     now = timezone.now()
-    from_email = settings.EMAIL_HOST_USER
+    if now - run.heartbeat_at < timedelta(seconds=settings.MAILING_RUN_TIMEOUT / 10):
+        return
+    if not MailingRun.objects.filter(pk=run.pk, status="running", leased_at=run.leased_at).update(heartbeat_at=now):
+        raise RunLeaseLost(f"Запуск №{run.pk} рассылки {run.mailing_list_id} продолжен другим процессом.")
+    run.heartbeat_at = now
 
-    subject = mailinglist.message.subject
-    message = mailinglist.message.letter_body
 
-    if mailinglist.status != "started" or not (mailinglist.start_time <= now < mailinglist.end_time):
+# Освобождение аренды незавершённого запуска (отправка прервана ошибкой): следующий вызов продолжит
+# запуск сразу, не дожидаясь истечения аренды
+def release_run(run):
+    MailingRun.objects.filter(pk=run.pk, status="running", leased_at=run.leased_at).update(heartbeat_at=None)
+
+
+# Завершение запуска рассылки, если он всё ещё за этим процессом
+def finish_run(run):
+    run.status = "completed"
+    run.finished_at = timezone.now()
+    MailingRun.objects.filter(pk=run.pk, leased_at=run.leased_at).update(
+        status=run.status, finished_at=run.finished_at
+    )
+
+
+# Формирование персонального письма получателю рассылки (шаблоны сообщения компилируются один раз)
+def build_message(mailinglist, recipient):
+    return get_renderer(mailinglist.message).build(mailinglist.id, recipient)
+
+
+# Сборка писем пачки получателей с замером времени на каждое письмо
+def build_messages(mailinglist, recipients):
+    messages = []
+    for recipient in recipients:
+        started = time.perf_counter()
+        messages.append(build_message(mailinglist, recipient))
+        metrics.observe("mailing_render_seconds", time.perf_counter() - started)
+    return messages
+
+
+# Потоковое чтение получателей рассылки: keyset-пагинация по промежуточной таблице M2M,
+# из базы читаются только нужные для отправки столбцы, а не модели целиком
+def iter_recipients(run, chunk_size=None):
+    chunk_size = chunk_size or settings.MAILING_RECIPIENT_CHUNK_SIZE
+    links = MailingList.recipients.through.objects.filter(mailinglist_id=run.mailing_list_id)
+    # Из получателей рассылки с одинаковым нормализованным адресом берётся один, с наименьшим id: письмо
+    # на адрес уходит один раз (одинаковые адреса возможны у получателей разных владельцев). Подзапрос
+    # с GROUP BY не зависит от внешней строки и выполняется один раз на выборку
+    first_per_address = links.values("recipient__email_normalized").annotate(first=Min("recipient_id")).values("first")
+    through = (
+        links.filter(recipient_id__in=first_per_address)
+        .exclude(recipient_id__in=Delivery.objects.filter(run=run).values("recipient_id"))
+        .values_list("recipient_id", "recipient__email", "recipient__full_name", "recipient__domain")
+    )
+    # Получатели идут по (домен, id): письма одного домена подряд. Каждая порция — отдельный короткий запрос
+    # с LIMIT после последней прочитанной пары (домен, id), а не открытый на весь запуск курсор: память
+    # не растёт с размером рассылки, и первая пачка готова после одного запроса. Продолжение запуска —
+    # с контрольной точки (домен, id)
+    last_domain, last_id = run.checkpoint_domain, run.checkpoint
+    while True:
+        after_last = Q(recipient__domain__gt=last_domain) | Q(recipient__domain=last_domain, recipient_id__gt=last_id)
+        with metrics.timer("mailing_db_fetch_seconds"):
+            rows = list(through.filter(after_last).order_by("recipient__domain", "recipient_id")[:chunk_size])
+        for row in rows:
+            yield RecipientRow(*row)
+        if len(rows) < chunk_size:
+            return
+        last_id, last_domain = rows[-1][0], rows[-1][3]
+
+
+# Разбиение ещё не обработанных в этом запуске получателей на пачки одного домена: пачка уходит
+# через одну SMTP-сессию маршрута домена, не перемежаясь письмами другим доменам
+def iter_recipient_batches(run, batch_size):
+    batch = []
+    for recipient in iter_recipients(run):
+        if not recipient.email:
+            logger.warning(f"У получателя {recipient.full_name} отсутствует действительный адрес электронной почты.")
+            continue
+        if batch and (len(batch) >= batch_size or recipient.domain != batch[0].domain):
+            yield batch
+            batch = []
+        batch.append(recipient)
+    if batch:
+        yield batch
+
+
+# Ошибки получателей, которым письмо не отправляется: адрес в списке подавления или домен заведомо не принимает
+# почту (по кешу проверок). Обе проверки — поиск в памяти процесса, без запросов к базе и DNS
+def get_blocked_errors(recipients, owner_id):
+    suppression_list.refresh()
+    bad_domains = domain_validator.known_bad(get_domain(recipient.email) for recipient in recipients)
+    errors = {}
+    for recipient in recipients:
+        if reason := suppression_list.get(recipient.email, owner_id):
+            errors[recipient.id] = SuppressedAddressError(recipient.email, reason)
+            metrics.inc("mailing_suppressed_total", reason=reason)
+        elif (domain := get_domain(recipient.email)) in bad_domains:
+            errors[recipient.id] = UndeliverableDomainError(domain)
+    return errors
+
+
+# Отправка писем получателям, кроме заблокированных до SMTP; возвращает ошибки в порядке получателей.
+# Адреса с жёстким отказом сразу попадают в список подавления
+def send_to_recipients(mailinglist, recipients, sender):
+    blocked = get_blocked_errors(recipients, mailinglist.owner_id)
+    deliverable = [recipient for recipient in recipients if recipient.id not in blocked]
+    try:
+        messages = build_messages(mailinglist, deliverable)
+    except MessageTemplateError as e:
+        # Письма пачки не собираются по шаблону: ошибка постоянная для каждого получателя
+        sent_errors = iter([e] * len(deliverable))
+    else:
+        sent_errors = iter(sender.send_batch(messages, owner_id=mailinglist.owner_id))
+    errors = [blocked[recipient.id] if recipient.id in blocked else next(sent_errors) for recipient in recipients]
+    bounces = {
+        recipient.email: str(error)
+        for recipient, error in zip(recipients, errors)
+        if error is not None and is_hard_bounce(error)
+    }
+    if bounces:
+        suppress(bounces, "bounce", details=bounces)
+        logger.warning(f"В список подавления добавлены адреса с жёстким отказом: {len(bounces)}.")
+    return errors
+
+
+# Отправка пачки получателей и запись результатов, возвращает (успешно, с ошибкой)
+def deliver_batch(run, batch, sender, recorder):
+    mailinglist = run.mailing_list
+    sent = failed = 0
+    errors = send_to_recipients(mailinglist, batch, sender)
+    for recipient, error in zip(batch, errors):
+        if error is None:
+            sent += 1
+            recorder.add(
+                mailinglist.id,
+                "successful",
+                recipient_id=recipient.id,
+                run_id=run.id,
+                owner_id=mailinglist.owner_id,
+                domain=recipient.domain,
+            )
+            logger.info(
+                f"Рассылка с идентификатором={mailinglist.id} для клиента: {recipient.full_name} произведена успешно."
+            )
+        else:
+            failed += 1
+            next_retry_at = get_next_retry_at(1) if count_error(error) else None
+            recorder.add(
+                mailinglist.id,
+                "failed",
+                str(error),
+                recipient_id=recipient.id,
+                run_id=run.id,
+                owner_id=mailinglist.owner_id,
+                next_retry_at=next_retry_at,
+                domain=recipient.domain,
+            )
+            logger.error(f"Ошибка отправки: {error}" + (f", повтор после {next_retry_at}" if next_retry_at else ""))
+    return sent, failed
+
+
+# Проверка шаблона сообщения перед запуском рассылки. Рассылка с ошибкой в шаблоне не запускается:
+# в журнал пишется одна неуспешная попытка, остальные рассылки отправляются как обычно
+def check_message(mailinglist, recorder):
+    try:
+        get_renderer(mailinglist.message)
+    except MessageTemplateError as e:
+        recorder.add(mailinglist.id, "failed", str(e), owner_id=mailinglist.owner_id)
+        logger.error(f"Рассылка с идентификатором={mailinglist.id} не отправлена: {e}")
+        return False
+    return True
+
+
+# Отправка рассылки всем её получателям через переданный движок отправки
+def deliver_mailinglist(mailinglist, sender, recorder):
+    if not check_message(mailinglist, recorder):
+        return 0, 1
+    sent = failed = 0
+    run = start_run(mailinglist)
+    if run is None:
+        return sent, failed
+    try:
+        for batch in iter_recipient_batches(run, sender.batch_size):
+            renew_run(run)
+            batch_sent, batch_failed = deliver_batch(run, batch, sender, recorder)
+            sent += batch_sent
+            failed += batch_failed
+        # Запуск закрывается только после того, как весь журнал доставки записан
+        recorder.flush()
+    except RunLeaseLost as e:
+        logger.warning(str(e))
+        return sent, failed
+    except BaseException:
+        # Аренда освобождается только после записи отправленного: продолжение не повторит эти письма
+        try:
+            recorder.flush()
+        finally:
+            release_run(run)
+        raise
+    finish_run(run)
+    return sent, failed
+
+
+# =================== Параллельная отправка рассылок ================================================================
+class DeliveryWorker(threading.Thread):
+    """Поток отправки со своей SMTP-сессией и своим буфером попыток"""
+
+    def __init__(self, tasks, batch_size=None):
+        super().__init__(daemon=True)
+        self.tasks = tasks
+        self.batch_size = batch_size
+        self.sent = 0
+        self.failed = 0
+        self.errors = 0
+        self.stats = DomainStats()
+
+    def run(self):
+        try:
+            with get_sender(batch_size=self.batch_size) as sender, AttemptRecorder(checkpoints=False) as recorder:
+                self.stats = sender.stats
+                while True:
+                    task = self.tasks.get()
+                    if task is None:
+                        break
+                    run, batch = task
+                    try:
+                        sent, failed = deliver_batch(run, batch, sender, recorder)
+                        self.sent += sent
+                        self.failed += failed
+                    except Exception as e:
+                        self.errors += 1
+                        logger.exception(f"Ошибка обработки пачки рассылки {run.mailing_list_id}: {e}")
+        except Exception as e:
+            self.errors += 1
+            logger.exception(f"Ошибка потока отправки {self.name}: {e}")
+        finally:
+            db_connection.close()
+
+
+# Отправка рассылок пулом потоков; concurrency ограничивает число пачек в очереди
+def deliver_mailinglists(mailinglists, workers=1, concurrency=None, batch_size=None):
+    started = time.monotonic()
+    summary = {"mailings": 0, "sent": 0, "failed": 0, "workers": workers, "domains": DomainStats()}
+
+    if workers <= 1:
+        with get_sender(batch_size=batch_size) as sender, AttemptRecorder() as recorder:
+            summary["domains"] = sender.stats
+            for mailinglist in mailinglists:
+                sent, failed = deliver_mailinglist(mailinglist, sender, recorder)
+                summary["mailings"] += 1
+                summary["sent"] += sent
+                summary["failed"] += failed
+                logger.info(f"Рассылка с идентификатором={mailinglist.id}: отправлено {sent}, ошибок {failed}.")
+    else:
+        tasks = queue.Queue(maxsize=concurrency or workers * 2)
+        pool = [DeliveryWorker(tasks, batch_size) for _ in range(workers)]
+        runs = []
+        queued = False
+        # Буфер главного потока: только попытки рассылок, не прошедших проверку шаблона
+        recorder = AttemptRecorder(checkpoints=False)
+        for worker in pool:
+            worker.start()
+        try:
+            for mailinglist in mailinglists:
+                summary["mailings"] += 1
+                if not check_message(mailinglist, recorder):
+                    summary["failed"] += 1
+                    continue
+                run = start_run(mailinglist)
+                if run is None:
+                    continue
+                runs.append(run)
+                try:
+                    for batch in iter_recipient_batches(run, batch_size or settings.MAILING_BATCH_SIZE):
+                        renew_run(run)
+                        tasks.put((run, batch))
+                        metrics.set_gauge("mailing_queue_depth", tasks.qsize())
+                except RunLeaseLost as e:
+                    logger.warning(str(e))
+                    runs.remove(run)
+            queued = True
+        finally:
+            for _ in pool:
+                tasks.put(None)
+            for worker in pool:
+                worker.join()
+            recorder.flush()
+            # Чтение получателей прервано ошибкой: аренда освобождается, когда потоки уже записали отправленное
+            if not queued:
+                for run in runs:
+                    release_run(run)
+        summary["sent"] = sum(worker.sent for worker in pool)
+        summary["failed"] += sum(worker.failed for worker in pool)
+        for worker in pool:
+            summary["domains"].merge(worker.stats)
+        # При сбое потоков запуски остаются открытыми и продолжатся со следующего вызова
+        for run in runs:
+            if any(worker.errors for worker in pool):
+                release_run(run)
+            else:
+                finish_run(run)
+
+    summary["elapsed"] = time.monotonic() - started
+    metrics.registry.flush()
+    return summary
+
+
+def send_mailinglist(pk, heartbeat=None):
+    """Отправка рассылки по требованию; heartbeat вызывается после каждой записи буфера попыток"""
+    mailinglist = MailingList.objects.select_related("message").get(pk=pk)
+    now = timezone.now()
+
+    # Рассылка без времени окончания активна с момента начала, как и в send_mailing
+    active = mailinglist.start_time <= now and (mailinglist.end_time is None or now < mailinglist.end_time)
+    if mailinglist.status != "started" or not active:
         logger.info(f"Рассылка {mailinglist.id} пока не запущена или завершила свою работу.")
     else:
-        for recipient in mailinglist.recipients.all():
-            if not recipient.email:
-                logger.warning(f"У получателя {recipient} отсутствует действительный адрес электронной почты.")
-                break
-            try:
-                send_mail(subject, message, from_email, [recipient.email])
-                Attempt.objects.create(result="successful", mailing_list_id=mailinglist.id)
-                logger.info(
-                    f"Рассылка с идентификатором={mailinglist.id} для клиента: {recipient} произведена успешно."
-                )
+        with get_sender() as sender, AttemptRecorder(heartbeat=heartbeat) as recorder:
+            deliver_mailinglist(mailinglist, sender, recorder)
 
-            except Exception as e:
-                Attempt.objects.create(result="failed", server_response=str(e), mailing_list_id=mailinglist.id)
-                logger.error(f"Ошибка отправки: {e}")
+
+# =================== Повторная отправка после временных ошибок =======================================================
+# Захват доставок, срок повтора которых наступил. Строки блокируются с SKIP LOCKED и сразу откладываются
+# на MAILING_JOB_TIMEOUT, поэтому параллельные воркеры не отправят одно письмо дважды
+def claim_retries(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        deliveries = list(
+            Delivery.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(next_retry_at__lte=now, mailing_list__status="started")
+            .select_related("mailing_list__message", "recipient")
+            .order_by("next_retry_at")[:limit]
+        )
+        if deliveries:
+            Delivery.objects.filter(pk__in=[delivery.pk for delivery in deliveries]).update(
+                next_retry_at=now + timedelta(seconds=settings.MAILING_JOB_TIMEOUT)
+            )
+    return deliveries
+
+
+# Повторная отправка захваченных доставок и обновление их состояния, возвращает (успешно, с ошибкой)
+def retry_deliveries(deliveries, sender, recorder):
+    sent = failed = 0
+    deliveries = sorted(deliveries, key=lambda delivery: delivery.mailing_list_id)
+    for _, group in groupby(deliveries, key=lambda delivery: delivery.mailing_list_id):
+        group = list(group)
+        mailinglist = group[0].mailing_list
+        errors = send_to_recipients(mailinglist, [delivery.recipient for delivery in group], sender)
+        for delivery, error in zip(group, errors):
+            delivery.attempts += 1
+            if error is None:
+                sent += 1
+                delivery.result = "successful"
+                delivery.next_retry_at = None
+                recorder.add(mailinglist.id, "successful", owner_id=mailinglist.owner_id)
+            else:
+                failed += 1
+                delivery.next_retry_at = get_next_retry_at(delivery.attempts) if count_error(error) else None
+                recorder.add(mailinglist.id, "failed", str(error), owner_id=mailinglist.owner_id)
+                if delivery.next_retry_at is None:
+                    logger.error(f"Получатель {delivery.recipient_id}: отправка не удалась окончательно: {error}")
+    Delivery.objects.bulk_update(deliveries, ["result", "attempts", "next_retry_at"])
+    return sent, failed
+
+
+# Обработка очереди повторов, пока в ней есть доставки с наступившим сроком
+def process_retries(batch_size=None):
+    summary = {"retried": 0, "sent": 0, "failed": 0}
+    with get_sender(batch_size=batch_size) as sender, AttemptRecorder(checkpoints=False) as recorder:
+        while deliveries := claim_retries(sender.batch_size):
+            sent, failed = retry_deliveries(deliveries, sender, recorder)
+            summary["retried"] += len(deliveries)
+            summary["sent"] += sent
+            summary["failed"] += failed
+    metrics.registry.flush()
+    return summary
+
+
+# =================== Очередь задач отправки ========================================================================
+class JobLeaseLost(Exception):
+    """Аренда задачи истекла, и задачу захватил другой воркер: отправку нужно прекратить"""
+
+
+# Постановка рассылки в очередь отправки. Повторный запрос возвращает незавершённую задачу рассылки:
+# вторую такую задачу не даёт создать уникальный индекс, даже если запросы пришли одновременно
+def enqueue_mailinglist(pk, attempts=3):
+    active = SendJob.objects.filter(mailing_list_id=pk, status__in=ACTIVE_JOB_STATUSES)
+    for attempt in range(attempts):
+        job = active.first()
+        if job is not None:
+            return job
+        try:
+            with transaction.atomic():
+                return SendJob.objects.create(mailing_list_id=pk)
+        except IntegrityError:
+            # Задачу только что создал параллельный запрос; если она уже завершилась, создаётся новая.
+            # Ошибка другого рода (например, рассылка удалена) повторяется при каждой попытке и выбрасывается
+            if attempt == attempts - 1:
+                raise
+
+
+# Захват следующей задачи; SKIP LOCKED позволяет нескольким воркерам не мешать друг другу.
+# Выполняемая задача выдаётся повторно, только если её аренда не продлевалась MAILING_JOB_TIMEOUT секунд
+def claim_job():
+    now = timezone.now()
+    stale_after = now - timedelta(seconds=settings.MAILING_JOB_TIMEOUT)
+    with transaction.atomic():
+        job = (
+            SendJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status="queued") | Q(status="running", heartbeat_at__lt=stale_after))
+            .order_by("created_at")
+            .first()
+        )
+        if job is not None:
+            job.status = "running"
+            job.started_at = job.heartbeat_at = now
+            job.save(update_fields=["status", "started_at", "heartbeat_at"])
+    return job
+
+
+# Продление аренды задачи. Время захвата (started_at) служит отметкой владельца: если задачу
+# после истечения аренды захватил другой воркер, продление не проходит и отправка прекращается
+def renew_job(job):
+    leased = SendJob.objects.filter(pk=job.pk, status="running", started_at=job.started_at)
+    if not leased.update(heartbeat_at=timezone.now()):
+        raise JobLeaseLost(f"Задача №{job.pk} выполняется другим воркером.")
+
+
+# Выполнение захваченной задачи с записью итогового статуса; аренда продлевается после каждой записи
+# буфера попыток
+def run_job(job):
+    job.error = None
+    try:
+        send_mailinglist(job.mailing_list_id, heartbeat=lambda: renew_job(job))
+        job.status = "done"
+    except JobLeaseLost as e:
+        logger.warning(str(e))
+        return job
+    except Exception as e:
+        logger.exception(f"Ошибка выполнения задачи №{job.pk}: {e}")
+        job.status = "failed"
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    SendJob.objects.filter(pk=job.pk, started_at=job.started_at).update(
+        status=job.status, error=job.error, finished_at=job.finished_at
+    )
+    return job
+
+
+# =================== Хранение попыток: дневные сводки и очистка =====================================================
+# Сводка попыток за [start, end) по рассылкам и дням (UTC) с самыми частыми ошибками; повторный запуск перезаписывает
+def rollup_attempts(start, end, top_errors=5):
+    day = TruncDate("attempt_time", tzinfo=dt_timezone.utc)
+    attempts = Attempt.objects.filter(attempt_time__gte=start, attempt_time__lt=end).order_by()
+    totals = (
+        attempts.annotate(day=day)
+        .values("mailing_list_id", "day")
+        .annotate(
+            successful=Count("id", filter=Q(result="successful")),
+            failed=Count("id", filter=Q(result="failed")),
+        )
+    )
+    errors = {}
+    rows = (
+        attempts.filter(result="failed")
+        .annotate(day=day)
+        .values("mailing_list_id", "day", "server_response")
+        .annotate(count=Count("id"))
+        .order_by("mailing_list_id", "day", "-count")
+    )
+    for row in rows.iterator():
+        top = errors.setdefault((row["mailing_list_id"], row["day"]), [])
+        if len(top) < top_errors:
+            top.append({"error": row["server_response"], "count": row["count"]})
+    rollups = [
+        AttemptDailyRollup(
+            mailing_list_id=row["mailing_list_id"],
+            day=row["day"],
+            successful=row["successful"],
+            failed=row["failed"],
+            top_errors=errors.get((row["mailing_list_id"], row["day"]), []),
+        )
+        for row in totals
+    ]
+    AttemptDailyRollup.objects.bulk_create(
+        rollups,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["mailing_list", "day"],
+        update_fields=["successful", "failed", "top_errors"],
+    )
+    return len(rollups)
+
+
+# Сворачивание и удаление попыток старше keep_months месяцев. На PostgreSQL целые месячные секции удаляются
+# через DETACH + DROP и заранее создаются секции на months_ahead месяцев вперёд; на других СУБД строки удаляются
+def prune_attempts(keep_months=None, months_ahead=2):
+    if keep_months is None:
+        keep_months = settings.MAILING_ATTEMPT_RETENTION_MONTHS
+    current = month_start(timezone.now())
+    cutoff = add_months(current, -keep_months)
+    summary = {"rollups": 0, "dropped_partitions": [], "deleted": 0, "created_partitions": []}
+
+    oldest = Attempt.objects.order_by("attempt_time").values_list("attempt_time", flat=True).first()
+    if oldest is not None:
+        month = month_start(oldest.astimezone(dt_timezone.utc))
+        while month < cutoff:
+            summary["rollups"] += rollup_attempts(month_bound(month), month_bound(add_months(month, 1)))
+            month = add_months(month, 1)
+
+    partitioned = is_partitioned(db_connection)
+    with transaction.atomic():
+        if partitioned:
+            summary["dropped_partitions"] = drop_partitions_before(db_connection, cutoff)
+        # Остаток: строки в секции по умолчанию или вся очистка на несекционированной таблице
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Attempt._meta.db_table} WHERE attempt_time < %s",
+                [month_bound(cutoff)],
+            )
+            summary["deleted"] = cursor.rowcount
+        if partitioned:
+            summary["created_partitions"] = ensure_partitions(
+                db_connection, current, add_months(current, months_ahead)
+            )
+    bump_model_version(Attempt)
+    return summary
+
+
+# =================== Слияние дублей получателей =====================================================================
+# Слияние получателей владельца (или всех владельцев) с одинаковым нормализованным адресом
+def dedupe_recipients(owner=None, dry_run=False, batch_size=1000):
+    summary = merge_duplicate_recipients(
+        Recipient,
+        MailingList.recipients.through,
+        Delivery,
+        owner_id=owner.pk if owner is not None else None,
+        batch_size=batch_size,
+        dry_run=dry_run,
+    )
+    if summary["merged"]:
+        # Удаление и перенос связей идут запросами без сигналов, поэтому кеш списков сбрасывается явно
+        bump_model_version(Recipient)
+        bump_model_version(MailingList)
+    return summary
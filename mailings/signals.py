@@ -0,0 +1,87 @@
+from collections import Counter
+
+from django.db.models import Count, QuerySet, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .caching import bump_model_version
+from .models import Attempt, AttemptDailyRollup, MailingList, Message, Recipient, Suppression
+from .services import update_mailing_stats
+
+
+# Любое изменение данных рассылок делает недействительными закешированные списки с их участием
+@receiver(post_save, sender=Recipient)
+@receiver(post_delete, sender=Recipient)
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=MailingList)
+@receiver(post_delete, sender=MailingList)
+@receiver(post_save, sender=Attempt)
+@receiver(post_delete, sender=Attempt)
+def invalidate_model_cache(sender, **kwargs):
+    bump_model_version(sender)
+
+
+# Удаление из списка подавления: снимки списка в процессах отправки перечитываются целиком
+# (новые записи они дочитывают сами, поэтому сохранение версию не меняет)
+@receiver(post_delete, sender=Suppression)
+def invalidate_suppression_list(sender, **kwargs):
+    bump_model_version(sender)
+
+
+@receiver(m2m_changed, sender=MailingList.recipients.through)
+def invalidate_mailinglist_recipients_cache(sender, **kwargs):
+    bump_model_version(MailingList)
+
+
+def get_owner_id(mailing_list_id):
+    return MailingList.objects.filter(pk=mailing_list_id).values_list("owner_id", flat=True).first()
+
+
+# Попытки, созданные или изменённые вручную (не через AttemptRecorder), тоже учитываются в статистике
+# пользователя: при смене результата или рассылки попытка переносится между счётчиками
+@receiver(pre_save, sender=Attempt)
+def remember_counted_attempt(sender, instance, **kwargs):
+    instance._counted = None
+    if not instance._state.adding:
+        instance._counted = (
+            Attempt.objects.filter(pk=instance.pk).values_list("mailing_list__owner_id", "result").first()
+        )
+
+
+@receiver(post_save, sender=Attempt)
+def count_saved_attempt(sender, instance, created, **kwargs):
+    counters = {}
+    if not created and instance._counted is not None:
+        owner_id, result = instance._counted
+        counters.setdefault(owner_id, Counter())[result] -= 1
+    counters.setdefault(get_owner_id(instance.mailing_list_id), Counter())[instance.result] += 1
+    update_mailing_stats({owner_id: results for owner_id, results in counters.items() if any(results.values())})
+
+
+# Удалённая попытка вычитается из статистики. При каскадном удалении рассылки попытки вычитаются
+# одним запросом в count_deleted_mailinglist, а не по одной
+@receiver(post_delete, sender=Attempt)
+def count_deleted_attempt(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Attempt) or (isinstance(origin, QuerySet) and origin.model is Attempt):
+        update_mailing_stats({get_owner_id(instance.mailing_list_id): Counter({instance.result: -1})})
+
+
+# Удаление рассылки вычитает из статистики её попытки, в том числе свёрнутые в дневные сводки
+@receiver(pre_delete, sender=MailingList)
+def count_deleted_mailinglist(sender, instance, **kwargs):
+    results = Counter(
+        dict(
+            Attempt.objects.filter(mailing_list=instance)
+            .order_by()
+            .values("result")
+            .annotate(count=Count("id"))
+            .values_list("result", "count")
+        )
+    )
+    rollups = AttemptDailyRollup.objects.filter(mailing_list=instance).aggregate(
+        successful=Sum("successful"), failed=Sum("failed")
+    )
+    results.update({result: count for result, count in rollups.items() if count})
+    if results:
+        update_mailing_stats({instance.owner_id: Counter({result: -count for result, count in results.items()})})
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from config import settings
+
+from .caching import get_model_versions
+from .dedup import normalize_email
+from .models import SUPPRESSION_REASON_CHOICES, Suppression
+
+# Через сколько секунд снимок перечитывается целиком, даже если записи не удалялись: дочитывание по id
+# пропускает строки, транзакция которых зафиксирована позже строк с большим id
+FULL_RELOAD_INTERVAL = 3600
+# Сколько строк читать из базы за раз при загрузке снимка
+LOAD_CHUNK_SIZE = 10000
+
+
+class SuppressedAddressError(ValueError):
+    """Адрес в списке подавления: письмо не отправляется"""
+
+    def __init__(self, email, reason):
+        super().__init__(f"Адрес {email} в списке подавления: {dict(SUPPRESSION_REASON_CHOICES)[reason].lower()}.")
+        self.email = email
+        self.reason = reason
+
+
+class SuppressionList:
+    """Снимок списка подавления в памяти процесса: {(id владельца или None, адрес): причина}. Проверка адреса
+    перед отправкой — поиск в словаре, без запросов к базе. Раз в MAILING_SUPPRESSION_REFRESH_INTERVAL секунд
+    дочитываются новые записи (id больше последнего прочитанного); после удаления записей (версия модели
+    в кеше) и раз в FULL_RELOAD_INTERVAL секунд снимок перечитывается целиком"""
+
+    def __init__(self):
+        self.entries = {}
+        self.last_id = 0
+        self.version = None
+        self.refreshed_at = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def read(queryset):
+        return queryset.order_by("id").values_list("id", "owner_id", "email", "reason").iterator(LOAD_CHUNK_SIZE)
+
+    # Метод дочитывания новых записей или полной загрузки снимка; вызывается перед каждой пачкой,
+    # но обращается к базе не чаще интервала обновления
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self.refreshed_at is not None:
+            if now - self.refreshed_at < settings.MAILING_SUPPRESSION_REFRESH_INTERVAL:
+                return
+        with self.lock:
+            version = get_model_versions([Suppression])[0]
+            if self.loaded_at is None or version != self.version or now - self.loaded_at >= FULL_RELOAD_INTERVAL:
+                # Новый словарь собирается отдельно и подменяет старый целиком: потоки отправки
+                # не видят наполовину загруженный снимок
+                entries, last_id = {}, 0
+                rows = self.read(Suppression.objects.all())
+                self.loaded_at = now
+            else:
+                entries, last_id = self.entries, self.last_id
+                rows = self.read(Suppression.objects.filter(id__gt=last_id))
+            for pk, owner_id, email, reason in rows:
+                entries[(owner_id, email)] = reason
+                last_id = max(last_id, pk)
+            self.entries, self.last_id, self.version = entries, last_id, version
+            self.refreshed_at = now
+
+    # Метод добавления записей в снимок сразу после их сохранения, не дожидаясь обновления
+    def add(self, emails, reason, owner_id=None):
+        for email in emails:
+            self.entries[(owner_id, email)] = reason
+
+    # Причина подавления адреса для рассылки владельца (None — адрес не подавлен)
+    def get(self, email, owner_id=None):
+        email = normalize_email(email)
+        return self.entries.get((None, email)) or self.entries.get((owner_id, email))
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.last_id = 0
+            self.version = self.refreshed_at = self.loaded_at = None
+
+
+suppression_list = SuppressionList()
+
+
+# Добавление адресов в список подавления (уже подавленные пропускаются); без владельца — для всех рассылок.
+# details — ответы сервера по адресам
+def suppress(emails, reason, owner_id=None, details=None):
+    details = {normalize_email(email): detail for email, detail in (details or {}).items()}
+    emails = {normalize_email(email) for email in emails}
+    Suppression.objects.bulk_create(
+        [
+            Suppression(email=email, owner_id=owner_id, reason=reason, detail=details.get(email, ""))
+            for email in emails
+        ],
+        ignore_conflicts=True,
+    )
+    suppression_list.add(emails, reason, owner_id)
+    return len(emails)
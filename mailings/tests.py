@@ -0,0 +1,1451 @@
+import base64
+import json
+import smtplib
+import threading
+import time
+import unittest
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+import aiosmtplib
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from config import settings
+from users.models import CustomUser
+
+from . import metrics
+from .async_sender import AsyncMailingSender
+from .benchmarks import SMTPSink
+from .caching import get_model_versions
+from .imports import import_recipients
+from .models import (
+    Attempt,
+    AttemptDailyRollup,
+    Delivery,
+    MailingList,
+    MailingRun,
+    MailingStats,
+    Message,
+    Recipient,
+    SendJob,
+    Suppression,
+)
+from .partitions import (
+    ATTEMPT_TABLE,
+    DEFAULT_PARTITION,
+    add_months,
+    ensure_partitions,
+    is_partitioned,
+    list_partition_months,
+    month_bound,
+    month_start,
+    partition_name,
+)
+from .rendering import CompiledTemplate, get_renderer
+from .scheduler import MailingScheduler
+from .services import (
+    AttemptRecorder,
+    JobLeaseLost,
+    MailingSender,
+    build_message,
+    claim_job,
+    claim_retries,
+    deliver_batch,
+    deliver_mailinglist,
+    deliver_mailinglists,
+    enqueue_mailinglist,
+    get_dashboard_stats,
+    get_next_retry_at,
+    get_sender,
+    is_hard_bounce,
+    is_temporary_error,
+    iter_recipient_batches,
+    iter_recipients,
+    prune_attempts,
+    renew_job,
+    retry_deliveries,
+    run_job,
+    send_mailinglist,
+    start_run,
+)
+from .suppression import suppress, suppression_list
+from .throttling import ConnectionSlots, RateLimit, Throttle
+from .validation import domain_validator, validate_address
+
+# Проверка доменов в тестах без DNS-запросов: домены вида dead.* не принимают почту
+RESOLVER = "mailings.tests.resolve_stub"
+
+
+def resolve_stub(domain):
+    return not domain.startswith("dead.")
+
+
+def setUpModule():
+    patcher = mock.patch.object(settings, "MAILING_DOMAIN_RESOLVER", RESOLVER)
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+
+
+# =================== Одна SMTP-сессия на запуск рассылки =============================================================
+# Параметры подключения к SMTP-серверу-заглушке (в тестах EMAIL_BACKEND — locmem)
+def sink_connection(sink):
+    return {
+        "backend": "django.core.mail.backends.smtp.EmailBackend",
+        "host": sink.server_address[0],
+        "port": sink.port,
+        "username": "",
+        "password": "",
+        "use_tls": False,
+        "use_ssl": False,
+    }
+
+
+def make_emails(count):
+    return [EmailMessage("Тема", "Текст", "sender@example.com", [f"r{i}@example.com"]) for i in range(count)]
+
+
+class MailingSenderTestCase(TestCase):
+    """Письма пачек уходят через одну SMTP-сессию, разорванная сессия открывается заново"""
+
+    def setUp(self):
+        self.throttle = Throttle("smtp.sink", host_rate=0, owner_rate=0, connections=0)
+
+    def test_one_session_for_all_batches(self):
+        with SMTPSink() as sink, MailingSender(throttle=self.throttle, **sink_connection(sink)) as sender:
+            self.assertEqual(sender.send_batch(make_emails(2)), [None, None])
+            session = sender.connection
+            self.assertEqual(sender.send_batch(make_emails(3)), [None, None, None])
+            self.assertIs(sender.connection, session)
+        self.assertEqual(sink.received, 5)
+        self.assertIsNone(sender.connection)
+
+    def test_reconnect_after_disconnect(self):
+        with SMTPSink() as sink, MailingSender(throttle=self.throttle, **sink_connection(sink)) as sender:
+            self.assertEqual(sender.send_batch(make_emails(1)), [None])
+            session = sender.connection
+            # Сервер закрыл сессию: следующее письмо уходит через новую
+            session.connection.close()
+            self.assertEqual(sender.send_batch(make_emails(1)), [None])
+            self.assertIsNot(sender.connection, session)
+        self.assertEqual(sink.received, 2)
+
+
+class AsyncMailingSenderTestCase(TestCase):
+    """Письма уходят через пул SMTP-сессий в цикле событий, число сессий ограничено слотами сервера"""
+
+    def test_sessions_limited_by_slots(self):
+        throttle = Throttle("smtp.sink", host_rate=0, owner_rate=0, connections=2)
+        with SMTPSink() as sink:
+            with AsyncMailingSender(concurrency=4, throttle=throttle, **sink_connection(sink)) as sender:
+                self.assertEqual(sender.send_batch(make_emails(5)), [None] * 5)
+                self.assertEqual(sender.clients.qsize(), 2)
+                self.assertEqual(sender.send_batch(make_emails(3)), [None] * 3)
+            self.assertEqual(sink.received, 8)
+        # Слоты соединений возвращены после закрытия движка
+        self.assertEqual(throttle.connections.held, 0)
+        self.assertEqual(cache.get(throttle.connections.key), 0)
+
+    def test_reconnect_after_disconnect(self):
+        throttle = Throttle("smtp.sink", host_rate=0, owner_rate=0, connections=0)
+        with SMTPSink() as sink:
+            with AsyncMailingSender(concurrency=1, throttle=throttle, **sink_connection(sink)) as sender:
+                self.assertEqual(sender.send_batch(make_emails(1)), [None])
+                client = sender.clients.get_nowait()
+                sender.clients.put_nowait(client)
+                real_send_message = client.send_message
+                calls = []
+
+                # Сервер разорвал сессию: письмо повторяется через новое подключение
+                async def send_message(*args, **kwargs):
+                    calls.append(args)
+                    if len(calls) == 1:
+                        client.close()
+                        raise aiosmtplib.SMTPServerDisconnected("Сессия закрыта сервером")
+                    return await real_send_message(*args, **kwargs)
+
+                with mock.patch.object(client, "send_message", send_message):
+                    self.assertEqual(sender.send_batch(make_emails(1)), [None])
+                self.assertEqual(len(calls), 2)
+            self.assertEqual(sink.received, 2)
+
+
+# =================== Пакетная запись попыток ========================================================================
+class AttemptRecorderTestCase(TestCase):
+    """Попытки пишутся пачками, остаток буфера записывается и при исключении"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        self.mailing = MailingList.objects.create(start_time=timezone.now(), message=message, owner=self.user)
+
+    def test_flush_by_size(self):
+        with AttemptRecorder(flush_size=3, flush_interval=3600) as recorder:
+            for _ in range(2):
+                recorder.add(self.mailing.id, "successful", owner_id=self.user.pk)
+            self.assertEqual(Attempt.objects.count(), 0)
+            recorder.add(self.mailing.id, "failed", "550", owner_id=self.user.pk)
+            self.assertEqual(Attempt.objects.count(), 3)
+        stats = MailingStats.objects.get(owner=self.user)
+        self.assertEqual((stats.total_attempts, stats.success_attempts, stats.failed_attempts), (3, 2, 1))
+
+    def test_flush_on_exception(self):
+        with self.assertRaises(RuntimeError), AttemptRecorder(flush_size=100, flush_interval=3600) as recorder:
+            recorder.add(self.mailing.id, "successful", owner_id=self.user.pk)
+            raise RuntimeError("Сбой отправки")
+        self.assertEqual(Attempt.objects.filter(mailing_list=self.mailing, result="successful").count(), 1)
+        self.assertEqual(MailingStats.objects.get(owner=self.user).total_attempts, 1)
+
+
+# =================== Параллельная отправка рассылок =================================================================
+class DeliveryWorkersTestCase(TransactionTestCase):
+    """Пачки рассылок отправляются пулом потоков; сбой пачки не останавливает остальные"""
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Потоки пула пишут в общую базу SQLite в памяти, которая блокирует таблицы целиком")
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        now = timezone.now()
+        self.mailings = []
+        for i in range(2):
+            mailing = MailingList.objects.create(
+                start_time=now, end_time=now + timedelta(days=1), status="started", message=message, owner=user
+            )
+            for j in range(5):
+                mailing.recipients.add(
+                    Recipient.objects.create(email=f"m{i}-r{j}@example.com", full_name=f"Р{j}", owner=user)
+                )
+            self.mailings.append(mailing)
+
+    def test_workers_send_all(self):
+        summary = deliver_mailinglists(self.mailings, workers=2, concurrency=1, batch_size=2)
+        self.assertEqual((summary["mailings"], summary["sent"], summary["failed"]), (2, 10, 0))
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertEqual(Delivery.objects.filter(result="successful").count(), 10)
+        self.assertEqual(set(MailingRun.objects.values_list("status", flat=True)), {"completed"})
+
+    def test_worker_error_keeps_runs_open(self):
+        real_deliver_batch = deliver_batch
+
+        # Пачки первой рассылки не обрабатываются
+        def failing_deliver_batch(run, batch, sender, recorder):
+            if run.mailing_list_id == self.mailings[0].id:
+                raise RuntimeError("Сбой обработки пачки")
+            return real_deliver_batch(run, batch, sender, recorder)
+
+        with mock.patch("mailings.services.deliver_batch", failing_deliver_batch):
+            summary = deliver_mailinglists(self.mailings, workers=2, batch_size=2)
+        self.assertEqual(summary["sent"], 5)
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), [f"m1-r{j}@example.com" for j in range(5)])
+        # Запуски остаются открытыми: следующий вызов продолжит первую рассылку с контрольной точки
+        self.assertEqual(set(MailingRun.objects.values_list("status", flat=True)), {"running"})
+        summary = deliver_mailinglists(self.mailings, workers=2, batch_size=2)
+        self.assertEqual(summary["sent"], 5)
+        self.assertEqual(Delivery.objects.filter(result="successful").count(), 10)
+
+
+# =================== Продолжение запуска после сбоя ==================================================================
+@mock.patch.object(settings, "MAILING_ATTEMPT_FLUSH_SIZE", 1)
+@mock.patch.object(settings, "MAILING_BATCH_SIZE", 1)
+class ResumableRunTestCase(TestCase):
+    """Запуск, прерванный сбоем, продолжается с контрольной точки: каждому получателю одно письмо.
+    Запуск, который ещё выполняет другой процесс (аренда продлевается), не продолжается"""
+
+    def setUp(self):
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        now = timezone.now()
+        self.mailing = MailingList.objects.create(
+            start_time=now, end_time=now + timedelta(days=1), status="started", message=message, owner=user
+        )
+        for i in range(5):
+            domain = "a.example.com" if i % 2 else "b.example.com"
+            self.mailing.recipients.add(
+                Recipient.objects.create(email=f"r{i}@{domain}", full_name=f"Р{i}", owner=user)
+            )
+
+    def crash_after(self, batches):
+        real_deliver_batch = deliver_batch
+        calls = []
+
+        def crashing_deliver_batch(*args):
+            calls.append(args)
+            if len(calls) > batches:
+                raise RuntimeError("Процесс отправки прерван")
+            return real_deliver_batch(*args)
+
+        with self.assertRaises(RuntimeError), mock.patch("mailings.services.deliver_batch", crashing_deliver_batch):
+            send_mailinglist(self.mailing.pk)
+
+    def assert_sent_once(self):
+        recipients = sorted(email.to[0] for email in mail.outbox)
+        self.assertEqual(recipients, sorted(self.mailing.recipients.values_list("email", flat=True)))
+        run = MailingRun.objects.get(mailing_list=self.mailing)
+        self.assertEqual(run.status, "completed")
+        self.assertEqual(Delivery.objects.filter(run=run, result="successful").count(), 5)
+
+    def test_resume_after_crash(self):
+        self.crash_after(3)
+        self.assertEqual(len(mail.outbox), 3)
+        run = MailingRun.objects.get(mailing_list=self.mailing)
+        self.assertEqual(run.status, "running")
+        # Получатели идут по (домен, id): два адреса a.example.com, затем первый адрес b.example.com
+        first = Recipient.objects.filter(domain="b.example.com").order_by("id").first()
+        self.assertEqual((run.checkpoint_domain, run.checkpoint), ("b.example.com", first.id))
+        send_mailinglist(self.mailing.pk)
+        self.assert_sent_once()
+
+    def test_resume_behind_checkpoint(self):
+        self.crash_after(2)
+        # Контрольная точка отстала от журнала доставки: отправленные получатели всё равно пропускаются
+        MailingRun.objects.filter(mailing_list=self.mailing).update(checkpoint_domain="", checkpoint=0)
+        send_mailinglist(self.mailing.pk)
+        self.assert_sent_once()
+
+    def test_live_run_not_resumed(self):
+        self.crash_after(2)
+        # Запуск с действующей арендой выполняет другой процесс: его получателям письма не отправляются
+        now = timezone.now()
+        MailingRun.objects.filter(mailing_list=self.mailing).update(leased_at=now, heartbeat_at=now)
+        send_mailinglist(self.mailing.pk)
+        self.assertEqual(len(mail.outbox), 2)
+        # Аренда не продлевалась дольше MAILING_RUN_TIMEOUT: процесс считается упавшим, запуск продолжается
+        stale = now - timedelta(seconds=settings.MAILING_RUN_TIMEOUT + 1)
+        MailingRun.objects.filter(mailing_list=self.mailing).update(heartbeat_at=stale)
+        send_mailinglist(self.mailing.pk)
+        self.assert_sent_once()
+
+    @mock.patch.object(settings, "MAILING_RUN_TIMEOUT", 0)
+    def test_stops_when_lease_lost(self):
+        real_deliver_batch = deliver_batch
+
+        # После первой пачки запуск продолжил другой процесс
+        def deliver_and_lose_lease(run, *args):
+            result = real_deliver_batch(run, *args)
+            MailingRun.objects.filter(pk=run.pk).update(leased_at=timezone.now() + timedelta(seconds=1))
+            return result
+
+        with mock.patch("mailings.services.deliver_batch", deliver_and_lose_lease):
+            send_mailinglist(self.mailing.pk)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(MailingRun.objects.get(mailing_list=self.mailing).status, "running")
+
+
+# =================== Очередь задач отправки =========================================================================
+class SendJobQueueTestCase(TestCase):
+    """Одна незавершённая задача на рассылку, аренда задачи продлевается во время отправки"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        now = timezone.now()
+        self.mailing = MailingList.objects.create(
+            start_time=now, end_time=now + timedelta(days=1), status="started", message=message, owner=self.user
+        )
+        for i in range(3):
+            self.mailing.recipients.add(
+                Recipient.objects.create(email=f"r{i}@example.com", full_name=f"Р{i}", owner=self.user)
+            )
+
+    def test_enqueue_reuses_active_job(self):
+        job = enqueue_mailinglist(self.mailing.pk)
+        self.assertEqual(enqueue_mailinglist(self.mailing.pk), job)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SendJob.objects.create(mailing_list=self.mailing)
+        # Задача, созданная параллельным запросом между проверкой и вставкой
+        with mock.patch("django.db.models.query.QuerySet.first", side_effect=[None, job]):
+            self.assertEqual(enqueue_mailinglist(self.mailing.pk), job)
+        SendJob.objects.filter(pk=job.pk).update(status="done")
+        self.assertNotEqual(enqueue_mailinglist(self.mailing.pk), job)
+
+    def test_enqueue_gives_up_on_other_errors(self):
+        # Ошибка не из-за параллельной задачи (рассылка удалена): попытки ограничены, ошибка выбрасывается
+        with mock.patch.object(SendJob.objects, "create", side_effect=IntegrityError("FOREIGN KEY")) as create:
+            with self.assertRaises(IntegrityError):
+                enqueue_mailinglist(self.mailing.pk)
+        self.assertEqual(create.call_count, 3)
+
+    def test_view_enqueues(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("mailings:mailinglist_send", args=[self.mailing.pk]))
+        self.assertRedirects(response, reverse("mailings:mailinglist_list"), fetch_redirect_response=False)
+        self.client.get(reverse("mailings:mailinglist_send", args=[self.mailing.pk]))
+        self.assertEqual(SendJob.objects.filter(mailing_list=self.mailing, status="queued").count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_claim_and_stale_reclaim(self):
+        job = enqueue_mailinglist(self.mailing.pk)
+        claimed = claim_job()
+        self.assertEqual((claimed.pk, claimed.status), (job.pk, "running"))
+        self.assertIsNone(claim_job())
+        # Аренда продлевается, пока задача у этого воркера
+        renew_job(claimed)
+        self.assertIsNone(claim_job())
+        # Аренда не продлевалась дольше MAILING_JOB_TIMEOUT: задачу забирает другой воркер
+        stale = timezone.now() - timedelta(seconds=settings.MAILING_JOB_TIMEOUT + 1)
+        SendJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        reclaimed = claim_job()
+        self.assertEqual(reclaimed.pk, job.pk)
+        with self.assertRaises(JobLeaseLost):
+            renew_job(claimed)
+
+    @mock.patch.object(settings, "MAILING_ATTEMPT_FLUSH_SIZE", 1)
+    def test_run_job_renews_lease(self):
+        enqueue_mailinglist(self.mailing.pk)
+        job = claim_job()
+        SendJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertGreater(job.heartbeat_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(len(mail.outbox), 3)
+
+    @mock.patch.object(settings, "MAILING_ATTEMPT_FLUSH_SIZE", 1)
+    @mock.patch.object(settings, "MAILING_BATCH_SIZE", 1)
+    def test_run_job_stops_when_lease_lost(self):
+        enqueue_mailinglist(self.mailing.pk)
+        job = claim_job()
+        # Задачу захватил другой воркер: первое же продление аренды не проходит
+        SendJob.objects.filter(pk=job.pk).update(started_at=timezone.now() + timedelta(seconds=1))
+        run_job(job)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(SendJob.objects.get(pk=job.pk).status, "running")
+
+
+# =================== Защита от N+1 запросов в списках и отправке ====================================================
+class QueryCountTestCase(TestCase):
+    """Количество запросов на страницу списка не должно зависеть от числа строк"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        self.client.force_login(self.user)
+
+    # Создание рассылок (с сообщением, получателем и попыткой у каждой)
+    def create_mailings(self, count):
+        now = timezone.now()
+        for i in range(count):
+            message = Message.objects.create(subject=f"Тема {i}", letter_body="Текст", owner=self.user)
+            mailing = MailingList.objects.create(
+                start_time=now - timedelta(days=1),
+                end_time=now + timedelta(days=1),
+                status="started",
+                message=message,
+                owner=self.user,
+            )
+            recipient = Recipient.objects.create(
+                email=f"recipient{Recipient.objects.count()}@example.com", full_name=f"Получатель {i}", owner=self.user
+            )
+            mailing.recipients.add(recipient)
+            Attempt.objects.create(result="successful", mailing_list=mailing)
+
+    # Проверка фиксированного числа запросов при малом и большом числе строк
+    def assert_page_queries(self, url_name, expected):
+        for count in (2, 8):
+            self.create_mailings(count)
+            cache.clear()
+            with self.assertNumQueries(expected):
+                response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+
+    def test_mailinglist_list_queries(self):
+        self.assert_page_queries("mailings:mailinglist_list", 6)
+
+    def test_attempt_list_queries(self):
+        self.assert_page_queries("mailings:attempt_list", 6)
+
+    def test_recipient_list_queries(self):
+        self.assert_page_queries("mailings:recipient_list", 6)
+
+    def test_home_page_queries(self):
+        self.assert_page_queries("home", 6)
+
+    def test_home_page_counters(self):
+        self.create_mailings(3)
+        call_command("send_mailing", stdout=StringIO())
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["total_mailings"], 3)
+        self.assertEqual(response.context["active_mailings"], 3)
+        self.assertEqual(response.context["unique_recipients"], 3)
+        # По одной попытке создано вручную и по одной записано отправкой
+        self.assertEqual(response.context["total_attempts"], 6)
+        self.assertEqual(response.context["success_attempts"], 6)
+
+    def test_home_page_counters_follow_changes(self):
+        self.create_mailings(2)
+        first, second = Attempt.objects.order_by("id")
+        first.result = "failed"
+        first.save()
+        self.assertEqual(get_dashboard_stats(self.user)["failed_attempts"], 1)
+        self.client.post(reverse("mailings:attempt_delete", args=[first.pk]))
+        stats = get_dashboard_stats(self.user)
+        self.assertEqual((stats["total_attempts"], stats["success_attempts"], stats["failed_attempts"]), (1, 1, 0))
+        # Свёрнутая в сводку попытка остаётся в счётчиках, пока не удалена её рассылка
+        Attempt.objects.filter(pk=second.pk).update(attempt_time=timezone.now() - timedelta(days=400))
+        prune_attempts(keep_months=6)
+        self.assertEqual(get_dashboard_stats(self.user)["total_attempts"], 1)
+        second.mailing_list.delete()
+        stats = get_dashboard_stats(self.user)
+        self.assertEqual((stats["total_attempts"], stats["success_attempts"], stats["failed_attempts"]), (0, 0, 0))
+
+    def test_deletion_does_not_create_counters(self):
+        self.create_mailings(2)
+        # У владельца нет строки счётчиков (например, удалена вручную): удаление попытки её не создаёт
+        MailingStats.objects.all().delete()
+        Attempt.objects.first().delete()
+        self.assertFalse(MailingStats.objects.exists())
+        # Каскадное удаление владельца вместе с рассылками не оставляет строк счётчиков
+        Attempt.objects.create(result="successful", mailing_list=MailingList.objects.first())
+        self.user.delete()
+        self.assertFalse(MailingStats.objects.exists())
+
+    # Количество запросов одного запуска send_mailing
+    def count_send_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_command("send_mailing", stdout=StringIO())
+        return len(queries)
+
+    def test_send_mailing_queries_per_mailing(self):
+        self.create_mailings(2)
+        small = self.count_send_queries()
+        self.create_mailings(6)
+        large = self.count_send_queries()
+        # Запуск, чтение получателей и запись журнала — фиксированное число запросов на рассылку
+        self.assertEqual((large - small) / 6, 13)
+
+    def test_send_mailing_queries_do_not_grow_with_recipients(self):
+        self.create_mailings(1)
+        mailing = MailingList.objects.get()
+        small = self.count_send_queries()
+        mailing.recipients.add(
+            *Recipient.objects.bulk_create(
+                Recipient(email=f"extra{i}@example.com", full_name=f"Доп. {i}", owner=self.user) for i in range(20)
+            )
+        )
+        self.assertEqual(self.count_send_queries(), small)
+
+
+# =================== Кеширование списков ============================================================================
+class CachedListTestCase(TestCase):
+    """Кеш списков разделён по пользователям и сбрасывается при изменении данных"""
+
+    def setUp(self):
+        cache.clear()
+        self.first = CustomUser.objects.create(email="first@example.com")
+        self.second = CustomUser.objects.create(email="second@example.com")
+        Recipient.objects.create(email="a@example.com", full_name="Первый получатель", owner=self.first)
+        Recipient.objects.create(email="b@example.com", full_name="Второй получатель", owner=self.second)
+
+    # Имена получателей на странице списка от имени пользователя
+    def get_names(self, user):
+        self.client.force_login(user)
+        response = self.client.get(reverse("mailings:recipient_list"))
+        return [recipient.full_name for recipient in response.context["object_list"]]
+
+    def test_cache_is_per_user(self):
+        self.assertEqual(self.get_names(self.first), ["Первый получатель"])
+        self.assertEqual(self.get_names(self.second), ["Второй получатель"])
+
+    def test_cache_is_invalidated_on_save(self):
+        self.assertEqual(self.get_names(self.first), ["Первый получатель"])
+        Recipient.objects.create(email="c@example.com", full_name="Новый получатель", owner=self.first)
+        self.assertEqual(self.get_names(self.first), ["Новый получатель", "Первый получатель"])
+
+    def test_login_keeps_user_cache(self):
+        versions = get_model_versions([CustomUser])
+        self.first.set_password("secret")
+        self.first.save()
+        self.assertNotEqual(get_model_versions([CustomUser]), versions)
+        versions = get_model_versions([CustomUser])
+        self.assertTrue(self.client.login(email="first@example.com", password="secret"))
+        self.assertEqual(get_model_versions([CustomUser]), versions)
+
+
+# =================== Постраничный вывод по курсору ==================================================================
+class KeysetPaginationTestCase(TestCase):
+    """Переход по страницам вперёд и назад по курсорам"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        self.client.force_login(self.user)
+        Recipient.objects.bulk_create(
+            Recipient(email=f"r{i}@example.com", full_name=f"Получатель {i:02}", owner=self.user) for i in range(25)
+        )
+
+    # Имена получателей и курсоры страницы
+    def get_page(self, **params):
+        response = self.client.get(reverse("mailings:recipient_list"), params)
+        names = [recipient.full_name for recipient in response.context["object_list"]]
+        return names, response.context["previous_cursor"], response.context["next_cursor"]
+
+    def test_forward_and_backward(self):
+        first, previous_cursor, next_cursor = self.get_page()
+        self.assertEqual(first, [f"Получатель {i:02}" for i in range(20)])
+        self.assertIsNone(previous_cursor)
+
+        second, previous_cursor, next_cursor = self.get_page(after=next_cursor)
+        self.assertEqual(second, [f"Получатель {i:02}" for i in range(20, 25)])
+        self.assertIsNone(next_cursor)
+
+        back, previous_cursor, next_cursor = self.get_page(before=previous_cursor)
+        self.assertEqual(back, first)
+        self.assertIsNone(previous_cursor)
+        self.assertIsNotNone(next_cursor)
+
+    def test_invalid_cursor_shows_first_page(self):
+        names, _, _ = self.get_page(after="not-a-cursor")
+        self.assertEqual(len(names), 20)
+
+    def test_wrongly_typed_cursor_shows_first_page(self):
+        # Правильный base64 и JSON, но значения не приводятся к типам полей keyset
+        cursor = base64.urlsafe_b64encode(b'["abc", "x"]').decode()
+        names, _, _ = self.get_page(after=cursor)
+        self.assertEqual(len(names), 20)
+        self.assertEqual(self.client.get(reverse("mailings:attempt_list"), {"after": cursor}).status_code, 200)
+
+
+# =================== Хранение попыток: сводки и очистка =============================================================
+class PruneAttemptsTestCase(TestCase):
+    """Старые попытки сворачиваются в дневные сводки и удаляются, свежие остаются"""
+
+    def setUp(self):
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        now = timezone.now()
+        self.mailing = MailingList.objects.create(start_time=now, end_time=now, message=message, owner=user)
+
+    # Создание попытки с заданным временем (attempt_time заполняется автоматически при создании)
+    def create_attempt(self, attempt_time, result="successful", server_response=None):
+        attempt = Attempt.objects.create(result=result, server_response=server_response, mailing_list=self.mailing)
+        Attempt.objects.filter(pk=attempt.pk).update(attempt_time=attempt_time)
+
+    def test_old_attempts_are_rolled_up_and_deleted(self):
+        old = timezone.now() - timedelta(days=400)
+        self.create_attempt(old)
+        self.create_attempt(old, "failed", "550 No such user")
+        self.create_attempt(old, "failed", "550 No such user")
+        self.create_attempt(old, "failed", "421 Try again later")
+        self.create_attempt(timezone.now())
+
+        call_command("prune_attempts", keep_months=6, stdout=StringIO())
+
+        self.assertEqual(Attempt.objects.count(), 1)
+        rollup = AttemptDailyRollup.objects.get()
+        self.assertEqual((rollup.mailing_list, rollup.successful, rollup.failed), (self.mailing, 1, 3))
+        self.assertEqual(rollup.top_errors[0], {"error": "550 No such user", "count": 2})
+
+        # Повторный запуск ничего не меняет
+        call_command("prune_attempts", keep_months=6, stdout=StringIO())
+        self.assertEqual(AttemptDailyRollup.objects.count(), 1)
+        self.assertEqual(Attempt.objects.count(), 1)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Секционирование таблицы попыток есть только в PostgreSQL")
+class AttemptPartitionsTestCase(TestCase):
+    """Миграция секционирует таблицу попыток по месяцам, очистка удаляет старые секции целиком"""
+
+    def setUp(self):
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        now = timezone.now()
+        self.mailing = MailingList.objects.create(start_time=now, end_time=now, message=message, owner=user)
+        self.current = month_start(timezone.now().astimezone(dt_timezone.utc))
+
+    def create_attempt(self, attempt_time):
+        attempt = Attempt.objects.create(result="successful", mailing_list=self.mailing)
+        Attempt.objects.filter(pk=attempt.pk).update(attempt_time=attempt_time)
+        return attempt
+
+    # Имя секции, в которой лежит попытка
+    def get_partition(self, attempt):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {ATTEMPT_TABLE} WHERE id = %s", [attempt.pk])
+            return cursor.fetchone()[0]
+
+    def test_migration_partitions_table(self):
+        self.assertTrue(is_partitioned(connection))
+        months = list_partition_months(connection)
+        self.assertIn(self.current, months)
+        self.assertIn(add_months(self.current, 2), months)
+        attempt = self.create_attempt(timezone.now())
+        self.assertEqual(self.get_partition(attempt), partition_name(self.current))
+
+    def test_ensure_partitions_moves_default_rows(self):
+        month = add_months(self.current, 12)
+        attempt = self.create_attempt(month_bound(month) + timedelta(days=1))
+        self.assertEqual(self.get_partition(attempt), DEFAULT_PARTITION)
+        self.assertEqual(ensure_partitions(connection, month, month), [month])
+        self.assertEqual(self.get_partition(attempt), partition_name(month))
+        self.assertEqual(ensure_partitions(connection, month, month), [])
+
+    def test_prune_drops_old_partitions(self):
+        old_month = add_months(self.current, -12)
+        ensure_partitions(connection, old_month, old_month)
+        self.create_attempt(month_bound(old_month) + timedelta(days=1))
+        fresh = self.create_attempt(timezone.now())
+
+        summary = prune_attempts(keep_months=6, months_ahead=3)
+
+        self.assertEqual(summary["dropped_partitions"], [old_month])
+        self.assertEqual(summary["created_partitions"], [add_months(self.current, 3)])
+        self.assertNotIn(old_month, list_partition_months(connection))
+        self.assertEqual(list(Attempt.objects.values_list("id", flat=True)), [fresh.pk])
+        self.assertEqual(AttemptDailyRollup.objects.get().successful, 1)
+
+
+# =================== Импорт получателей из файла ====================================================================
+class RecipientImportTestCase(TestCase):
+    """Пакетный импорт: новые адреса создаются, дубликаты и ошибки пропускаются, получатели попадают в рассылку"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        other = CustomUser.objects.create(email="other@example.com")
+        Recipient.objects.create(email="known@example.com", full_name="Уже есть", owner=self.user)
+        Recipient.objects.create(email="foreign@example.com", full_name="Чужой", owner=other)
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        now = timezone.now()
+        self.mailing = MailingList.objects.create(start_time=now, end_time=now, message=message, owner=self.user)
+
+    def test_import_csv(self):
+        rows = ["email;Ф.И.О.;комментарий", "known@example.com;Уже есть;", "foreign@example.com;Чужой;"]
+        rows += [f"new{i}@example.com;Новый {i};из файла" for i in range(5)]
+        rows += ["NEW0@Example.com;Повтор;", "not-an-email;Ошибка;"]
+        upload = SimpleUploadedFile("recipients.csv", "\n".join(rows).encode())
+
+        stats = import_recipients(upload, upload.name, self.user, self.mailing, batch_size=3)
+
+        self.assertEqual(stats["rows"], 9)
+        # Адрес другого пользователя добавляется как собственный получатель; повтор new0 в другом регистре
+        # попал в следующий пакет и считается уже существующим
+        self.assertEqual((stats["created"], stats["existing"]), (6, 2))
+        self.assertEqual(stats["invalid"], 1)
+        self.assertEqual(Recipient.objects.filter(owner=self.user).count(), 7)
+        self.assertEqual(Recipient.objects.filter(email="foreign@example.com").count(), 2)
+        self.assertEqual(Recipient.objects.get(email="new1@example.com").comment, "из файла")
+        self.assertEqual(self.mailing.recipients.count(), 7)
+
+    def test_upload_view(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile("recipients.csv", b"first@example.com,First\nsecond@example.com,Second\n")
+        response = self.client.post(reverse("mailings:recipient_import"), {"file": upload})
+        self.assertRedirects(response, reverse("mailings:recipient_list"))
+        response = self.client.get(reverse("mailings:recipient_list"))
+        self.assertEqual(
+            [recipient.full_name for recipient in response.context["object_list"]], ["First", "Second", "Уже есть"]
+        )
+
+
+# =================== Потоковая выгрузка =============================================================================
+class ExportTestCase(TestCase):
+    """Выгрузка отдаётся потоком, содержит только данные пользователя и учитывает фильтры"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        other = CustomUser.objects.create(email="other@example.com")
+        self.client.force_login(self.user)
+        Recipient.objects.create(email="mine@example.com", full_name="Мой", owner=self.user)
+        Recipient.objects.create(email="theirs@example.com", full_name="Чужой", owner=other)
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        now = timezone.now()
+        self.mailings = [
+            MailingList.objects.create(start_time=now, end_time=now, message=message, owner=self.user)
+            for _ in range(2)
+        ]
+        for mailing in self.mailings:
+            Attempt.objects.create(result="successful", mailing_list=mailing)
+        old = Attempt.objects.create(result="failed", server_response="550", mailing_list=self.mailings[0])
+        Attempt.objects.filter(pk=old.pk).update(attempt_time=now - timedelta(days=30))
+
+    def get_content(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8-sig")
+
+    def test_recipient_csv(self):
+        lines = self.get_content("mailings:recipient_export").splitlines()
+        self.assertEqual(lines[0], "id,email,full_name,comment")
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["mine@example.com"])
+
+    def test_attempt_filters(self):
+        rows = self.get_content("mailings:attempt_export", format="ndjson").splitlines()
+        self.assertEqual(len(rows), 3)
+        today = timezone.localdate().isoformat()
+        rows = self.get_content(
+            "mailings:attempt_export", format="ndjson", mailing=self.mailings[0].pk, date_from=today, date_to=today
+        ).splitlines()
+        self.assertEqual([json.loads(row)["mailing_list"] for row in rows], [self.mailings[0].pk])
+
+    def test_attempt_bad_date(self):
+        response = self.client.get(reverse("mailings:attempt_export"), {"date_from": "вчера"})
+        self.assertEqual(response.status_code, 400)
+
+
+# =================== Ограничение скорости отправки ==================================================================
+@mock.patch("mailings.throttling.time.time", return_value=1_000_000.25)
+@mock.patch("mailings.throttling.time.monotonic", return_value=500.0)
+class ThrottleTestCase(TestCase):
+    """Лимиты писем в секунду и SMTP-сессий общие для всех процессов, разделяющих кеш"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rate_limit_is_shared(self, *mocks):
+        first = RateLimit("host:smtp.test", rate=5, burst=5)
+        second = RateLimit("host:smtp.test", rate=5, burst=5)
+        self.assertEqual([first.reserve() for _ in range(3)], [0, 0, 0])
+        self.assertEqual([second.reserve() for _ in range(2)], [0, 0])
+        # Пять писем этой секунды уже отправлены двумя «процессами» вместе
+        self.assertAlmostEqual(second.reserve(), 0.75)
+
+    def test_fractional_rate(self, *mocks):
+        # Одно письмо в 2 секунды: окно из двух секунд с одним письмом
+        limit = RateLimit("host:smtp.test", rate=0.5)
+        self.assertEqual(limit.reserve(), 0)
+        # Токен процесса появится через 2 секунды
+        self.assertAlmostEqual(limit.reserve(), 2.0)
+        # Другой процесс упирается в общий счётчик окна [1000000, 1000002)
+        other = RateLimit("host:smtp.test", rate=0.5)
+        self.assertAlmostEqual(other.reserve(), 1.75)
+        with mock.patch("mailings.throttling.time.time", return_value=1_000_002.0):
+            self.assertEqual(other.reserve(), 0)
+
+    def test_host_limit_refunds_owner_token(self, *mocks):
+        throttle = Throttle("smtp.test", host_rate=1, owner_rate=10, connections=0)
+        owner_bucket = throttle.get_owner_limit(1).bucket
+        owner_bucket.capacity = owner_bucket.tokens = 10
+        self.assertEqual(throttle.reserve(owner_id=1), 0)
+        self.assertGreater(throttle.reserve(owner_id=1), 0)
+        # Второе письмо не ушло из-за лимита сервера: токен и счётчик владельца возвращены
+        self.assertEqual(owner_bucket.tokens, 9)
+        self.assertEqual(cache.get("throttle:owner:1:1000000"), 1)
+
+    def test_owner_limit_is_per_owner(self, *mocks):
+        throttle = Throttle("smtp.test", host_rate=10, owner_rate=2, connections=0)
+        throttle.host_limit.bucket.capacity = throttle.host_limit.bucket.tokens = 10
+        throttle.get_owner_limit(1).bucket.capacity = throttle.get_owner_limit(1).bucket.tokens = 2
+        self.assertEqual([throttle.reserve(owner_id=1) for _ in range(2)], [0, 0])
+        self.assertGreater(throttle.reserve(owner_id=1), 0)
+        # Письма другого владельца не ждут
+        self.assertEqual(throttle.reserve(owner_id=2), 0)
+        self.assertEqual(cache.get("throttle:host:smtp.test:1000000"), 3)
+
+    def test_connection_slots(self, *mocks):
+        first = ConnectionSlots("host:smtp.test", limit=3)
+        second = ConnectionSlots("host:smtp.test", limit=3)
+        self.assertEqual(first.acquire(2), 2)
+        self.assertEqual(second.acquire(5), 1)
+        first.release()
+        self.assertEqual(cache.get("throttle:host:smtp.test:connections"), 1)
+
+
+# =================== Повторная отправка после временных ошибок ======================================================
+class FakeSender:
+    """Движок отправки для тестов: ошибки задаются по адресу получателя"""
+
+    batch_size = 100
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    def send_batch(self, messages, owner_id=None):
+        self.sent += [message.to[0] for message in messages]
+        return [self.errors.get(message.to[0]) for message in messages]
+
+
+class RetryTestCase(TestCase):
+    """Временные ошибки ставят получателя в очередь повторов, постоянные — нет"""
+
+    def setUp(self):
+        suppression_list.clear()
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        now = timezone.now()
+        self.mailing = MailingList.objects.create(
+            start_time=now, end_time=now + timedelta(days=1), status="started", message=message, owner=user
+        )
+        for name in ("ok", "busy", "unknown"):
+            self.mailing.recipients.add(
+                Recipient.objects.create(email=f"{name}@example.com", full_name=name, owner=user)
+            )
+
+    def test_error_classification(self):
+        self.assertTrue(is_temporary_error(smtplib.SMTPDataError(451, b"Try again later")))
+        self.assertTrue(is_temporary_error(smtplib.SMTPServerDisconnected("Connection lost")))
+        self.assertTrue(is_temporary_error(smtplib.SMTPRecipientsRefused({"a@example.com": (452, b"Mailbox full")})))
+        self.assertFalse(is_temporary_error(smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")})))
+        self.assertFalse(is_temporary_error(ValueError("Bad header")))
+        self.assertIsNone(get_next_retry_at(settings.MAILING_MAX_ATTEMPTS))
+
+    def test_temporary_failure_is_retried(self):
+        sender = FakeSender(
+            {
+                "busy@example.com": smtplib.SMTPDataError(451, b"Try again later"),
+                "unknown@example.com": smtplib.SMTPRecipientsRefused({"unknown@example.com": (550, b"No such user")}),
+            }
+        )
+        with AttemptRecorder() as recorder:
+            deliver_mailinglist(self.mailing, sender, recorder)
+        busy = Delivery.objects.get(recipient__email="busy@example.com")
+        self.assertIsNotNone(busy.next_retry_at)
+        self.assertIsNone(Delivery.objects.get(recipient__email="unknown@example.com").next_retry_at)
+
+        # Срок повтора ещё не наступил
+        self.assertEqual(claim_retries(10), [])
+        Delivery.objects.filter(pk=busy.pk).update(next_retry_at=timezone.now())
+        sender = FakeSender()
+        with AttemptRecorder() as recorder:
+            self.assertEqual(retry_deliveries(claim_retries(10), sender, recorder), (1, 0))
+        self.assertEqual(sender.sent, ["busy@example.com"])
+        busy.refresh_from_db()
+        self.assertEqual((busy.result, busy.attempts, busy.next_retry_at), ("successful", 2, None))
+        self.assertEqual(Attempt.objects.filter(mailing_list=self.mailing).count(), 4)
+
+
+# =================== Планировщик рассылок ===========================================================================
+class MailingSchedulerTestCase(TestCase):
+    """Статусы рассылок меняются по наступлении start_time/end_time, запуск ставит задачу отправки"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        self.message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        self.now = timezone.now()
+
+    def create_mailing(self, start, end, status="created"):
+        return MailingList.objects.create(
+            start_time=self.now + timedelta(minutes=start),
+            end_time=self.now + timedelta(minutes=end),
+            status=status,
+            message=self.message,
+            owner=self.user,
+        )
+
+    def get_status(self, mailing):
+        mailing.refresh_from_db()
+        return mailing.status
+
+    def test_transitions(self):
+        due = self.create_mailing(-5, 60)
+        later = self.create_mailing(30, 60)
+        expired = self.create_mailing(-60, -5, status="started")
+        missed = self.create_mailing(-60, -5)
+        scheduler = MailingScheduler(horizon=3600, poll_interval=5)
+
+        self.assertEqual(scheduler.run_due(self.now), 3)
+        self.assertEqual(
+            [self.get_status(mailing) for mailing in (due, later, expired, missed)],
+            ["started", "created", "completed", "completed"],
+        )
+        self.assertEqual(list(SendJob.objects.values_list("mailing_list_id", flat=True)), [due.pk])
+        # Ближайшее событие через 30 минут, но изменения проверяются каждые 5 секунд
+        self.assertEqual(scheduler.get_sleep(self.now), 5)
+
+        self.assertEqual(scheduler.run_due(self.now + timedelta(minutes=31)), 1)
+        self.assertEqual(self.get_status(later), "started")
+        self.assertEqual(scheduler.run_due(self.now + timedelta(minutes=61)), 2)
+        self.assertEqual([self.get_status(mailing) for mailing in (due, later)], ["completed", "completed"])
+
+    def test_reload_on_change(self):
+        scheduler = MailingScheduler(horizon=3600)
+        self.assertEqual(scheduler.run_due(self.now), 0)
+        # Новая рассылка сбрасывает версию MailingList в кеше, и планировщик перечитывает окно
+        mailing = self.create_mailing(-1, 60)
+        self.assertEqual(scheduler.run_due(self.now), 1)
+        self.assertEqual(self.get_status(mailing), "started")
+
+    def test_mailing_without_end_time(self):
+        mailing = self.create_mailing(-5, 60)
+        MailingList.objects.filter(pk=mailing.pk).update(end_time=None)
+        mailing.recipients.add(Recipient.objects.create(email="r@example.com", full_name="Р", owner=self.user))
+        self.assertEqual(MailingScheduler(horizon=3600).run_due(self.now), 1)
+        job = claim_job()
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(len(mail.outbox), 1)
+        # Отправка в процессе планировщика
+        inline = self.create_mailing(-5, 60)
+        MailingList.objects.filter(pk=inline.pk).update(end_time=None)
+        inline.recipients.add(Recipient.objects.create(email="i@example.com", full_name="И", owner=self.user))
+        self.assertEqual(MailingScheduler(horizon=3600, inline=True).run_due(self.now), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_error_does_not_stop_scheduler(self):
+        broken = self.create_mailing(-10, 60)
+        due = self.create_mailing(-5, 60)
+        scheduler = MailingScheduler(horizon=3600, inline=True)
+        with (
+            mock.patch(
+                "mailings.scheduler.send_mailinglist", side_effect=[RuntimeError("Сбой отправки"), None]
+            ) as send,
+            self.assertLogs("mailings.scheduler", "ERROR"),
+        ):
+            scheduler.run_due(self.now)
+        self.assertEqual([call.args[0] for call in send.call_args_list], [broken.pk, due.pk])
+        self.assertEqual([self.get_status(mailing) for mailing in (broken, due)], ["started", "started"])
+
+
+# =================== Персонализация писем и отписка =================================================================
+class RenderingTestCase(TestCase):
+    """Подстановка значений получателя в текст и HTML, ссылка отписки работает"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        self.message = Message.objects.create(
+            subject="Новости для {{ full_name }}",
+            letter_body="Здравствуйте, {{ full_name }}! Отписаться: {{ unsubscribe_url }}",
+            html_body="<p>Здравствуйте, {{ full_name }}!</p>",
+            owner=self.user,
+        )
+        now = timezone.now()
+        self.mailing = MailingList.objects.create(start_time=now, end_time=now, message=self.message, owner=self.user)
+        self.recipient = Recipient.objects.create(email="r@example.com", full_name="Иван <Иванов>", owner=self.user)
+        self.mailing.recipients.add(self.recipient)
+
+    def test_render(self):
+        email = build_message(self.mailing, self.recipient)
+        self.assertEqual(email.subject, "Новости для Иван <Иванов>")
+        self.assertTrue(email.body.startswith("Здравствуйте, Иван <Иванов>! Отписаться: http"))
+        self.assertEqual(email.alternatives[0][0], "<p>Здравствуйте, Иван &lt;Иванов&gt;!</p>")
+        self.assertIn("/mailings/unsubscribe/", email.extra_headers["List-Unsubscribe"])
+
+    def test_template_tags(self):
+        template = CompiledTemplate("{% if full_name %}Привет, {{ full_name|upper }}{% endif %}")
+        self.assertEqual(template.render({"full_name": "Иван"}), "Привет, ИВАН")
+
+    def test_compiled_once_per_version(self):
+        first = get_renderer(self.message)
+        self.assertIs(get_renderer(Message.objects.get(pk=self.message.pk)), first)
+        self.message.letter_body = "Новый текст"
+        self.message.save()
+        self.assertIsNot(get_renderer(self.message), first)
+
+    def test_unsubscribe(self):
+        suppression_list.clear()
+        url = build_message(self.mailing, self.recipient).body.split("Отписаться: ")[1]
+        path = url.removeprefix(settings.MAILING_SITE_URL)
+        self.assertEqual(self.client.get(path).status_code, 200)
+        self.assertEqual(self.mailing.recipients.count(), 1)
+        self.assertEqual(self.client.post(path).status_code, 200)
+        self.assertEqual(self.mailing.recipients.count(), 0)
+        self.assertEqual(suppression_list.get("R@example.com", self.user.pk), "unsubscribe")
+        self.assertIsNone(suppression_list.get("r@example.com", self.user.pk + 1))
+        self.assertEqual(self.client.post(path.replace("-", "-9")).status_code, 404)
+
+    def test_template_checked_on_save(self):
+        self.client.force_login(self.user)
+        data = {"subject": "Акция", "letter_body": "Скидка {% 50 %}", "html_body": ""}
+        response = self.client.post(reverse("mailings:message_create"), data)
+        self.assertIn("letter_body", response.context["form"].errors)
+        response = self.client.post(reverse("mailings:message_edit", args=[self.message.pk]), data)
+        self.assertIn("letter_body", response.context["form"].errors)
+        self.message.refresh_from_db()
+        self.assertNotEqual(self.message.letter_body, "Скидка {% 50 %}")
+
+    def test_legacy_message_is_literal(self):
+        self.message.is_template = False
+        self.message.letter_body = "Цены {{ от 100 }} {% 50 %}"
+        self.message.save()
+        self.assertEqual(build_message(self.mailing, self.recipient).body, "Цены {{ от 100 }} {% 50 %}")
+        # Старое сообщение редактируется без проверки шаблона
+        self.client.force_login(self.user)
+        data = {"subject": "Тема", "letter_body": "Скидка {% 50 %}", "html_body": ""}
+        response = self.client.post(reverse("mailings:message_edit", args=[self.message.pk]), data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_bad_template_does_not_stop_run(self):
+        broken = Message.objects.create(subject="Акция", letter_body="Скидка {% 50 %}", owner=self.user)
+        now = timezone.now()
+        bad = MailingList.objects.create(
+            start_time=now, end_time=now + timedelta(days=1), status="started", message=broken, owner=self.user
+        )
+        bad.recipients.add(self.recipient)
+        MailingList.objects.filter(pk=self.mailing.pk).update(status="started", end_time=now + timedelta(days=1))
+        for workers in ("1", "2"):
+            mail.outbox = []
+            MailingRun.objects.all().delete()
+            Attempt.objects.all().delete()
+            call_command("send_mailing", "--workers", workers, stdout=StringIO())
+            self.assertEqual([email.to for email in mail.outbox], [["r@example.com"]])
+            failed = Attempt.objects.get(mailing_list=bad)
+            self.assertEqual(failed.result, "failed")
+            self.assertIn("Ошибка в шаблоне сообщения", failed.server_response)
+            self.assertFalse(MailingRun.objects.filter(mailing_list=bad).exists())
+
+
+# =================== Метрики отправки ===============================================================================
+class MetricsTestCase(TestCase):
+    """Отправка пишет счётчики и гистограммы этапов, /metrics отдаёт их в формате Prometheus"""
+
+    def setUp(self):
+        # Несброшенные метрики других тестов не должны попасть в кеш этого теста
+        metrics.registry.flush()
+        cache.clear()
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        mailing = MailingList.objects.create(start_time=timezone.now(), status="started", message=message, owner=user)
+        mailing.recipients.add(Recipient.objects.create(email="r@example.com", full_name="Р", owner=user))
+
+    def test_metrics_endpoint(self):
+        call_command("send_mailing", stdout=StringIO())
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('mailing_attempts_total{result="successful"} 1', body)
+        self.assertIn('mailing_smtp_send_seconds_bucket{le="+Inf"} 1', body)
+        self.assertIn("mailing_smtp_send_seconds_count 1", body)
+        self.assertIn("# TYPE mailing_render_seconds histogram", body)
+        self.assertIn("mailing_send_jobs_queued 0", body)
+
+    def test_metrics_token(self):
+        with mock.patch.object(settings, "MAILING_METRICS_TOKEN", "secret"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+            self.assertEqual(response.status_code, 200)
+
+
+# =================== Набор замеров производительности ===============================================================
+class BenchmarkSuiteTestCase(TestCase):
+    """seed_load_data наполняет базу, run_benchmarks выдаёт JSON со всеми замерами"""
+
+    def test_run_benchmarks(self):
+        out = StringIO()
+        call_command("seed_load_data", users=2, recipients=20, mailings=4, attempts=50, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["users"], 2)
+        out = StringIO()
+        call_command("run_benchmarks", send_recipients=30, repeat=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["send"]["sent"], 30)
+        self.assertEqual(result["send"]["received"], 30)
+        self.assertEqual(result["dataset"]["mailings"], 4)
+        self.assertEqual(result["dashboard"]["queries"], 2)
+        self.assertEqual({view["status"] for view in result["views"].values()}, {200})
+        # Данные замера отправки не остаются в базе
+        self.assertFalse(CustomUser.objects.filter(email__startswith="bench-send-").exists())
+        self.assertEqual(MailingList.objects.count(), 4)
+
+
+# =================== Дубли получателей ==============================================================================
+class RecipientDedupTestCase(TestCase):
+    """Адреса сравниваются без учёта регистра: дубли не создаются, письмо на адрес уходит один раз"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        self.other = CustomUser.objects.create(email="other@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        self.mailing = MailingList.objects.create(
+            start_time=timezone.now(), status="started", message=message, owner=self.user
+        )
+        self.recipient = Recipient.objects.create(email="Foo@Example.com", full_name="Фу", owner=self.user)
+
+    def test_unique_per_owner(self):
+        Recipient.objects.create(email="foo@example.com", full_name="Тот же адрес", owner=self.other)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Recipient.objects.create(email=" foo@example.COM", full_name="Дубль", owner=self.user)
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("mailings:recipient_create"), {"email": "FOO@example.com", "full_name": "Дубль"}
+        )
+        self.assertFormError(
+            response.context["form"], "email", "Получатель с таким адресом электронной почты уже есть."
+        )
+
+    def test_send_once_per_address(self):
+        shared = Recipient.objects.create(email="foo@example.com", full_name="Чужой", owner=self.other)
+        self.mailing.recipients.add(self.recipient, shared)
+        call_command("send_mailing", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["Foo@Example.com"])
+
+
+class RecipientMergeTestCase(TransactionTestCase):
+    """dedupe_recipients сливает дубли, оставшиеся с тех пор, когда адреса сравнивались с учётом регистра"""
+
+    def test_dedupe_command(self):
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        mailing = MailingList.objects.create(start_time=timezone.now(), message=message, owner=user)
+        recipient = Recipient.objects.create(email="Foo@Example.com", full_name="Фу", owner=user)
+        constraint = Recipient._meta.constraints[0]
+        # Дубль можно создать только без уникального индекса, как до миграции
+        # (SQLite пересоздаёт таблицу по описанию модели, поэтому ограничение убирается и из него)
+        with mock.patch.object(Recipient._meta, "constraints", []), connection.schema_editor() as editor:
+            editor.remove_constraint(Recipient, constraint)
+        try:
+            duplicate = Recipient.objects.create(email="FOO@example.com ", full_name="Дубль", owner=user)
+            mailing.recipients.add(recipient, duplicate)
+            out = StringIO()
+            call_command("dedupe_recipients", stdout=out)
+        finally:
+            with connection.schema_editor() as editor:
+                editor.add_constraint(Recipient, constraint)
+        self.assertIn("Групп дублей: 1, удалено получателей: 1", out.getvalue())
+        self.assertEqual(list(Recipient.objects.all()), [recipient])
+        self.assertEqual(list(mailing.recipients.all()), [recipient])
+
+
+# =================== Проверка доменов адресов =======================================================================
+class DomainValidationTestCase(TestCase):
+    """Один запрос к DNS на домен, нерабочие домены отсеиваются в формах, импорте и перед отправкой"""
+
+    def setUp(self):
+        cache.clear()
+        domain_validator.clear()
+        self.user = CustomUser.objects.create(email="owner@example.com")
+
+    def test_one_lookup_per_domain(self):
+        resolver = mock.Mock(side_effect=resolve_stub)
+        with mock.patch.object(domain_validator, "resolver", resolver):
+            domains = [f"{name}.example.com" for name in ("a", "b", "dead")] * 1000
+            self.assertEqual(
+                domain_validator.check_many(domains),
+                {"a.example.com": True, "b.example.com": True, "dead.example.com": False},
+            )
+            domain_validator.check_many(domains)
+            self.assertEqual(resolver.call_count, 3)
+            # Другой процесс берёт результаты из общего кеша
+            domain_validator.clear()
+            self.assertFalse(domain_validator.check("dead.example.com"))
+            self.assertEqual(resolver.call_count, 3)
+
+    def test_form_and_import(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("mailings:recipient_create"), {"email": "user@dead.example.com", "full_name": "Нет домена"}
+        )
+        self.assertFormError(response.context["form"], "email", "Домен dead.example.com не принимает почту.")
+        upload = SimpleUploadedFile("recipients.csv", b"a@mail.example.com,A\nb@dead.example.com,B\n")
+        stats = import_recipients(upload, upload.name, self.user)
+        self.assertEqual((stats["created"], stats["undeliverable"]), (1, 1))
+
+    @mock.patch.object(settings, "MAILING_FORM_DNS_TIMEOUT", 0.05)
+    def test_form_does_not_wait_for_slow_dns(self):
+        answered = threading.Event()
+
+        # DNS отвечает позже, чем форма готова ждать
+        def slow_resolver(domain):
+            answered.wait(5)
+            return False
+
+        with mock.patch.object(domain_validator, "resolver", slow_resolver):
+            self.assertEqual(validate_address("user@slow.example.com"), "user@slow.example.com")
+            answered.set()
+            # Проверка завершается в фоне, и её результат попадает в кеш
+            for _ in range(100):
+                if domain_validator.known_bad(["slow.example.com"]):
+                    break
+                time.sleep(0.01)
+            with self.assertRaisesMessage(ValidationError, "Домен slow.example.com не принимает почту."):
+                validate_address("other@slow.example.com")
+
+    def test_upload_does_not_wait_for_dns(self):
+        domain_validator.check("dead.example.com")
+        answered = threading.Event()
+        resolved = []
+
+        def slow_resolver(domain):
+            answered.wait(5)
+            resolved.append(domain)
+            return True
+
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile("recipients.csv", b"a@dead.example.com,A\nb@slow.example.com,B\n")
+        with mock.patch.object(domain_validator, "resolver", slow_resolver):
+            response = self.client.post(reverse("mailings:recipient_import"), {"file": upload})
+            # Запрос завершился, не дожидаясь DNS: отсеян только домен, уже известный кешу как нерабочий
+            self.assertEqual(resolved, [])
+            answered.set()
+            self.assertRedirects(response, reverse("mailings:recipient_list"))
+            self.assertEqual(list(Recipient.objects.values_list("email", flat=True)), ["b@slow.example.com"])
+            for _ in range(100):
+                if resolved:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(resolved, ["slow.example.com"])
+
+    def test_send_skips_known_bad_domain(self):
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        mailing = MailingList.objects.create(
+            start_time=timezone.now(), status="started", message=message, owner=self.user
+        )
+        mailing.recipients.add(
+            Recipient.objects.create(email="a@mail.example.com", full_name="А", owner=self.user),
+            Recipient.objects.create(email="b@dead.example.com", full_name="Б", owner=self.user),
+        )
+        domain_validator.check("dead.example.com")
+        call_command("send_mailing", stdout=StringIO())
+        self.assertEqual([email.to for email in mail.outbox], [["a@mail.example.com"]])
+        failed = Attempt.objects.get(result="failed")
+        self.assertEqual(failed.server_response, "Домен dead.example.com не принимает почту.")
+        self.assertIsNone(Delivery.objects.get(result="failed").next_retry_at)
+
+
+# =================== Отправка по доменам получателей ================================================================
+class RouteSender(FakeSender):
+    """Движок отправки маршрута: запоминает параметры SMTP-соединения"""
+
+    def __init__(self, batch_size=None, throttle=None, **connection_kwargs):
+        super().__init__()
+        self.connection_kwargs = connection_kwargs
+
+    def close(self):
+        pass
+
+
+class DomainSendingTestCase(TestCase):
+    """Получатели идут пачками одного домена, домены с маршрутом — через свой smart host"""
+
+    def setUp(self):
+        cache.clear()
+        domain_validator.clear()
+        user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=user)
+        self.mailing = MailingList.objects.create(
+            start_time=timezone.now(), status="started", message=message, owner=user
+        )
+        # Домены вперемешку по id
+        for i in range(6):
+            domain = ("b.example.org", "a.example.com")[i % 2]
+            self.mailing.recipients.add(
+                Recipient.objects.create(email=f"r{i}@{domain.upper()}", full_name=f"Р{i}", owner=user)
+            )
+
+    def test_batches_grouped_by_domain(self):
+        run = start_run(self.mailing)
+        batches = [[recipient.domain for recipient in batch] for batch in iter_recipient_batches(run, 2)]
+        self.assertEqual(
+            batches,
+            [["a.example.com"] * 2, ["a.example.com"], ["b.example.org"] * 2, ["b.example.org"]],
+        )
+
+    def test_recipients_read_in_keyset_pages(self):
+        run = start_run(self.mailing)
+        expected = list(Recipient.objects.order_by("domain", "id").values_list("id", "email", "full_name", "domain"))
+        # Шесть получателей порциями по четыре: два запроса с LIMIT, каждый после последней пары (домен, id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(iter_recipients(run, chunk_size=4)), expected)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all("LIMIT 4" in query["sql"] for query in queries))
+        # Продолжение с контрольной точки посреди домена
+        run.checkpoint_domain, run.checkpoint = expected[1][3], expected[1][0]
+        self.assertEqual(list(iter_recipients(run, chunk_size=2)), expected[2:])
+
+    def test_routes_and_stats(self):
+        with (
+            mock.patch.object(settings, "MAILING_DOMAIN_ROUTES", "b.example.org=relay.local:2525"),
+            mock.patch("mailings.services.get_backend_sender", RouteSender),
+        ):
+            with get_sender(batch_size=2) as sender, AttemptRecorder() as recorder:
+                self.assertEqual(deliver_mailinglist(self.mailing, sender, recorder), (6, 0))
+                routes = {route: route_sender.sent for route, route_sender in sender.senders.items()}
+        self.assertEqual(routes[None], ["r1@A.EXAMPLE.COM", "r3@A.EXAMPLE.COM", "r5@A.EXAMPLE.COM"])
+        self.assertEqual(routes[("relay.local", 2525)], ["r0@B.EXAMPLE.ORG", "r2@B.EXAMPLE.ORG", "r4@B.EXAMPLE.ORG"])
+        self.assertEqual(
+            [row[:3] for row in sender.stats.report()], [("a.example.com", 3, 0), ("b.example.org", 3, 0)]
+        )
+        run = MailingRun.objects.get(mailing_list=self.mailing)
+        self.assertEqual((run.checkpoint_domain, run.status), ("b.example.org", "completed"))
+
+    def test_send_mailing_domain_summary(self):
+        out = StringIO()
+        call_command("send_mailing", stdout=out)
+        self.assertIn("a.example.com: 3 писем, ошибок 0 (0.0%)", out.getvalue())
+
+
+# =================== Список подавления ==============================================================================
+class SuppressionTestCase(TestCase):
+    """Письма на подавленные адреса не отправляются, жёсткие отказы пополняют список подавления"""
+
+    def setUp(self):
+        cache.clear()
+        suppression_list.clear()
+        self.user = CustomUser.objects.create(email="owner@example.com")
+        message = Message.objects.create(subject="Тема", letter_body="Текст", owner=self.user)
+        self.mailing = MailingList.objects.create(
+            start_time=timezone.now(), status="started", message=message, owner=self.user
+        )
+        for name in ("ok", "gone", "left", "spam"):
+            self.mailing.recipients.add(
+                Recipient.objects.create(email=f"{name}@example.com", full_name=name, owner=self.user)
+            )
+
+    def deliver(self, sender):
+        with AttemptRecorder() as recorder:
+            return deliver_mailinglist(self.mailing, sender, recorder)
+
+    def test_suppressed_addresses_skipped(self):
+        suppress(["Gone@Example.com"], "bounce")
+        suppress(["left@example.com"], "unsubscribe", owner_id=self.user.pk)
+        other = CustomUser.objects.create(email="other@example.com")
+        suppress(["spam@example.com"], "unsubscribe", owner_id=other.pk)
+        sender = FakeSender()
+        self.assertEqual(self.deliver(sender), (2, 2))
+        self.assertEqual(sender.sent, ["ok@example.com", "spam@example.com"])
+        failed = Delivery.objects.filter(result="failed")
+        self.assertEqual(set(failed.values_list("next_retry_at", flat=True)), {None})
+        self.assertEqual(
+            set(Attempt.objects.filter(result="failed").values_list("server_response", flat=True)),
+            {
+                "Адрес gone@example.com в списке подавления: жёсткий отказ.",
+                "Адрес left@example.com в списке подавления: отписка.",
+            },
+        )
+
+    def test_hard_bounce_suppressed(self):
+        sender = FakeSender(
+            {
+                "gone@example.com": smtplib.SMTPRecipientsRefused({"gone@example.com": (550, b"5.1.1 No such user")}),
+                "spam@example.com": smtplib.SMTPRecipientsRefused({"spam@example.com": (550, b"5.7.1 Spam")}),
+                "left@example.com": smtplib.SMTPRecipientsRefused({"left@example.com": (452, b"Mailbox full")}),
+            }
+        )
+        self.assertFalse(is_hard_bounce(smtplib.SMTPSenderRefused(550, b"Sender denied", "owner@example.com")))
+        self.assertEqual(self.deliver(sender), (1, 3))
+        bounce = Suppression.objects.get()
+        self.assertEqual((bounce.email, bounce.reason, bounce.owner_id), ("gone@example.com", "bounce", None))
+        self.assertIn("No such user", bounce.detail)
+
+        # Следующий запуск не отправляет письмо на адрес с жёстким отказом
+        MailingRun.objects.update(status="completed")
+        sender = FakeSender()
+        self.deliver(sender)
+        self.assertEqual(sender.sent, ["ok@example.com", "left@example.com", "spam@example.com"])
+
+    def test_snapshot_refresh(self):
+        with mock.patch.object(settings, "MAILING_SUPPRESSION_REFRESH_INTERVAL", 0):
+            suppression_list.refresh()
+            entry = Suppression.objects.create(email="gone@example.com", reason="complaint")
+            self.assertIsNone(suppression_list.get("gone@example.com"))
+            # Новые записи дочитываются одним запросом по id
+            with self.assertNumQueries(1):
+                suppression_list.refresh()
+            self.assertEqual(suppression_list.get("gone@example.com"), "complaint")
+            # Удаление записи перечитывает снимок целиком
+            entry.delete()
+            suppression_list.refresh()
+            self.assertIsNone(suppression_list.get("gone@example.com"))
+
+    def test_suppress_addresses_command(self):
+        out = StringIO()
+        call_command(
+            "suppress_addresses", "spam@example.com", "SPAM@example.com ", "--owner", "owner@example.com", stdout=out
+        )
+        self.assertIn("Адресов в списке подавления: 1.", out.getvalue())
+        entry = Suppression.objects.get()
+        self.assertEqual((entry.email, entry.reason, entry.owner_id), ("spam@example.com", "complaint", self.user.pk))
@@ -0,0 +1,168 @@
+import asyncio
+import math
+import time
+
+from django.core.cache import cache
+
+from config import settings
+
+# Сколько секунд живёт счётчик занятых SMTP-сессий без обращений (защита от «утёкших» слотов упавших процессов)
+CONNECTION_SLOT_TIMEOUT = 300
+# Пауза перед повторной попыткой занять SMTP-сессию, сек
+CONNECTION_RETRY_DELAY = 0.1
+
+
+# Атомарное увеличение счётчика в кеше; ключ заводится, если его ещё нет (или он вытеснен)
+def _incr(key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout)
+        return 1
+
+
+def _decr(key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        pass
+
+
+class TokenBucket:
+    """Ведро токенов процесса: сглаживает отправку внутри секунды, допуская всплеск не больше burst писем"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    # Метод взятия токена: 0 — токен взят, иначе через сколько секунд появится следующий
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    # Метод возврата токена, если письмо так и не ушло
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class RateLimit:
+    """Ограничение писем в секунду, общее для всех процессов: ведро токенов процесса
+    плюс счётчик текущего окна в кеше (Redis), который не даёт процессам вместе превысить rate.
+    Окно — секунда, а при rate меньше 1 — ceil(1 / rate) секунд, чтобы в окно помещалось хотя бы одно письмо"""
+
+    def __init__(self, key, rate, burst=None):
+        self.key = f"throttle:{key}"
+        self.rate = rate
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.window_key = None
+        if rate:
+            self.window = max(1, math.ceil(1 / rate))
+            # Писем на окно: округление вниз, чтобы не превысить rate (при окне ceil(1 / rate) это не меньше 1)
+            self.budget = math.floor(rate * self.window)
+
+    # Метод взятия разрешения на одно письмо: 0 — можно отправлять, иначе через сколько секунд повторить
+    def reserve(self):
+        if not self.rate:
+            return 0.0
+        delay = self.bucket.reserve()
+        if delay:
+            return delay
+        now = time.time()
+        window = int(now // self.window)
+        self.window_key = f"{self.key}:{window}"
+        if _incr(self.window_key, self.window + 1) <= self.budget:
+            return 0.0
+        self.bucket.refund()
+        return (window + 1) * self.window - now
+
+    # Метод возврата разрешения, если письмо так и не ушло (например, сработал другой лимит)
+    def refund(self):
+        if self.rate and self.window_key:
+            self.bucket.refund()
+            _decr(self.window_key)
+
+
+class ConnectionSlots:
+    """Ограничение одновременно открытых SMTP-сессий на сервер, общее для всех процессов (счётчик в кеше)"""
+
+    def __init__(self, key, limit):
+        self.key = f"throttle:{key}:connections"
+        self.limit = limit
+        self.held = 0
+
+    # Метод занятия до count слотов: ждёт, пока освободится хотя бы один, возвращает число занятых
+    def acquire(self, count=1):
+        if not self.limit:
+            self.held += count
+            return count
+        acquired = 0
+        while not acquired:
+            for _ in range(count):
+                if _incr(self.key, CONNECTION_SLOT_TIMEOUT) <= self.limit:
+                    acquired += 1
+                else:
+                    _decr(self.key)
+                    break
+            if not acquired:
+                time.sleep(CONNECTION_RETRY_DELAY)
+        cache.touch(self.key, CONNECTION_SLOT_TIMEOUT)
+        self.held += acquired
+        return acquired
+
+    # Метод освобождения всех занятых слотов
+    def release(self):
+        if self.limit:
+            for _ in range(self.held):
+                _decr(self.key)
+        self.held = 0
+
+
+class Throttle:
+    """Ограничения скорости отправки: письма в секунду на SMTP-сервер и на владельца рассылки,
+    одновременные SMTP-сессии на сервер. Нулевое значение настройки снимает ограничение"""
+
+    def __init__(self, host=None, host_rate=None, owner_rate=None, connections=None):
+        self.host = host or settings.EMAIL_HOST or "default"
+        self.host_limit = RateLimit(
+            f"host:{self.host}", settings.MAILING_HOST_RATE if host_rate is None else host_rate
+        )
+        self.owner_rate = settings.MAILING_OWNER_RATE if owner_rate is None else owner_rate
+        self.owner_limits = {}
+        self.connections = ConnectionSlots(
+            f"host:{self.host}", settings.MAILING_HOST_CONNECTIONS if connections is None else connections
+        )
+
+    def get_owner_limit(self, owner_id):
+        if owner_id not in self.owner_limits:
+            self.owner_limits[owner_id] = RateLimit(f"owner:{owner_id}", self.owner_rate)
+        return self.owner_limits[owner_id]
+
+    # Метод взятия разрешения на письмо владельца: 0 — можно отправлять, иначе через сколько секунд повторить
+    def reserve(self, owner_id=None):
+        owner_limit = self.get_owner_limit(owner_id) if owner_id is not None else None
+        if owner_limit is not None:
+            delay = owner_limit.reserve()
+            if delay:
+                return delay
+        delay = self.host_limit.reserve()
+        if delay and owner_limit is not None:
+            owner_limit.refund()
+        return delay
+
+    # Ожидание разрешения на отправку письма
+    def wait(self, owner_id=None):
+        while delay := self.reserve(owner_id):
+            time.sleep(delay)
+
+    # Ожидание разрешения на отправку письма внутри цикла событий
+    async def wait_async(self, owner_id=None):
+        while delay := self.reserve(owner_id):
+            await asyncio.sleep(delay)
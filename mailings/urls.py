@@ -7,6 +7,7 @@ from .views import (
     AttemptCreateView,
     AttemptDeleteView,
     AttemptDetailView,
+    AttemptExportView,
     AttemptListView,
     AttemptUpdateView,
     MailingListCreateView,
@@ -23,8 +24,11 @@ from .views import (
     RecipientCreateView,
     RecipientDeleteView,
     RecipientDetailView,
+    RecipientExportView,
+    RecipientImportView,
     RecipientListView,
     RecipientUpdateView,
+    UnsubscribeView,
 )
 
 app_name = MailingsConfig.name
@@ -33,6 +37,8 @@ urlpatterns = [
     path("recipient/", RecipientListView.as_view(), name="recipient_list"),
     path("recipient/<int:pk>/", RecipientDetailView.as_view(), name="recipient_detail"),
     path("recipient/create/", RecipientCreateView.as_view(), name="recipient_create"),
+    path("recipient/import/", RecipientImportView.as_view(), name="recipient_import"),
+    path("recipient/export/", RecipientExportView.as_view(), name="recipient_export"),
     path("recipient/<int:pk>/edit/", RecipientUpdateView.as_view(), name="recipient_edit"),
     path("recipient/<int:pk>/delete/", RecipientDeleteView.as_view(), name="recipient_delete"),
     path("message/", MessageListView.as_view(), name="message_list"),
@@ -47,9 +53,11 @@ urlpatterns = [
     path("mailinglist/<int:pk>/edit/", MailingListUpdateView.as_view(), name="mailinglist_edit"),
     path("mailinglist/<int:pk>/delete/", MailingListDeleteView.as_view(), name="mailinglist_delete"),
     path("mailinglist/<int:pk>/cancel/", mailinglist_cancel, name="mailinglist_cancel"),
+    path("unsubscribe/<str:token>/", UnsubscribeView.as_view(), name="unsubscribe"),
     path("attempt/", AttemptListView.as_view(), name="attempt_list"),
     path("attempt/<int:pk>/", AttemptDetailView.as_view(), name="attempt_detail"),
     path("attempt/create/", AttemptCreateView.as_view(), name="attempt_create"),
+    path("attempt/export/", AttemptExportView.as_view(), name="attempt_export"),
     path("attempt/<int:pk>/edit/", AttemptUpdateView.as_view(), name="attempt_edit"),
     path("attempt/<int:pk>/delete/", AttemptDeleteView.as_view(), name="attempt_delete"),
 ]
@@ -0,0 +1,187 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import dns.exception
+import dns.resolver
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils.module_loading import import_string
+from email_validator import EmailNotValidError, validate_email
+
+from config import settings
+
+# Сколько секунд процесс помнит, что в общем кеше нет сведений о домене (проверка перед отправкой не ходит в DNS)
+UNKNOWN_TTL = 60
+
+
+class UndeliverableDomainError(ValueError):
+    """Домен адреса не принимает почту (нет MX и A/AAAA-записей, «нулевой» MX или домен не существует)"""
+
+    def __init__(self, domain):
+        super().__init__(f"Домен {domain} не принимает почту.")
+        self.domain = domain
+
+
+# Домен адреса в нижнем регистре
+def get_domain(email):
+    return email.rpartition("@")[2].strip().lower()
+
+
+# Проверка домена по DNS: True — принимает почту, False — нет, None — неизвестно (временная ошибка DNS).
+# MAILING_DNS_TIMEOUT — общий срок на все запросы проверки (MX, затем A и AAAA), а не на каждый
+def resolve_mx(domain):
+    deadline = time.monotonic() + settings.MAILING_DNS_TIMEOUT
+
+    def lifetime():
+        return max(deadline - time.monotonic(), 0)
+
+    try:
+        try:
+            answer = dns.resolver.resolve(domain, "MX", lifetime=lifetime())
+        except dns.resolver.NoAnswer:
+            # Без MX-записи почта доставляется на A/AAAA-адрес домена (RFC 5321)
+            for rdtype in ("A", "AAAA"):
+                try:
+                    dns.resolver.resolve(domain, rdtype, lifetime=lifetime())
+                    return True
+                except dns.resolver.NoAnswer:
+                    continue
+            return False
+    except dns.resolver.NXDOMAIN:
+        return False
+    except dns.exception.DNSException:
+        return None
+    # «Нулевой» MX (RFC 7505) означает, что домен явно не принимает почту
+    return any(record.exchange.to_text() != "." for record in answer)
+
+
+# Проверка без DNS-запросов: для разработки и окружений без доступа к сети
+def accept_any(domain):
+    return True
+
+
+class DomainValidator:
+    """Кеш проверки доменов: один DNS-запрос на домен, а не на адрес. Результаты хранятся в общем кеше
+    (Redis) с TTL — MAILING_DOMAIN_CACHE_TTL для рабочих доменов и MAILING_DOMAIN_FAILURE_TTL для нерабочих —
+    и дублируются в памяти процесса. Временные ошибки DNS не кешируются. Функция проверки задаётся
+    настройкой MAILING_DOMAIN_RESOLVER (путь к функции domain -> True / False / None)"""
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver
+        self.local = {}
+        self.lock = threading.Lock()
+        # Потоки фоновых проверок, не уложившихся в срок ожидания (создаются при первой такой проверке)
+        self.executor = None
+
+    def get_resolver(self):
+        return self.resolver or import_string(settings.MAILING_DOMAIN_RESOLVER)
+
+    @staticmethod
+    def cache_key(domain):
+        return f"maildomain:{domain}"
+
+    # Метод сохранения результата в памяти процесса и (кроме неизвестного) в общем кеше
+    def remember(self, domain, result, shared=True):
+        if result is None:
+            ttl = UNKNOWN_TTL
+        else:
+            ttl = settings.MAILING_DOMAIN_CACHE_TTL if result else settings.MAILING_DOMAIN_FAILURE_TTL
+            if shared:
+                cache.set(self.cache_key(domain), result, ttl)
+        with self.lock:
+            self.local[domain] = (result, time.monotonic() + ttl)
+
+    # Метод чтения результатов из памяти процесса и общего кеша; возвращает (известные, не найденные).
+    # with_unknown — считать известными и домены, о которых недавно не нашлось сведений
+    def lookup(self, domains, with_unknown=False):
+        now = time.monotonic()
+        known, missing = {}, []
+        for domain in set(domains):
+            result, expires = self.local.get(domain, (None, 0))
+            if expires > now and (result is not None or with_unknown):
+                known[domain] = result
+            else:
+                missing.append(domain)
+        if missing:
+            cached = cache.get_many([self.cache_key(domain) for domain in missing])
+            for domain in list(missing):
+                result = cached.get(self.cache_key(domain))
+                if result is not None:
+                    self.remember(domain, result, shared=False)
+                    known[domain] = result
+                    missing.remove(domain)
+        return known, missing
+
+    # Метод проверки доменов: ненайденные в кеше проверяются функцией MAILING_DOMAIN_RESOLVER,
+    # несколько доменов — параллельно (запросы к DNS ждут сеть, а не процессор)
+    def check_many(self, domains):
+        known, missing = self.lookup(domains)
+        if missing:
+            resolver = self.get_resolver()
+            if len(missing) == 1:
+                results = [resolver(missing[0])]
+            else:
+                with ThreadPoolExecutor(min(settings.MAILING_DNS_CONCURRENCY, len(missing))) as executor:
+                    results = list(executor.map(resolver, missing))
+            for domain, result in zip(missing, results):
+                known[domain] = result
+                self.remember(domain, result)
+        return known
+
+    # Метод проверки одного домена. С timeout результат ждётся не дольше timeout секунд: если DNS не ответил,
+    # возвращается None (неизвестно), а проверка завершается в фоне и её результат попадает в кеш
+    def check(self, domain, timeout=None):
+        if timeout is None:
+            return self.check_many([domain])[domain]
+        known, missing = self.lookup([domain])
+        if not missing:
+            return known[domain]
+        future = self.get_executor().submit(self.check_many, [domain])
+        try:
+            return future.result(timeout)[domain]
+        except FutureTimeoutError:
+            return None
+
+    # Метод отбора нерабочих доменов по кешу, без ожидания DNS (обработка запроса веб-интерфейса): домены
+    # без сведений проверяются в фоне, и их результат попадёт в кеш к проверке перед отправкой
+    def cached_bad(self, domains):
+        known, missing = self.lookup(domains)
+        if missing:
+            self.get_executor().submit(self.check_many, missing)
+        return {domain for domain, result in known.items() if result is False}
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(settings.MAILING_DNS_CONCURRENCY)
+        return self.executor
+
+    # Метод отбора заведомо нерабочих доменов только по кешу, без DNS-запросов (проверка перед отправкой)
+    def known_bad(self, domains):
+        known, missing = self.lookup(domains, with_unknown=True)
+        for domain in missing:
+            self.remember(domain, None, shared=False)
+        return {domain for domain, result in known.items() if result is False}
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+
+
+domain_validator = DomainValidator()
+
+
+# Проверка адреса для форм: формат (email_validator без DNS-запросов) и домен через кеш проверок. DNS
+# ждётся не дольше MAILING_FORM_DNS_TIMEOUT, чтобы не задерживать запрос: без ответа адрес принимается,
+# а нерабочий домен отсеется перед отправкой по результату фоновой проверки
+def validate_address(email):
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError:
+        raise ValidationError("Неправильный формат Электронной почты.")
+    domain = get_domain(email)
+    if domain_validator.check(domain, timeout=settings.MAILING_FORM_DNS_TIMEOUT) is False:
+        raise ValidationError(f"Домен {domain} не принимает почту.")
+    return email
@@ -1,17 +1,33 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.cache import cache
-from django.http import Http404, HttpResponseRedirect
-from django.shortcuts import get_object_or_404
+from django.core import signing
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.shortcuts import get_object_or_404, render
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import DetailView, ListView, TemplateView
-from django.views.generic.edit import CreateView, DeleteView, UpdateView
+from django.views.generic.edit import CreateView, DeleteView, FormView, UpdateView
 
+from config import settings
 from users.services import get_is_manager
-from .forms import MailingListForm, MessageForm
 
-from .models import Attempt, MailingList, Message, Recipient
-from .services import send_mailinglist
+from . import metrics
+from .caching import CachedListMixin
+from .dedup import normalize_email
+from .exports import ExportView
+from .forms import MailingListForm, MessageForm, RecipientForm, RecipientImportForm
+from .imports import import_recipients
+from .models import Attempt, Delivery, MailingList, Message, Recipient, SendJob
+from .pagination import KeysetPaginationMixin
+from .rendering import parse_unsubscribe_token
+from .services import enqueue_mailinglist, get_dashboard_stats
+from .suppression import suppress
 
 
 # =================== Представление «Главная страница» ===============================================================
@@ -19,40 +35,64 @@ class HomePageView(LoginRequiredMixin, TemplateView):
     template_name = "index.html"
 
     def get_context_data(self, **kwargs):
-        owner = self.request.user
         context = super().get_context_data(**kwargs)
-        context["total_mailings"] = MailingList.objects.filter(owner=owner).count()
-        context["active_mailings"] = MailingList.objects.filter(status="started", owner=owner).count()
-        context["total_attempts"] = Attempt.objects.filter(mailing_list__owner=owner).count()
-        context["success_attempts"] = Attempt.objects.filter(result="successful", mailing_list__owner=owner).count()
-        context["failed_attempts"] = Attempt.objects.filter(result="failed", mailing_list__owner=owner).count()
-        context["unique_recipients"] = Recipient.objects.filter(owner=owner).distinct().count()
+        context.update(get_dashboard_stats(self.request.user))
         return context
 
 
+# =================== Метрики отправки ===============================================================================
+class MetricsView(View):
+    """Метрики отправки в текстовом формате Prometheus. Если задан MAILING_METRICS_TOKEN,
+    нужен заголовок Authorization: Bearer <токен>"""
+
+    def get(self, request):
+        token = settings.MAILING_METRICS_TOKEN
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=401)
+        # Очереди в базе считаются при запросе (частичные индексы делают запросы дешёвыми)
+        gauges = {
+            "mailing_send_jobs_queued": SendJob.objects.filter(status="queued").count(),
+            "mailing_retries_due": Delivery.objects.filter(next_retry_at__lte=timezone.now()).count(),
+        }
+        return HttpResponse(metrics.render_prometheus(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # =================== Представление «Получатель рассылки» ============================================================
-class RecipientListView(LoginRequiredMixin, ListView):
+class RecipientListView(LoginRequiredMixin, KeysetPaginationMixin, CachedListMixin, ListView):
     """Список получателей рассылки"""
 
     model = Recipient
     template_name = "mailings/recipient/recipient_list.html"
-
-    # Метод переопределения исходного набора данных
-    def get_queryset(self):
-        queryset = cache.get("recipient_queryset")
-        if not queryset:
-            queryset = super().get_queryset()
-            if not get_is_manager(self.request.user, "Менеджеры"):
-                queryset = queryset.filter(owner=self.request.user)
-            cache.set("recipient_queryset", queryset, 60 * 15)
+    cache_models = (Recipient,)
+    keyset = ("full_name", "id")
+
+    # Метод фильтрации исходного набора данных
+    def filter_queryset(self, queryset):
+        queryset = queryset.select_related("owner")
+        if not self.is_manager:
+            queryset = queryset.filter(owner=self.request.user)
         return queryset
 
 
-class RecipientCreateView(LoginRequiredMixin, CreateView):
+class RecipientEmailMixin:
+    """Проверка, что у владельца нет другого получателя с тем же адресом (без учёта регистра и пробелов).
+    Форма не содержит поля owner, поэтому уникальный индекс (email_normalized, owner) она сама не проверяет"""
+
+    def form_valid(self, form):
+        duplicates = Recipient.objects.filter(
+            owner=form.instance.owner, email_normalized=normalize_email(form.cleaned_data["email"])
+        ).exclude(pk=form.instance.pk)
+        if duplicates.exists():
+            form.add_error("email", "Получатель с таким адресом электронной почты уже есть.")
+            return self.form_invalid(form)
+        return super().form_valid(form)
+
+
+class RecipientCreateView(LoginRequiredMixin, RecipientEmailMixin, CreateView):
     """Создание нового получателя рассылки"""
 
     model = Recipient
-    fields = ["email", "full_name", "comment"]
+    form_class = RecipientForm
     success_url = reverse_lazy("mailings:recipient_list")
     template_name = "mailings/recipient/recipient_form.html"
 
@@ -75,11 +115,11 @@ class RecipientDetailView(LoginRequiredMixin, DetailView):
         return obj
 
 
-class RecipientUpdateView(LoginRequiredMixin, UpdateView):
+class RecipientUpdateView(LoginRequiredMixin, RecipientEmailMixin, UpdateView):
     """Обновление получателя рассылки"""
 
     model = Recipient
-    fields = ["full_name", "email", "comment"]
+    form_class = RecipientForm
     template_name = "mailings/recipient/recipient_form.html"
 
     def get_object(self, queryset=None):
@@ -107,20 +147,64 @@ class RecipientDeleteView(LoginRequiredMixin, DeleteView):
         return obj
 
 
+class RecipientImportView(LoginRequiredMixin, FormView):
+    """Импорт получателей рассылки из файла CSV или XLSX"""
+
+    form_class = RecipientImportForm
+    success_url = reverse_lazy("mailings:recipient_list")
+    template_name = "mailings/recipient/recipient_import.html"
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
+    # Метод корректности введённых данных формы
+    def form_valid(self, form):
+        file = form.cleaned_data["file"]
+        try:
+            # Запрос не ждёт DNS: домены проверяются по кешу, неизвестные — в фоне
+            stats = import_recipients(
+                file, file.name, self.request.user, form.cleaned_data["mailing_list"], resolve_domains=False
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            form.add_error("file", f"Не удалось прочитать файл: {e}")
+            return self.form_invalid(form)
+        messages.success(
+            self.request,
+            f"Обработано строк: {stats['rows']}. Добавлено получателей: {stats['created']}, "
+            f"уже были: {stats['existing']}, с ошибкой в адресе: {stats['invalid']}, "
+            f"домен не принимает почту: {stats['undeliverable']}, "
+            f"добавлено в рассылку: {stats['attached']}.",
+        )
+        return super().form_valid(form)
+
+
+class RecipientExportView(ExportView):
+    """Выгрузка получателей рассылки"""
+
+    model = Recipient
+    fields = ("id", "email", "full_name", "comment")
+    filename = "recipients"
+
+    def filter_queryset(self, queryset):
+        if not self.is_manager:
+            queryset = queryset.filter(owner=self.request.user)
+        return queryset
+
+
 # =================== Представление «Сообщение» ======================================================================
-class MessageListView(LoginRequiredMixin, ListView):
+class MessageListView(LoginRequiredMixin, KeysetPaginationMixin, CachedListMixin, ListView):
     """Список сообщений"""
 
     model = Message
     template_name = "mailings/message/message_list.html"
+    cache_models = (Message,)
+    keyset = ("subject", "id")
 
-    def get_queryset(self):
-        queryset = cache.get("message_queryset")
-        if not queryset:
-            queryset = super().get_queryset()
-            if not get_is_manager(self.request.user, "Менеджеры"):
-                queryset = queryset.filter(owner=self.request.user)
-            cache.set("message_queryset", queryset, 60 * 15)
+    def filter_queryset(self, queryset):
+        if not self.is_manager:
+            queryset = queryset.filter(owner=self.request.user)
         return queryset
 
 
@@ -150,7 +234,7 @@ class MessageUpdateView(LoginRequiredMixin, UpdateView):
     """Обновление сообщения"""
 
     model = Message
-    fields = ["subject", "letter_body"]
+    form_class = MessageForm
     template_name = "mailings/message/message_form.html"
 
     def get_success_url(self):
@@ -167,19 +251,18 @@ class MessageDeleteView(LoginRequiredMixin, DeleteView):
 
 
 # =================== Представление «Рассылки» ======================================================================
-class MailingListListView(LoginRequiredMixin, ListView):
+class MailingListListView(LoginRequiredMixin, KeysetPaginationMixin, CachedListMixin, ListView):
     """Список рассылок"""
 
     model = MailingList
     template_name = "mailings/mailinglist/mailinglist_list.html"
+    cache_models = (MailingList, Message)
+    keyset = ("start_time", "id")
 
-    def get_queryset(self):
-        queryset = cache.get("mailinglist_queryset")
-        if not queryset:
-            queryset = super().get_queryset()
-            if not get_is_manager(self.request.user, "Менеджеры"):
-                queryset = queryset.filter(owner=self.request.user)
-            cache.set("mailinglist_queryset", queryset, 60 * 15)
+    def filter_queryset(self, queryset):
+        queryset = queryset.select_related("message", "owner")
+        if not self.is_manager:
+            queryset = queryset.filter(owner=self.request.user)
         return queryset
 
 
@@ -260,24 +343,54 @@ class MailingListSendingView(LoginRequiredMixin, View):
         if mailinglist.owner != self.request.user:
             raise Http404("Доступ запрещён.")
 
-        send_mailinglist(mailinglist.pk)
+        # Отправка выполняется воркером run_mailing_worker, запрос не ждёт окончания рассылки
+        job = enqueue_mailinglist(mailinglist.pk)
+        messages.info(request, f"Рассылка поставлена в очередь отправки, задача №{job.pk}.")
         return HttpResponseRedirect(reverse_lazy("mailings:mailinglist_list"))
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class UnsubscribeView(View):
+    """Отписка получателя от рассылки по подписанной ссылке из письма. GET показывает подтверждение,
+    POST отписывает (в том числе «в один клик» из почтового клиента по заголовку List-Unsubscribe-Post)"""
+
+    template_name = "mailings/unsubscribe.html"
+
+    def get_mailinglist(self, token):
+        try:
+            mailing_list_id, recipient_id = parse_unsubscribe_token(token)
+        except (signing.BadSignature, ValueError):
+            raise Http404("Ссылка отписки недействительна.")
+        return get_object_or_404(MailingList.objects.select_related("message"), pk=mailing_list_id), recipient_id
+
+    def get(self, request, token):
+        mailinglist, _ = self.get_mailinglist(token)
+        return render(request, self.template_name, {"mailinglist": mailinglist, "unsubscribed": False})
+
+    # Получатель убирается из рассылки, а его адрес попадает в список подавления владельца рассылки:
+    # письма не уйдут на него и из других рассылок этого владельца
+    def post(self, request, token):
+        mailinglist, recipient_id = self.get_mailinglist(token)
+        mailinglist.recipients.remove(recipient_id)
+        email = Recipient.objects.filter(pk=recipient_id).values_list("email", flat=True).first()
+        if email:
+            suppress([email], "unsubscribe", owner_id=mailinglist.owner_id)
+        return render(request, self.template_name, {"mailinglist": mailinglist, "unsubscribed": True})
+
+
 # =================== Представление «Попытка рассылки» ===============================================================
-class AttemptListView(LoginRequiredMixin, ListView):
+class AttemptListView(LoginRequiredMixin, KeysetPaginationMixin, CachedListMixin, ListView):
     """Список попыток рассылок"""
 
     model = Attempt
     template_name = "mailings/attempt/attempt_list.html"
+    cache_models = (Attempt, MailingList, Message)
+    keyset = ("attempt_time", "id")
 
-    def get_queryset(self):
-        queryset = cache.get("attempt_queryset")
-        if not queryset:
-            queryset = super().get_queryset()
-            if not get_is_manager(self.request.user, "Менеджеры"):
-                queryset = queryset.filter(mailing_list__owner=self.request.user)
-            cache.set("attempt_queryset", queryset, 60 * 15)
+    def filter_queryset(self, queryset):
+        queryset = queryset.select_related("mailing_list__message")
+        if not self.is_manager:
+            queryset = queryset.filter(mailing_list__owner=self.request.user)
         return queryset
 
 
@@ -315,3 +428,38 @@ class AttemptDeleteView(LoginRequiredMixin, DeleteView):
     model = Attempt
     success_url = reverse_lazy("mailings:attempt_list")
     template_name = "mailings/attempt/attempt_confirm_delete.html"
+
+
+class AttemptExportView(ExportView):
+    """Выгрузка попыток рассылок; фильтры: ?mailing=<id>, ?date_from=ГГГГ-ММ-ДД, ?date_to=ГГГГ-ММ-ДД (включительно)"""
+
+    model = Attempt
+    fields = ("id", "attempt_time", "result", "server_response", "mailing_list_id")
+    headers = ("id", "attempt_time", "result", "server_response", "mailing_list")
+    ordering = ("attempt_time", "id")
+    filename = "attempts"
+
+    # Граница периода — начало дня в текущем часовом поясе
+    @staticmethod
+    def get_day_start(value, name):
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Неправильная дата в параметре {name}: {value}")
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def filter_queryset(self, queryset):
+        if not self.is_manager:
+            queryset = queryset.filter(mailing_list__owner=self.request.user)
+        mailing = self.request.GET.get("mailing")
+        if mailing:
+            if not mailing.isdigit():
+                raise ValueError(f"Неправильный номер рассылки: {mailing}")
+            queryset = queryset.filter(mailing_list_id=mailing)
+        date_from = self.request.GET.get("date_from")
+        if date_from:
+            queryset = queryset.filter(attempt_time__gte=self.get_day_start(date_from, "date_from"))
+        date_to = self.request.GET.get("date_to")
+        if date_to:
+            end = self.get_day_start(date_to, "date_to") + timedelta(days=1)
+            queryset = queryset.filter(attempt_time__lt=end)
+        return queryset
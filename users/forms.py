@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
-from email_validator import validate_email
+
+from mailings.validation import validate_address
 
 from .models import CustomUser
 
@@ -23,11 +24,11 @@ class CustomUserCreationForm(UserCreationForm):
 
         self.fields["password2"].widget.attrs.update({"class": "form-control", "placeholder": "Введите пароль"})
 
-    # Валидатор для проверки поля email
+    # Валидатор для проверки поля email: формат адреса и домен (через кеш проверок доменов)
     def clean_email(self):
         email = self.cleaned_data.get("email")
-        if email and not validate_email(email):
-            raise forms.ValidationError("Неправильный формат Электронной почты.")
+        if email:
+            validate_address(email)
         return email
 
 
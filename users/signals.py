@@ -0,0 +1,24 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from mailings.caching import bump_model_version
+
+from .models import CustomUser
+
+
+# Изменение пользователей, групп и членства в группах делает недействительным закешированный список пользователей.
+# Вход в систему сохраняет только last_login, которого нет в списке, поэтому кеш не сбрасывает
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_user_cache(sender, update_fields=None, **kwargs):
+    if update_fields == {"last_login"}:
+        return
+    bump_model_version(sender)
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_user_groups_cache(sender, **kwargs):
+    bump_model_version(CustomUser)
@@ -2,38 +2,35 @@ from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.models import Group
 from django.contrib.auth.views import LoginView
-from django.core.cache import cache
 from django.core.mail import send_mail
 from django.urls import reverse_lazy
 from django.views.generic import DetailView, ListView
 from django.views.generic.edit import CreateView, UpdateView
 
 from config import settings
+from mailings.caching import CachedListMixin
+from mailings.pagination import KeysetPaginationMixin
 from .forms import CustomAuthenticationForm, CustomUserCreationForm, ProfileForm
 from .models import CustomUser
-from .services import get_is_manager
 
 
-class UserListView(LoginRequiredMixin, ListView):
+class UserListView(LoginRequiredMixin, KeysetPaginationMixin, CachedListMixin, ListView):
     """Список пользователей"""
 
     model = CustomUser
     permission_required = "users.can_block_user"
+    cache_models = (CustomUser, Group)
+    keyset = ("email", "id")
 
-    # Метод переопределения исходного набора данных
-    def get_queryset(self):
-        queryset = cache.get("users_queryset")
-        if not queryset:
-            managers = Group.objects.get(name="Менеджеры")
-            queryset = super().get_queryset().exclude(is_superuser=True).exclude(groups__in=[managers])
-            cache.set("users_queryset", queryset, 60 * 15)  # Кешируем данные на 15 минут
-
-        return queryset
+    # Метод фильтрации исходного набора данных
+    def filter_queryset(self, queryset):
+        managers = Group.objects.get(name="Менеджеры")
+        return queryset.exclude(is_superuser=True).exclude(groups__in=[managers])
 
     # Метод установки дополнительного контекста
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["is_manager"] = get_is_manager(self.request.user, "Менеджеры")
+        context["is_manager"] = self.is_manager
         return context
 
 